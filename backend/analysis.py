@@ -0,0 +1,390 @@
+"""Damage detection and parts segmentation on decoded images.
+
+Settings, translation tables and the inference code shared by the API
+process and the inference worker processes. Importing this module only reads
+the environment: models are loaded by a ``ModelLoader`` and threads come from
+the executor the caller passes, so a worker can import it without starting
+anything the API process owns.
+"""
+import os
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+SRC_PATH = Path(__file__).parent.parent / "src"
+if str(SRC_PATH) not in sys.path:
+    sys.path.insert(0, str(SRC_PATH))
+
+from model_loader import ModelLoader, backend_model_path
+from preprocessing import preprocess_batch, scale_boxes_to_original, letterbox_crop
+from tiling import EMPTY_DETECTIONS, interior_boxes, merge_detections, shift_boxes, tile_windows
+from autodamageid.matching import match_damages_to_parts
+from autodamageid.masks import masks_to_grid, exclusive_label_map, box_coverage, label_areas, rle_encode
+
+# Stage timings hook: (stage, seconds)
+StageObserver = Callable[[str, float], None]
+
+# Model paths
+YOLO_DIR = Path(__file__).parent.parent / "src" / "yolo"
+DAMAGE_MODEL_PATH = YOLO_DIR / "weights" / "best.pt"
+PARTS_MODEL_PATH = YOLO_DIR / "runs" / "carparts_seg_v1" / "weights" / "best.pt"
+MODEL_TASKS = {"damage": "detect", "parts": "segment"}
+
+# Inference runtime: "torch" (the .pt checkpoints), "onnx", "onnx_int8" or "openvino" (exported graphs)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "torch")
+
+def model_paths(backend: str) -> Dict[str, Path]:
+    return {
+        "damage": backend_model_path(DAMAGE_MODEL_PATH, backend),
+        "parts": backend_model_path(PARTS_MODEL_PATH, backend),
+    }
+
+# Startup warmup: number of bundled sample images pushed through the models (0 disables)
+ASSETS_DIR = Path(__file__).parent.parent / "assets"
+MODEL_WARMUP_IMAGES = int(os.environ.get("MODEL_WARMUP_IMAGES", "4"))
+
+def warmup_batch_sizes(images: List[np.ndarray], max_batch_size: int) -> List[int]:
+    # Single-image and full-batch shapes are the common cases under load
+    return sorted({1, min(len(images), max_batch_size)}) if images else []
+
+# Inference input size (both models share one preprocessed tensor) and confidence
+INFERENCE_IMGSZ = 640
+INFERENCE_CONF = 0.05
+
+# Tiled close-up pass for small damages (scratches, cracks): the damage model also runs on
+# native-resolution tiles of the regions covered by detected parts, at most TILE_MAX_PER_IMAGE each
+TILED_INFERENCE = os.environ.get("TILED_INFERENCE", "0") == "1"
+TILE_SIZE = int(os.environ.get("TILE_SIZE", str(INFERENCE_IMGSZ)))
+TILE_OVERLAP = float(os.environ.get("TILE_OVERLAP", "0.2"))
+TILE_MAX_PER_IMAGE = int(os.environ.get("TILE_MAX_PER_IMAGE", "12"))
+TILE_BATCH_SIZE = int(os.environ.get("TILE_BATCH_SIZE", "16"))
+TILE_NMS_IOU = float(os.environ.get("TILE_NMS_IOU", "0.5"))
+
+# Mask-level damage/part matching (coarse grid of the part masks)
+MASK_GRID_STRIDE = int(os.environ.get("MASK_GRID_STRIDE", "4"))
+MASK_MATCH_THRESHOLD = float(os.environ.get("MASK_MATCH_THRESHOLD", "0.1"))
+
+# A YOLO predictor is not safe to share between threads
+damage_model_lock = threading.Lock()
+parts_model_lock = threading.Lock()
+
+# Damage type translations
+DAMAGE_TR = {
+    "crack": "Çatlak",
+    "dent": "Göçük",
+    "glass_shatter": "Cam Kırığı",
+    "lamp_broken": "Lamba Kırığı",
+    "scratch": "Çizik",
+    "tire_flat": "Patlak Lastik"
+}
+
+# Part name translations
+PARTS_TR = {
+    "back_bumper": "Arka Tampon",
+    "back_door": "Arka Kapı",
+    "back_glass": "Arka Cam",
+    "back_left_door": "Arka Sol Kapı",
+    "back_left_light": "Arka Sol Far",
+    "back_light": "Arka Far",
+    "back_right_door": "Arka Sağ Kapı",
+    "back_right_light": "Arka Sağ Far",
+    "front_bumper": "Ön Tampon",
+    "front_door": "Ön Kapı",
+    "front_glass": "Ön Cam",
+    "front_left_door": "Ön Sol Kapı",
+    "front_left_light": "Ön Sol Far",
+    "front_light": "Ön Far",
+    "front_right_door": "Ön Sağ Kapı",
+    "front_right_light": "Ön Sağ Far",
+    "hood": "Kaput",
+    "left_mirror": "Sol Ayna",
+    "object": "Nesne",
+    "right_mirror": "Sağ Ayna",
+    "tailgate": "Bagaj Kapağı",
+    "trunk": "Bagaj",
+    "wheel": "Tekerlek"
+}
+
+# Severity mapping based on damage type
+SEVERITY_MAP = {
+    "crack": 3,
+    "dent": 3,
+    "glass_shatter": 5,
+    "lamp_broken": 4,
+    "scratch": 2,
+    "tire_flat": 4
+}
+
+def _ignore_stage(stage: str, seconds: float):
+    pass
+
+def timed_predict(model, lock, batch_tensor, imgsz: int = INFERENCE_IMGSZ):
+    """Run one model on the preprocessed batch and time it"""
+    with lock:
+        start = time.perf_counter()
+        results = model.predict(
+            source=batch_tensor,
+            imgsz=imgsz,
+            conf=INFERENCE_CONF,
+            verbose=False
+        )
+        return results, (time.perf_counter() - start) * 1000.0
+
+def analyze_images(
+    images: List[np.ndarray],
+    loader: ModelLoader,
+    executor,
+    observe: Optional[StageObserver] = None,
+) -> List[Dict[str, Any]]:
+    """Run damage detection and parts segmentation on a batch of images
+
+    Both models run side by side on ``executor``; ``observe`` receives the
+    time of every stage.
+    """
+    if not images:
+        return []
+    observe = observe or _ignore_stage
+    damage_mod = loader.get("damage")
+    parts_mod = loader.get("parts")
+
+    # Letterbox and normalize once for both models
+    start = time.perf_counter()
+    batch_tensor, metas = preprocess_batch(images, INFERENCE_IMGSZ)
+    preprocess_ms = (time.perf_counter() - start) * 1000.0
+
+    # Run damage detection and parts segmentation concurrently
+    start = time.perf_counter()
+    damage_future = executor.submit(timed_predict, damage_mod, damage_model_lock, batch_tensor)
+    parts_future = executor.submit(timed_predict, parts_mod, parts_model_lock, batch_tensor)
+    damage_batch, damage_ms = damage_future.result()
+    parts_batch, parts_ms = parts_future.result()
+    inference_ms = (time.perf_counter() - start) * 1000.0
+
+    observe("preprocess", preprocess_ms / 1000.0)
+    observe("damage_model", damage_ms / 1000.0)
+    observe("parts_model", parts_ms / 1000.0)
+
+    tile_detections, tile_count, tile_ms = [None] * len(images), 0, 0.0
+    if TILED_INFERENCE:
+        tile_detections, tile_count, tile_ms = detect_damages_in_tiles(images, metas, parts_batch, damage_mod)
+        if tile_count:
+            observe("tile_model", tile_ms / 1000.0)
+
+    results = []
+    for image_np, meta, damage_results, parts_results, tile_damages in zip(images, metas, damage_batch, parts_batch, tile_detections):
+        start = time.perf_counter()
+        result = build_result(image_np, meta, damage_results, parts_results, damage_mod.names, parts_mod.names, tile_damages)
+        postprocess_ms = (time.perf_counter() - start) * 1000.0
+        observe("matching", postprocess_ms / 1000.0)
+        result["timings_ms"] = {
+            "preprocess": round(preprocess_ms, 2),
+            "damage_model": round(damage_ms, 2),
+            "parts_model": round(parts_ms, 2),
+            "inference": round(inference_ms, 2),
+            "postprocess": round(postprocess_ms, 2),
+            "batch_size": len(images)
+        }
+        if TILED_INFERENCE:
+            result["timings_ms"]["tile_model"] = round(tile_ms, 2)
+            result["timings_ms"]["tiles"] = tile_count
+        results.append(result)
+    return results
+
+def detect_damages_in_tiles(images: List[np.ndarray], metas, parts_batch, damage_mod):
+    """Damage detections on tiles of the part regions of every image, batched across the images.
+
+    Returns per-image (boxes, classes, scores) in image pixels, the number of
+    tiles and the damage model time (ms).
+    """
+    crops, owners, windows = [], [], []
+    for k, (image_np, meta, parts_results) in enumerate(zip(images, metas, parts_batch)):
+        h, w = image_np.shape[:2]
+        part_boxes = parts_results.boxes.xyxy.cpu().numpy() if parts_results.boxes is not None else np.zeros((0, 4))
+        regions = scale_boxes_to_original(part_boxes, meta)
+        for window in tile_windows(regions, w, h, TILE_SIZE, TILE_OVERLAP, max_tiles=TILE_MAX_PER_IMAGE).tolist():
+            x1, y1, x2, y2 = window
+            crops.append(image_np[y1:y2, x1:x2])
+            owners.append(k)
+            windows.append(window)
+
+    found = [[] for _ in images]
+    model_ms = 0.0
+    for offset in range(0, len(crops), TILE_BATCH_SIZE):
+        tile_tensor, tile_metas = preprocess_batch(crops[offset:offset + TILE_BATCH_SIZE], TILE_SIZE)
+        tile_results, ms = timed_predict(damage_mod, damage_model_lock, tile_tensor, imgsz=TILE_SIZE)
+        model_ms += ms
+        for k, window, tile_meta, r in zip(owners[offset:], windows[offset:], tile_metas, tile_results):
+            if r.boxes is None or not len(r.boxes):
+                continue
+            h, w = images[k].shape[:2]
+            boxes = scale_boxes_to_original(r.boxes.xyxy.cpu().numpy(), tile_meta)
+            keep = interior_boxes(boxes, window, w, h)
+            found[k].append((
+                shift_boxes(boxes[keep], window),
+                r.boxes.cls.cpu().numpy().astype(int)[keep],
+                r.boxes.conf.cpu().numpy()[keep]
+            ))
+
+    detections = [
+        tuple(np.concatenate(parts) for parts in zip(*pieces)) if pieces else EMPTY_DETECTIONS
+        for pieces in found
+    ]
+    return detections, len(crops), model_ms
+
+def new_damage_id() -> str:
+    return str(uuid.uuid4())[:8]
+
+def build_result(image_np: np.ndarray, meta, damage_results, parts_results, dmg_names, part_names, tile_damages=None) -> Dict[str, Any]:
+    """Match damages to parts and build the analysis result for one image
+
+    ``tile_damages`` (boxes, classes, scores in image pixels) from the tiled
+    pass are merged with the full-frame detections by NMS.
+    """
+
+    h, w = image_np.shape[:2]
+
+    # Extract damage boxes
+    dmg_boxes = damage_results.boxes.xyxy.cpu().numpy() if damage_results.boxes is not None else np.zeros((0, 4))
+    dmg_boxes = scale_boxes_to_original(dmg_boxes, meta)
+    dmg_cls = damage_results.boxes.cls.cpu().numpy().astype(int) if damage_results.boxes is not None else np.zeros((0,), int)
+    dmg_conf = damage_results.boxes.conf.cpu().numpy() if damage_results.boxes is not None else np.zeros((0,))
+
+    if tile_damages is not None and len(tile_damages[0]):
+        dmg_boxes = np.concatenate([dmg_boxes, tile_damages[0]])
+        dmg_cls = np.concatenate([dmg_cls, tile_damages[1]])
+        dmg_conf = np.concatenate([dmg_conf, tile_damages[2]])
+        keep = merge_detections(dmg_boxes, dmg_cls, dmg_conf, TILE_NMS_IOU)
+        dmg_boxes, dmg_cls, dmg_conf = dmg_boxes[keep], dmg_cls[keep], dmg_conf[keep]
+
+    # Extract part boxes
+    part_boxes = parts_results.boxes.xyxy.cpu().numpy() if parts_results.boxes is not None else np.zeros((0, 4))
+    part_boxes = scale_boxes_to_original(part_boxes, meta)
+    part_cls = parts_results.boxes.cls.cpu().numpy().astype(int) if parts_results.boxes is not None else np.zeros((0,), int)
+    part_conf = parts_results.boxes.conf.cpu().numpy() if parts_results.boxes is not None else np.zeros((0,))
+
+    # Match damages to parts by box (full IoU matrix in one pass)
+    matches = match_damages_to_parts(dmg_boxes, part_boxes, iou_threshold=0.1)
+    dmg_areas = matches.damage_area
+
+    # Match damages to parts by segmentation mask on a coarse grid of the original image
+    label_map = None
+    if parts_results.masks is not None and len(part_boxes):
+        mask_data = parts_results.masks.data.cpu().numpy()
+        part_grid = masks_to_grid(mask_data, letterbox_crop(meta, *mask_data.shape[1:]), MASK_GRID_STRIDE)
+        grid_h, grid_w = part_grid.shape[1:]
+        sx, sy = w / grid_w, h / grid_h
+
+        # Each grid cell belongs to at most one part (highest confidence wins)
+        label_map = exclusive_label_map(part_grid, part_conf)
+        coverage = box_coverage(label_map, dmg_boxes / np.array([sx, sy, sx, sy]), len(part_boxes))
+        part_mask_areas = label_areas(label_map, len(part_boxes)) * sx * sy
+
+        best = coverage.argmax(axis=1)
+        best_fraction = coverage[np.arange(len(dmg_boxes)), best]
+        part_index = np.where(best_fraction >= MASK_MATCH_THRESHOLD, best, -1)
+    else:
+        part_index = matches.part_index
+
+    # Convert arrays to native Python values once (no per-element casts or recursive walks)
+    dmg_boxes_list = dmg_boxes.tolist()
+    dmg_cls_list = dmg_cls.tolist()
+    dmg_conf_list = np.round(dmg_conf * 100, 1).tolist()
+    dmg_iou_list = np.round(matches.iou, 3).tolist()
+    iou_matrix_list = np.round(matches.iou_matrix, 3).tolist()
+    part_boxes_list = part_boxes.tolist()
+    part_names_list = [part_names[c] for c in part_cls.tolist()]
+    part_index_list = part_index.tolist()
+
+    if label_map is not None:
+        coverage_list = np.round(coverage, 3).tolist()
+        overlap_order = np.argsort(-coverage, axis=1, kind="stable").tolist()
+        part_mask_area_list = part_mask_areas.tolist()
+        area_ratio_list = np.round(dmg_areas / (part_mask_areas[np.maximum(part_index, 0)] + 1e-6), 3).tolist()
+    else:
+        area_ratio_list = np.round(np.nan_to_num(matches.area_ratio), 3).tolist()
+
+    damages = []
+    for i, box in enumerate(dmg_boxes_list):
+        j = part_index_list[i]
+        best_part = part_names_list[j] if j >= 0 else None
+        damage_type = dmg_names[dmg_cls_list[i]]
+
+        if label_map is not None:
+            # Fraction of the damage region falling on each part
+            part_overlaps = [
+                {
+                    "part_index": k,
+                    "part": part_names_list[k],
+                    "part_tr": PARTS_TR.get(part_names_list[k], part_names_list[k]),
+                    "fraction": coverage_list[i][k]
+                }
+                for k in overlap_order[i] if coverage_list[i][k] > 0
+            ]
+            part_overlap = coverage_list[i][j] if j >= 0 else None
+        else:
+            part_overlaps = []
+            part_overlap = None
+
+        damage_entry = {
+            "id": new_damage_id(),
+            "type": damage_type,
+            "type_tr": DAMAGE_TR.get(damage_type, damage_type),
+            "confidence": dmg_conf_list[i],
+            "severity": SEVERITY_MAP.get(damage_type, 3),
+            "box": box,
+            "part": best_part,
+            "part_tr": PARTS_TR.get(best_part, best_part) if j >= 0 else None,
+            "part_box": part_boxes_list[j] if j >= 0 else None,
+            "iou_with_part": iou_matrix_list[i][j] if j >= 0 else dmg_iou_list[i],
+            "part_overlap": part_overlap,
+            "part_overlaps": part_overlaps,
+            "damage_to_part_area_ratio": area_ratio_list[i] if j >= 0 else None,
+            "match_method": "mask" if label_map is not None else "box"
+        }
+        damages.append(damage_entry)
+
+    # Extract unique parts detected
+    parts = []
+    for j, box in enumerate(part_boxes_list):
+        part_name = part_names_list[j]
+        parts.append({
+            "name": part_name,
+            "name_tr": PARTS_TR.get(part_name, part_name),
+            "box": box,
+            # Run-length encoded mask on the coarse grid (size = [grid_h, grid_w])
+            "mask_rle": rle_encode(label_map == j) if label_map is not None else None,
+            "mask_area": round(part_mask_area_list[j], 1) if label_map is not None else None
+        })
+
+    result = {
+        "damages": damages,
+        "parts": parts,
+        "summary": summarize_damages(damages),
+        "image_size": {"width": int(w), "height": int(h)}
+    }
+
+    return result
+
+def summarize_damages(damages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Damage count, affected parts, average severity and risk level"""
+    total_damages = len(damages)
+    affected_parts = len(set([d["part"] for d in damages if d["part"]]))
+    avg_severity = float(round(sum([d["severity"] for d in damages]) / max(1, total_damages), 1))
+
+    risk_level = "Düşük"
+    if avg_severity >= 4 or total_damages >= 4:
+        risk_level = "Yüksek"
+    elif avg_severity >= 2.5 or total_damages >= 2:
+        risk_level = "Orta"
+
+    return {
+        "total_damages": int(total_damages),
+        "affected_parts": int(affected_parts),
+        "average_severity": float(avg_severity),
+        "risk_level": risk_level
+    }
@@ -0,0 +1,180 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+def blob_hash(data: bytes) -> str:
+    """Content address of a blob"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    """Content-addressed storage for raw image bytes.
+
+    Blobs are identified by the SHA-256 of their content, so storing the same
+    bytes twice keeps a single copy. Within a process, ``put`` and
+    ``delete_unused`` of the same blob id never overlap, so a put cannot
+    report a blob that a concurrent delete removes.
+    """
+
+    backend = "base"
+
+    def __init__(self):
+        # blob id -> [lock, number of users]
+        self._locks: Dict[str, List[Any]] = {}
+
+    @contextlib.asynccontextmanager
+    async def _exclusive(self, blob_id: str):
+        entry = self._locks.setdefault(blob_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[blob_id]
+
+    async def put(self, data: bytes, content_type: str = "image/jpeg") -> Dict[str, Any]:
+        """Store bytes (if not already present) and return a reference"""
+        blob_id = blob_hash(data)
+        async with self._exclusive(blob_id):
+            if not await self.exists(blob_id):
+                await self._write(blob_id, data, content_type)
+        return {"blob_id": blob_id, "size": len(data), "content_type": content_type}
+
+    async def delete_unused(self, blob_id: str, unused: Callable[[], Awaitable[bool]]) -> bool:
+        """Delete a blob when ``unused()`` holds, checked while no put of the same bytes runs"""
+        async with self._exclusive(blob_id):
+            if not await unused():
+                return False
+            await self.delete(blob_id)
+            return True
+
+    async def get(self, blob_id: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def exists(self, blob_id: str) -> bool:
+        raise NotImplementedError
+
+    async def delete(self, blob_id: str):
+        raise NotImplementedError
+
+    async def _write(self, blob_id: str, data: bytes, content_type: str):
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files under ``root/ab/cd/<hash>`` (file I/O runs on ``executor``)"""
+
+    backend = "local"
+
+    def __init__(self, root, executor=None):
+        super().__init__()
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.executor = executor
+
+    def _path(self, blob_id: str) -> Path:
+        if len(blob_id) != 64 or any(c not in "0123456789abcdef" for c in blob_id):
+            raise ValueError(f"Invalid blob id: {blob_id}")
+        return self.root / blob_id[:2] / blob_id[2:4] / blob_id
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args))
+
+    def _read_sync(self, blob_id: str) -> Optional[bytes]:
+        try:
+            return self._path(blob_id).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _delete_sync(self, blob_id: str):
+        try:
+            self._path(blob_id).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _write_sync(self, blob_id: str, data: bytes):
+        path = self._path(blob_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file first so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    async def get(self, blob_id: str) -> Optional[bytes]:
+        return await self._run(self._read_sync, blob_id)
+
+    async def exists(self, blob_id: str) -> bool:
+        return self._path(blob_id).exists()
+
+    async def delete(self, blob_id: str):
+        await self._run(self._delete_sync, blob_id)
+
+    async def _write(self, blob_id: str, data: bytes, content_type: str):
+        await self._run(self._write_sync, blob_id, data)
+
+
+class GridFSBlobStore(BlobStore):
+    """Blobs in a MongoDB GridFS bucket, using the content hash as file id"""
+
+    backend = "gridfs"
+
+    def __init__(self, database, bucket_name: str = "blobs"):
+        super().__init__()
+        import gridfs
+        from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+        self._errors = gridfs.errors
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name=bucket_name)
+        self.files = database[f"{bucket_name}.files"]
+
+    async def get(self, blob_id: str) -> Optional[bytes]:
+        try:
+            stream = await self.bucket.open_download_stream(blob_id)
+        except self._errors.NoFile:
+            return None
+        return await stream.read()
+
+    async def exists(self, blob_id: str) -> bool:
+        return await self.files.count_documents({"_id": blob_id}, limit=1) > 0
+
+    async def delete(self, blob_id: str):
+        try:
+            await self.bucket.delete(blob_id)
+        except self._errors.NoFile:
+            pass
+
+    async def _write(self, blob_id: str, data: bytes, content_type: str):
+        # GridFS takes bytes or a file object (uploads arrive as bytearray)
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        try:
+            await self.bucket.upload_from_stream_with_id(
+                blob_id, blob_id, data, metadata={"content_type": content_type}
+            )
+        except Exception:
+            # Another writer stored the same content concurrently
+            if not await self.exists(blob_id):
+                raise
+
+
+def create_blob_store(backend: str, database=None, root=None, executor=None) -> BlobStore:
+    """Build the blob store selected by configuration (``database`` is a Motor database)"""
+    if backend == "gridfs":
+        return GridFSBlobStore(database)
+    if backend == "local":
+        return LocalBlobStore(root, executor=executor)
+    raise ValueError(f"Unknown blob store backend: {backend}")
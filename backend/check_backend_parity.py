@@ -0,0 +1,150 @@
+"""Compare analysis results of an exported inference backend with PyTorch.
+
+Usage (from the backend directory, after running src/yolo/export_models.py):
+
+    python check_backend_parity.py --backend onnx [--assets ../assets]
+
+Every image is analyzed with the ``.pt`` checkpoints and with the exported
+graphs through the same ``analyze_images`` path. Damages are paired by box
+IoU and must agree on type, part and (within a tolerance) confidence; part
+detections and the risk level must match. Detections whose confidence is
+within the tolerance of the confidence threshold may appear on one side
+only. Exits with status 1 when any image differs.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+# Same inference settings as the server
+load_dotenv()
+
+import analysis
+from autodamageid.matching import box_iou_matrix
+from model_loader import BACKENDS, IMAGE_EXTENSIONS, ModelLoader
+
+# Runs the damage and parts models side by side, as in the server
+model_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="model")
+
+
+def compare_damages(reference, candidate, min_iou: float, conf_tol: float):
+    """Problems found between two damage lists (empty when they agree)"""
+    problems = []
+    ref_boxes = np.array([d["box"] for d in reference], dtype=float).reshape(-1, 4)
+    cand_boxes = np.array([d["box"] for d in candidate], dtype=float).reshape(-1, 4)
+    iou = box_iou_matrix(ref_boxes, cand_boxes)
+
+    # Greedy pairing, best IoU first
+    paired_ref, paired_cand = set(), set()
+    for flat in np.argsort(-iou, axis=None):
+        i, j = np.unravel_index(flat, iou.shape)
+        if iou[i, j] < min_iou:
+            break
+        if i in paired_ref or j in paired_cand:
+            continue
+        paired_ref.add(i)
+        paired_cand.add(j)
+        ref, cand = reference[i], candidate[j]
+        if ref["type"] != cand["type"]:
+            problems.append(f"damage {i}: type {ref['type']} != {cand['type']}")
+        if ref["part"] != cand["part"]:
+            problems.append(f"damage {i}: part {ref['part']} != {cand['part']}")
+        if abs(ref["confidence"] - cand["confidence"]) > conf_tol:
+            problems.append(f"damage {i}: confidence {ref['confidence']} vs {cand['confidence']}")
+
+    # Unpaired detections are only acceptable right at the confidence threshold
+    borderline = analysis.INFERENCE_CONF * 100 + conf_tol
+    for side, damages, paired in (("reference", reference, paired_ref), ("candidate", candidate, paired_cand)):
+        for k, damage in enumerate(damages):
+            if k not in paired and damage["confidence"] > borderline:
+                problems.append(f"{side} only: {damage['type']} ({damage['confidence']}%) at {np.round(damage['box'], 1).tolist()}")
+    return problems
+
+
+def compare_results(reference, candidate, min_iou: float, conf_tol: float):
+    problems = compare_damages(reference["damages"], candidate["damages"], min_iou, conf_tol)
+    ref_parts = Counter(p["name"] for p in reference["parts"])
+    cand_parts = Counter(p["name"] for p in candidate["parts"])
+    if ref_parts != cand_parts:
+        problems.append(f"parts differ: {dict(ref_parts - cand_parts)} vs {dict(cand_parts - ref_parts)}")
+    if reference["summary"]["risk_level"] != candidate["summary"]["risk_level"]:
+        problems.append(f"risk level {reference['summary']['risk_level']} != {candidate['summary']['risk_level']}")
+    return problems
+
+
+def timed_analyze(images, loader):
+    start = time.perf_counter()
+    results = analysis.analyze_images(images, loader, model_executor)
+    return results, (time.perf_counter() - start) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that an exported backend matches PyTorch results")
+    parser.add_argument("--backend", default="onnx", choices=[b for b in BACKENDS if b != "torch"])
+    parser.add_argument("--assets", default=str(analysis.ASSETS_DIR), help="directory of test images")
+    parser.add_argument("--min-iou", type=float, default=0.9, help="IoU needed to pair two damage boxes")
+    parser.add_argument("--conf-tol", type=float, default=2.0, help="allowed confidence difference (percentage points)")
+    parser.add_argument("--batch-size", type=int, default=int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", "8")),
+                        help="images in the batched run (the server's INFERENCE_MAX_BATCH_SIZE)")
+    args = parser.parse_args()
+
+    reference_loader = ModelLoader(analysis.model_paths("torch"), analysis.MODEL_TASKS, backend="torch")
+    candidate_loader = ModelLoader(analysis.model_paths(args.backend), analysis.MODEL_TASKS, backend=args.backend)
+
+    paths = [p for p in sorted(Path(args.assets).glob("*")) if p.suffix.lower() in IMAGE_EXTENSIONS]
+    images = [(p, cv2.imread(str(p), cv2.IMREAD_COLOR)) for p in paths]
+    images = [(p, image) for p, image in images if image is not None]
+    if not images:
+        print(f"No images found in {args.assets}")
+        sys.exit(2)
+
+    # First call per backend includes one-time initialization; keep it out of the timings
+    timed_analyze([images[0][1]], reference_loader)
+    timed_analyze([images[0][1]], candidate_loader)
+
+    report = {"backend": args.backend, "images": [], "failed": 0}
+    reference_ms, candidate_ms = [], []
+    for path, image in images:
+        (reference,), ref_ms = timed_analyze([image], reference_loader)
+        (candidate,), cand_ms = timed_analyze([image], candidate_loader)
+        reference_ms.append(ref_ms)
+        candidate_ms.append(cand_ms)
+
+        problems = compare_results(reference, candidate, args.min_iou, args.conf_tol)
+        report["failed"] += bool(problems)
+        report["images"].append({
+            "image": path.name,
+            "damages": [len(reference["damages"]), len(candidate["damages"])],
+            "torch_ms": round(ref_ms, 1),
+            f"{args.backend}_ms": round(cand_ms, 1),
+            "problems": problems,
+        })
+
+    # Dynamic batch dimension: a batched run must give the single-image results
+    batch = [image for _, image in images[:args.batch_size]]
+    batched, _ = timed_analyze(batch, candidate_loader)
+    batch_problems = []
+    for (path, _), single, result in zip(images, report["images"], batched):
+        if len(result["damages"]) != single["damages"][1]:
+            batch_problems.append(f"{path.name}: {len(result['damages'])} damages in batch vs {single['damages'][1]} alone")
+    report["batch_problems"] = batch_problems
+    report["failed"] += bool(batch_problems)
+
+    report["median_ms"] = {
+        "torch": round(float(np.median(reference_ms)), 1),
+        args.backend: round(float(np.median(candidate_ms)), 1),
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sys.exit(1 if report["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+def _http_date(dt: datetime) -> str:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return format_datetime(dt.astimezone(timezone.utc), usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # HTTP dates have one-second resolution
+    return last_modified.replace(microsecond=0) <= since
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single ``bytes=`` range into inclusive (start, end).
+
+    Returns None when the header should be ignored (unsupported or multiple
+    ranges) and raises ValueError when the range cannot be satisfied.
+    """
+    if not header.startswith("bytes=") or "," in header:
+        return None
+    start_s, _, end_s = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_s == "":
+            # Suffix range: last N bytes
+            length = int(end_s)
+            if length <= 0:
+                raise ValueError("Empty suffix range")
+            return max(0, size - length), size - 1
+        start = int(start_s)
+        end = int(end_s) if end_s else size - 1
+    except ValueError:
+        raise ValueError(f"Invalid range: {header}")
+    if start >= size or end < start:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return start, min(end, size - 1)
+
+
+def _cache_headers(
+    etag: str,
+    last_modified: Optional[datetime],
+    max_age: int,
+    extra_headers: Optional[Dict[str, str]],
+) -> Dict[str, str]:
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}",
+        "Accept-Ranges": "bytes",
+        **(extra_headers or {}),
+    }
+    if last_modified is not None:
+        headers["Last-Modified"] = _http_date(last_modified)
+    return headers
+
+
+def not_modified_response(
+    request: Request,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+    max_age: int = 86400,
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> Optional[Response]:
+    """304 response when the client's copy is current, else None.
+
+    Only needs the validators, so callers can answer revalidations before
+    loading the bytes.
+    """
+    etag = f'"{etag}"'
+    # If-None-Match takes precedence over If-Modified-Since
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if not _etag_matches(if_none_match, etag):
+            return None
+    elif last_modified is None or "if-modified-since" not in request.headers:
+        return None
+    elif not _not_modified_since(request.headers["if-modified-since"], last_modified):
+        return None
+    return Response(status_code=304, headers=_cache_headers(etag, last_modified, max_age, extra_headers))
+
+
+def cached_bytes_response(
+    request: Request,
+    data: bytes,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+    media_type: str = "application/octet-stream",
+    max_age: int = 86400,
+    extra_headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Serve immutable bytes with ETag/Last-Modified validation and Range support"""
+    not_modified = not_modified_response(request, etag, last_modified, max_age, extra_headers)
+    if not_modified is not None:
+        return not_modified
+    etag = f'"{etag}"'
+    headers = _cache_headers(etag, last_modified, max_age, extra_headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == etag):
+        size = len(data)
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return Response(content=data[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+
+    return Response(content=data, media_type=media_type, headers=headers)
@@ -0,0 +1,326 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Open a segment created by the API process without registering it here.
+
+    The API process owns and unlinks every segment; a second registration
+    from the worker would make the resource tracker unlink or warn about it
+    (bpo-39959).
+    """
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _worker_main(conn, max_batch_size: int, torch_threads: int):
+    """Inference worker: loads the models, then analyzes frames handed over in shared memory"""
+    import torch
+    if torch_threads > 0:
+        torch.set_num_threads(torch_threads)
+
+    # Only the inference code: the API module (executors, database clients, pools) stays in the parent
+    import analysis
+    from model_loader import ModelLoader, warmup_images
+
+    loader = ModelLoader(analysis.model_paths(analysis.INFERENCE_BACKEND), analysis.MODEL_TASKS,
+                         backend=analysis.INFERENCE_BACKEND)
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="model")
+
+    def analyze_images(images):
+        return analysis.analyze_images(images, loader, executor)
+
+    try:
+        loader.load()
+        images = warmup_images(analysis.ASSETS_DIR, analysis.MODEL_WARMUP_IMAGES)
+        loader.warmup(analyze_images, images, analysis.warmup_batch_sizes(images, max_batch_size))
+    except Exception as exc:
+        conn.send(("failed", str(exc)))
+        return
+    conn.send(("ready", loader.status()))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        request_id, specs = message
+        segments = [_attach(name) for name, _, _ in specs]
+        try:
+            # Views on the shared pages, no copies
+            frames = [
+                np.ndarray(shape, dtype=np.dtype(dtype), buffer=segment.buf)
+                for segment, (_, shape, dtype) in zip(segments, specs)
+            ]
+            reply = (request_id, True, analyze_images(frames))
+        except Exception as exc:
+            reply = (request_id, False, f"{type(exc).__name__}: {exc}")
+        finally:
+            frames = None
+            for segment in segments:
+                segment.close()
+        conn.send(reply)
+
+
+class _Worker:
+    def __init__(self, index: int, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.state = "starting"
+        self.busy = False
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.restart_at = 0.0
+
+
+class InferencePool:
+    """Pool of inference processes fed through shared memory.
+
+    ``analyze(images)`` (blocking, thread-safe) copies each frame once into a
+    shared memory segment, hands the segment names to an idle worker over a
+    pipe and returns the worker's results (the same dicts ``analyze_images``
+    builds, which are small). Each worker loads and warms up its own models
+    and runs one batch at a time, so up to ``workers`` batches run in
+    parallel. A worker that dies or exceeds ``timeout_s`` fails the batch it
+    held. A monitor thread notices workers that exit while idle and restarts
+    every failed worker in the background; workers that fail to start are
+    retried with a growing delay (up to ``max_restart_delay_s``).
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_batch_size: int = 8,
+        torch_threads: int = 0,
+        timeout_s: float = 120.0,
+        max_restart_delay_s: float = 60.0,
+    ):
+        self.workers = max(1, int(workers))
+        self.max_batch_size = max_batch_size
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.timeout_s = timeout_s
+        self.max_restart_delay_s = max_restart_delay_s
+        self._context = multiprocessing.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._pool: Dict[int, _Worker] = {}
+        # Consecutive startup failures per worker slot (sets the restart delay)
+        self._start_failures: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count()
+        self._stopped = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+
+        self.batches = 0
+        self.images = 0
+        self.errors = 0
+        self.crashes = 0
+        self.restarts = 0
+
+    def start(self):
+        """Start the worker processes (models load in the background) and their monitor"""
+        for index in range(self.workers):
+            self._spawn(index)
+        self._monitor = threading.Thread(target=self._watch, name="inference-monitor", daemon=True)
+        self._monitor.start()
+
+    def _spawn(self, index: int):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, args=(child_conn, self.max_batch_size, self.torch_threads),
+            name=f"inference-{index}", daemon=True
+        )
+        process.start()
+        # Only the worker keeps its end, so its death shows up as EOF here
+        child_conn.close()
+        worker = _Worker(index, process, parent_conn)
+        with self._lock:
+            self._pool[index] = worker
+        threading.Thread(target=self._wait_ready, args=(worker,), name=f"inference-{index}-start", daemon=True).start()
+
+    def _wait_ready(self, worker: _Worker):
+        try:
+            status, detail = worker.conn.recv()
+        except (EOFError, OSError):
+            status, detail = "failed", f"exited with code {worker.process.exitcode}"
+        if status != "ready":
+            with self._lock:
+                failures = self._start_failures.get(worker.index, 0) + 1
+                self._start_failures[worker.index] = failures
+            delay = min(self.max_restart_delay_s, 2.0 ** (failures - 1))
+            print(f"Inference worker {worker.index} failed to start: {detail}; retrying in {delay:.0f}s")
+            self._fail(worker, detail, delay)
+            return
+        with self._lock:
+            if worker.state != "starting":
+                return
+            worker.state = "ready"
+            self._start_failures.pop(worker.index, None)
+        self._idle.put(worker)
+
+    def _fail(self, worker: _Worker, error: str, restart_delay_s: float = 0.0) -> bool:
+        """Take a worker out of service; the monitor starts its replacement after the delay.
+
+        Returns False when another thread already did so.
+        """
+        with self._lock:
+            if worker.state == "failed":
+                return False
+            worker.state, worker.error, worker.busy = "failed", error, False
+            worker.restart_at = time.time() + restart_delay_s
+        try:
+            worker.conn.close()
+        except OSError:
+            pass
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(timeout=5)
+        return True
+
+    def _watch(self):
+        """Monitor thread: fail idle workers that exited and restart failed ones when due"""
+        while not self._stopped.wait(1.0):
+            with self._lock:
+                workers = list(self._pool.values())
+            for worker in workers:
+                if self._stopped.is_set():
+                    return
+                with self._lock:
+                    exited = worker.state == "ready" and not worker.busy and not worker.process.is_alive()
+                if exited:
+                    detail = f"exited with code {worker.process.exitcode}"
+                    if self._fail(worker, detail):
+                        self.crashes += 1
+                        print(f"Inference worker {worker.index} {detail} while idle; restarting")
+                if worker.state == "failed" and time.time() >= worker.restart_at:
+                    self.restarts += 1
+                    self._spawn(worker.index)
+
+    def _take_worker(self) -> _Worker:
+        while True:
+            if self._stopped.is_set():
+                raise RuntimeError("Inference pool stopped")
+            try:
+                worker = self._idle.get(timeout=1.0)
+            except queue.Empty:
+                with self._lock:
+                    workers = list(self._pool.values())
+                if workers and all(w.state == "failed" for w in workers):
+                    raise RuntimeError(f"No inference worker available: {workers[0].error}")
+                continue
+            with self._lock:
+                # Workers failed or replaced while queued are dropped here
+                if worker.state == "ready" and self._pool.get(worker.index) is worker:
+                    worker.busy = True
+                    return worker
+
+    def _release_worker(self, worker: _Worker):
+        with self._lock:
+            worker.busy = False
+        self._idle.put(worker)
+
+    def analyze(self, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+        if not images:
+            return []
+        segments, specs = [], []
+        try:
+            for image in images:
+                image = np.ascontiguousarray(image)
+                segment = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+                segments.append(segment)
+                np.ndarray(image.shape, dtype=image.dtype, buffer=segment.buf)[...] = image
+                specs.append((segment.name, image.shape, image.dtype.str))
+
+            worker = self._take_worker()
+            request_id = next(self._request_ids)
+            try:
+                worker.conn.send((request_id, specs))
+                if not worker.conn.poll(self.timeout_s):
+                    raise TimeoutError(f"no reply within {self.timeout_s:.0f}s")
+                reply_id, ok, payload = worker.conn.recv()
+            except (EOFError, OSError, TimeoutError) as exc:
+                self.crashes += 1
+                self.errors += 1
+                print(f"Inference worker {worker.index} lost ({type(exc).__name__}: {exc}); restarting")
+                self._fail(worker, f"{type(exc).__name__}: {exc}")
+                raise RuntimeError("Inference worker crashed") from exc
+        finally:
+            for segment in segments:
+                segment.close()
+                segment.unlink()
+
+        self._release_worker(worker)
+        if not ok or reply_id != request_id:
+            self.errors += 1
+            raise RuntimeError(payload if not ok else "Inference worker replied out of order")
+        self.batches += 1
+        self.images += len(images)
+        return payload
+
+    def stop(self):
+        self._stopped.set()
+        if self._monitor is not None:
+            self._monitor.join(timeout=5)
+        with self._lock:
+            workers = list(self._pool.values())
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.kill()
+
+    @property
+    def ready(self) -> bool:
+        with self._lock:
+            return any(w.state == "ready" for w in self._pool.values())
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            workers = sorted(self._pool.values(), key=lambda w: w.index)
+            ready = sum(w.state == "ready" for w in workers)
+        if self._stopped.is_set():
+            state = "stopped"
+        elif workers and ready == len(workers):
+            state = "ready"
+        elif ready:
+            # Serving with fewer workers while the others start or wait for a restart
+            state = "degraded"
+        elif workers and all(w.state == "failed" for w in workers):
+            state = "failed"
+        else:
+            state = "starting"
+        return {
+            "status": state,
+            "workers": [
+                {"index": w.index, "pid": w.process.pid, "state": w.state, "error": w.error,
+                 "restart_in_s": round(max(0.0, w.restart_at - time.time()), 1) if w.state == "failed" else None}
+                for w in workers
+            ],
+            "ready_workers": ready,
+            "torch_threads": self.torch_threads,
+            "idle": self._idle.qsize(),
+            "batches": self.batches,
+            "images": self.images,
+            "errors": self.errors,
+            "crashes": self.crashes,
+            "restarts": self.restarts,
+        }
@@ -0,0 +1,187 @@
+import asyncio
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class InferenceScheduler:
+    """Dynamic micro-batching scheduler for model inference.
+
+    Images submitted within a short window are grouped into a single batch
+    (bounded by ``max_batch_size`` and ``max_wait_ms``) and handed to
+    ``batch_fn`` in one call. Each caller gets back the result for the image
+    it submitted. Up to ``concurrency`` batches may be in flight at once on
+    ``executor``; while they run, new arrivals keep accumulating in the queue.
+    ``on_batch(waits, seconds)`` is called after each batch with the queue
+    wait of every image and the batch run time (seconds), e.g. for metrics.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[np.ndarray]], List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10.0,
+        executor=None,
+        concurrency: int = 1,
+        on_batch: Optional[Callable[[List[float], float], None]] = None,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.executor = executor
+        self.concurrency = max(1, int(concurrency))
+        self.on_batch = on_batch
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight = set()
+        # Items taken off the queue for the batch being collected
+        self._collecting: List[tuple] = []
+
+        # Statistics
+        self._batches = 0
+        self._images = 0
+        self._errors = 0
+        self._max_queue_depth = 0
+        self._batch_sizes = Counter()
+        self._total_wait_ms = 0.0
+        self._total_batch_ms = 0.0
+
+    def start(self):
+        """Start the background batching loop on the running event loop"""
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop and fail any requests still waiting"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        # Requests dequeued for a batch that never ran, then those still queued
+        collecting, self._collecting = self._collecting, []
+        self._fail(collecting, RuntimeError("Inference scheduler stopped"))
+        while not self._queue.empty():
+            self._fail([self._queue.get_nowait()], RuntimeError("Inference scheduler stopped"))
+
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    @staticmethod
+    def _fail(batch: List[tuple], exc: BaseException):
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(exc)
+
+    async def submit(self, image_np: np.ndarray) -> Any:
+        """Queue an image for the next batch and wait for its result"""
+        if self._worker is None:
+            raise RuntimeError("Inference scheduler is not running")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self._queue.put((image_np, future, loop.time()))
+        self._max_queue_depth = max(self._max_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _collect_batch(self, batch: List[tuple]):
+        """Fill ``batch`` in place, so items already dequeued are known if the loop is cancelled"""
+        loop = asyncio.get_running_loop()
+        batch.append(await self._queue.get())
+        deadline = loop.time() + self.max_wait_ms / 1000.0
+
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued before waiting for more
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _run(self):
+        while True:
+            # Wait for a free slot first so the queue keeps filling meanwhile
+            await self._slots.acquire()
+            try:
+                await self._collect_batch(self._collecting)
+            except BaseException:
+                self._slots.release()
+                raise
+            batch, self._collecting = self._collecting, []
+
+            # Skip requests whose callers already went away
+            batch = [item for item in batch if not item[1].done()]
+            if not batch:
+                self._slots.release()
+                continue
+
+            task = asyncio.get_running_loop().create_task(self._process(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _process(self, batch: List[tuple]):
+        loop = asyncio.get_running_loop()
+        images = [item[0] for item in batch]
+        started = loop.time()
+        for _, _, queued_at in batch:
+            self._total_wait_ms += (started - queued_at) * 1000.0
+
+        try:
+            results = await loop.run_in_executor(self.executor, self.batch_fn, images)
+            if len(results) != len(images):
+                raise RuntimeError(
+                    f"Batch function returned {len(results)} results for {len(images)} images"
+                )
+        except Exception as exc:
+            self._errors += 1
+            self._fail(batch, exc)
+        else:
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._slots.release()
+
+        elapsed = loop.time() - started
+        self._total_batch_ms += elapsed * 1000.0
+        if self.on_batch is not None:
+            self.on_batch([started - queued_at for _, _, queued_at in batch], elapsed)
+        self._batches += 1
+        self._images += len(images)
+        self._batch_sizes[len(images)] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and batch-size statistics for tuning"""
+        batches = max(1, self._batches)
+        images = max(1, self._images)
+        return {
+            "running": self._worker is not None,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "concurrency": self.concurrency,
+            "batches_in_flight": len(self._in_flight),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self._max_queue_depth,
+            "batches": self._batches,
+            "images": self._images,
+            "errors": self._errors,
+            "average_batch_size": round(self._images / batches, 2),
+            "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+            "average_queue_wait_ms": round(self._total_wait_ms / images, 2),
+            "average_batch_ms": round(self._total_batch_ms / batches, 2),
+        }
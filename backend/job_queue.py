@@ -0,0 +1,362 @@
+import asyncio
+import functools
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from pymongo import ASCENDING, ReturnDocument
+
+TERMINAL_STATES = ("done", "failed")
+
+
+def new_event(stage: str, status: str, **details) -> Dict[str, Any]:
+    return {"stage": stage, "status": status, "at": datetime.utcnow().isoformat(), **details}
+
+
+class JobStore:
+    """Persistent job records. Jobs are claimed with a lease: a job whose
+    worker died (or whose server restarted) becomes claimable again once the
+    lease expires, so queued and interrupted jobs survive restarts.
+    """
+
+    backend = "base"
+
+    async def setup(self):
+        pass
+
+    async def create(self, job: Dict[str, Any]):
+        raise NotImplementedError
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def claim(self, lease_s: float) -> Optional[Dict[str, Any]]:
+        """Atomically take the oldest claimable job (status becomes running)"""
+        raise NotImplementedError
+
+    async def update(self, job_id: str, fields: Dict[str, Any], event: Optional[Dict[str, Any]] = None):
+        """Set fields and append a progress event"""
+        raise NotImplementedError
+
+    async def active_with_upload(self, blob_id: str, exclude_id: str) -> bool:
+        """Whether another unfinished job still needs the same uploaded blob"""
+        raise NotImplementedError
+
+
+class MongoJobStore(JobStore):
+    backend = "mongo"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def setup(self):
+        await self.collection.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
+        await self.collection.create_index("upload_ref.blob_id")
+
+    async def create(self, job):
+        await self.collection.insert_one(job)
+
+    async def get(self, job_id):
+        return await self.collection.find_one({"_id": job_id})
+
+    async def claim(self, lease_s):
+        now = time.time()
+        return await self.collection.find_one_and_update(
+            {"$or": [{"status": "queued"}, {"status": "running", "lease_until": {"$lt": now}}]},
+            {
+                "$set": {"status": "running", "lease_until": now + lease_s, "updated_at": datetime.utcnow().isoformat()},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def update(self, job_id, fields, event=None):
+        update: Dict[str, Any] = {"$set": {**fields, "updated_at": datetime.utcnow().isoformat()}}
+        if event is not None:
+            update["$push"] = {"events": event}
+        await self.collection.update_one({"_id": job_id}, update)
+
+    async def active_with_upload(self, blob_id, exclude_id):
+        query = {"upload_ref.blob_id": blob_id, "_id": {"$ne": exclude_id}, "status": {"$nin": list(TERMINAL_STATES)}}
+        return await self.collection.count_documents(query, limit=1) > 0
+
+
+class SQLiteJobStore(JobStore):
+    """Local stand-in for a queue service: one SQLite file, calls run on ``executor``"""
+
+    backend = "sqlite"
+
+    def __init__(self, path, executor=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.executor = executor
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at TEXT NOT NULL,"
+            " lease_until REAL NOT NULL DEFAULT 0, upload_blob TEXT, doc TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, created_at)")
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args))
+
+    def _write_sync(self, job):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO jobs (id, status, created_at, lease_until, upload_blob, doc) VALUES (?, ?, ?, ?, ?, ?)",
+            (job["_id"], job["status"], job["created_at"], job.get("lease_until", 0),
+             (job.get("upload_ref") or {}).get("blob_id"), json.dumps(job))
+        )
+
+    def _get_sync(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT doc FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _claim_sync(self, lease_s):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT doc FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)"
+                    " ORDER BY created_at LIMIT 1", (now,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                job = json.loads(row[0])
+                job.update(status="running", lease_until=now + lease_s, attempts=job.get("attempts", 0) + 1,
+                           updated_at=datetime.utcnow().isoformat())
+                self._write_sync(job)
+                self._conn.execute("COMMIT")
+                return job
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _update_sync(self, job_id, fields, event):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                job = self._get_sync(job_id)
+                if job is not None:
+                    job.update(fields, updated_at=datetime.utcnow().isoformat())
+                    if event is not None:
+                        job.setdefault("events", []).append(event)
+                    self._write_sync(job)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _create_sync(self, job):
+        with self._lock:
+            self._write_sync(job)
+
+    def _active_with_upload_sync(self, blob_id, exclude_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE upload_blob = ? AND id != ? AND status NOT IN ('done', 'failed') LIMIT 1",
+                (blob_id, exclude_id)
+            ).fetchone()
+        return row is not None
+
+    async def create(self, job):
+        await self._run(self._create_sync, job)
+
+    async def get(self, job_id):
+        return await self._run(self._get_sync, job_id)
+
+    async def claim(self, lease_s):
+        return await self._run(self._claim_sync, lease_s)
+
+    async def update(self, job_id, fields, event=None):
+        await self._run(self._update_sync, job_id, fields, event)
+
+    async def active_with_upload(self, blob_id, exclude_id):
+        return await self._run(self._active_with_upload_sync, blob_id, exclude_id)
+
+
+def create_job_store(backend: str, database=None, path=None, executor=None) -> JobStore:
+    if backend == "mongo":
+        return MongoJobStore(database.jobs)
+    if backend == "sqlite":
+        return SQLiteJobStore(path, executor=executor)
+    raise ValueError(f"Unknown job store backend: {backend}")
+
+
+# handler(job, progress) -> fields stored on the finished job; progress(stage, status, **details)
+JobHandler = Callable[[Dict[str, Any], Callable[..., Awaitable[None]]], Awaitable[Dict[str, Any]]]
+# on_failed(job) runs once a job has failed for good (e.g. to release its upload)
+FailureHandler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class JobQueue:
+    """Worker pool over a JobStore with progress notifications.
+
+    ``workers`` tasks claim jobs and run ``handler``. Progress events are
+    persisted on the job (for polling and for other server processes) and
+    wake in-process subscribers immediately. ``on_failed`` is awaited after a
+    job is recorded as failed (its handler raised, or it ran out of attempts).
+    While a handler runs, the job's lease is renewed every third of
+    ``lease_s``, so a job that runs (or waits for inference) longer than its
+    lease is not claimed a second time.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        handler: JobHandler,
+        workers: int = 4,
+        lease_s: float = 300.0,
+        max_attempts: int = 3,
+        poll_interval: float = 0.5,
+        on_failed: Optional[FailureHandler] = None,
+    ):
+        self.store = store
+        self.handler = handler
+        self.on_failed = on_failed
+        self.workers = max(1, int(workers))
+        self.lease_s = lease_s
+        self.max_attempts = max(1, int(max_attempts))
+        self.poll_interval = poll_interval
+
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._listeners: Dict[str, Set[asyncio.Event]] = {}
+
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; interrupted jobs are picked up again after their lease expires"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        job = {
+            "status": "queued",
+            "created_at": datetime.utcnow().isoformat(),
+            "attempts": 0,
+            "lease_until": 0,
+            "events": [new_event("queued", "done")],
+            **job,
+        }
+        await self.store.create(job)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def subscribe(self, job_id: str) -> asyncio.Event:
+        event = asyncio.Event()
+        self._listeners.setdefault(job_id, set()).add(event)
+        return event
+
+    def unsubscribe(self, job_id: str, event: asyncio.Event):
+        listeners = self._listeners.get(job_id)
+        if listeners is not None:
+            listeners.discard(event)
+            if not listeners:
+                del self._listeners[job_id]
+
+    def _notify(self, job_id: str):
+        for event in self._listeners.get(job_id, ()):
+            event.set()
+
+    async def _record(self, job_id: str, fields: Dict[str, Any], event: Dict[str, Any]):
+        await self.store.update(job_id, fields, event)
+        self._notify(job_id)
+
+    async def _work(self):
+        while True:
+            try:
+                job = await self.store.claim(self.lease_s)
+            except Exception as exc:
+                print(f"Job claim failed: {exc}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._process(job)
+            except Exception as exc:
+                # The lease expires and another worker retries the job
+                print(f"Job {job['_id']} could not be recorded: {exc}")
+
+    async def _process(self, job: Dict[str, Any]):
+        job_id = job["_id"]
+        if job.get("attempts", 1) > self.max_attempts:
+            self.failed += 1
+            await self._record(job_id, {"status": "failed", "error": "Deneme sınırı aşıldı"},
+                               new_event("job", "failed", error="too many attempts"))
+            await self._failed(job)
+            return
+
+        async def progress(stage: str, status: str = "done", **details):
+            await self._record(job_id, {"stage": stage}, new_event(stage, status, **details))
+
+        renewal = asyncio.ensure_future(self._renew_lease(job_id))
+        try:
+            try:
+                fields = await self.handler(job, progress)
+            finally:
+                renewal.cancel()
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back instead of waiting for the lease to expire
+            await self._record(job_id, {"status": "queued", "lease_until": 0}, new_event("job", "requeued"))
+            raise
+        except Exception as exc:
+            self.failed += 1
+            detail = getattr(exc, "detail", None) or str(exc)
+            await self._record(job_id, {"status": "failed", "error": detail}, new_event("job", "failed", error=detail))
+            await self._failed(job)
+            return
+        self.completed += 1
+        await self._record(job_id, {"status": "done", **(fields or {})}, new_event("job", "done"))
+
+    async def _renew_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.lease_s / 3)
+            try:
+                await self.store.update(job_id, {"lease_until": time.time() + self.lease_s})
+            except Exception as exc:
+                # Retried on the next beat; the lease lasts two more
+                print(f"Lease renewal of job {job_id} failed: {exc}")
+
+    async def _failed(self, job: Dict[str, Any]):
+        if self.on_failed is None:
+            return
+        try:
+            await self.on_failed(job)
+        except Exception as exc:
+            print(f"Cleanup of failed job {job['_id']} failed: {exc}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.store.backend,
+            "workers": len(self._tasks),
+            "completed": self.completed,
+            "failed": self.failed,
+            "subscribers": sum(len(v) for v in self._listeners.values()),
+        }
@@ -0,0 +1,29 @@
+"""Single-process API server.
+
+Usage (from the backend directory):
+
+    python main.py [--host 0.0.0.0] [--port 8001]
+
+or, equivalently, ``uvicorn server:app --host 0.0.0.0 --port 8001``.
+``python server.py`` runs this module.
+
+PDF report workers and inference workers are started with spawn, which
+re-imports the main module in every child. Keeping the main module this
+small means the children do not rebuild the API (executors, database
+clients, pools) that ``server`` sets up at import.
+"""
+import argparse
+
+import uvicorn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args(argv)
+    uvicorn.run("server:app", host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
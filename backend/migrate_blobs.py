@@ -0,0 +1,80 @@
+"""Move inline base64 images of existing analyses into the blob store.
+
+Usage (from the backend directory, same environment as the server):
+
+    python migrate_blobs.py [--dry-run] [--limit N]
+
+Records are converted one by one: the JPEG bytes are stored under their
+content hash, ``image_ref``/``thumbnail_ref`` are set and the base64 fields
+are removed. Already migrated records are skipped, so the tool can be re-run.
+"""
+import argparse
+import asyncio
+import base64
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from blob_store import create_blob_store
+from storage import create_client
+
+FIELDS = (
+    ("image_base64", "image_ref"),
+    ("thumbnail", "thumbnail_ref"),
+)
+
+
+async def migrate(args):
+    load_dotenv()
+    mongo_url = os.environ.get("MONGO_URL", "mongodb://localhost:27017/autodamageid")
+    backend = os.environ.get("BLOB_STORE", "local")
+    root = os.environ.get("BLOB_STORE_PATH", str(Path(__file__).parent / "blobs"))
+
+    db = create_client(mongo_url).autodamageid
+    analyses = db.analyses
+    store = create_blob_store(backend, database=db, root=root)
+
+    query = {"$or": [{legacy: {"$exists": True}} for legacy, _ in FIELDS]}
+    projection = {legacy: 1 for legacy, _ in FIELDS}
+    cursor = analyses.find(query, projection)
+    if args.limit:
+        cursor = cursor.limit(args.limit)
+
+    migrated = 0
+    saved_bytes = 0
+    async for doc in cursor:
+        update = {"$set": {}, "$unset": {}}
+        for legacy, ref_field in FIELDS:
+            encoded = doc.get(legacy)
+            if encoded is None:
+                continue
+            update["$unset"][legacy] = ""
+            if not encoded:
+                continue
+            data = base64.b64decode(encoded)
+            saved_bytes += len(encoded) - len(data)
+            if not args.dry_run:
+                update["$set"][ref_field] = await store.put(data, "image/jpeg")
+
+        if not update["$set"]:
+            del update["$set"]
+        if not args.dry_run:
+            await analyses.update_one({"_id": doc["_id"]}, update)
+        migrated += 1
+
+    action = "Would migrate" if args.dry_run else "Migrated"
+    print(f"{action} {migrated} analyses to the {store.backend} blob store "
+          f"({saved_bytes / 1e6:.1f} MB of base64 overhead removed)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate inline base64 images to the blob store")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be migrated")
+    parser.add_argument("--limit", type=int, default=0, help="maximum number of records (0 = all)")
+    args = parser.parse_args()
+    asyncio.run(migrate(args))
+
+
+if __name__ == "__main__":
+    main()
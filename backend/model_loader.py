@@ -0,0 +1,152 @@
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import cv2
+import numpy as np
+import torch
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+# Inference runtimes; exported graphs are produced by src/yolo/export_models.py
+# and INT8 graphs by quantize_models.py
+BACKENDS = ("torch", "onnx", "onnx_int8", "openvino")
+
+# torch.load is swapped process-wide while a checkpoint loads; serialize it
+_torch_load_lock = threading.Lock()
+
+
+def backend_model_path(weights: Path, backend: str) -> Path:
+    """Location of the exported model for a ``.pt`` checkpoint (ultralytics export layout)"""
+    weights = Path(weights)
+    if backend == "torch":
+        return weights
+    if backend == "onnx":
+        return weights.with_suffix(".onnx")
+    if backend == "onnx_int8":
+        return weights.with_name(f"{weights.stem}_int8.onnx")
+    if backend == "openvino":
+        return weights.parent / f"{weights.stem}_openvino_model"
+    raise ValueError(f"Unknown inference backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+def load_yolo(path: Path, task: Optional[str] = None):
+    """Load a YOLO checkpoint or exported graph.
+
+    Custom-trained YOLO checkpoints contain model classes, which PyTorch 2.6+
+    refuses to unpickle by default, so ``.pt`` files are loaded with full
+    unpickling. Exported graphs (ONNX, OpenVINO) need the task given explicitly.
+    """
+    from ultralytics import YOLO
+
+    path = Path(path)
+    if path.suffix != ".pt":
+        if not path.exists():
+            raise FileNotFoundError(f"Exported model not found: {path} (run src/yolo/export_models.py)")
+        return YOLO(str(path), task=task)
+
+    with _torch_load_lock:
+        original_load = torch.load
+
+        def full_load(*args, **kwargs):
+            kwargs["weights_only"] = False
+            return original_load(*args, **kwargs)
+
+        torch.load = full_load
+        try:
+            return YOLO(str(path), task=task)
+        finally:
+            torch.load = original_load
+
+
+def warmup_images(directory: Path, limit: int) -> List[np.ndarray]:
+    """Decode up to ``limit`` sample images used to warm up the models"""
+    images = []
+    for path in sorted(Path(directory).glob("*")):
+        if len(images) >= limit:
+            break
+        if path.suffix.lower() not in IMAGE_EXTENSIONS:
+            continue
+        image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if image is not None:
+            images.append(image)
+    return images
+
+
+class ModelLoader:
+    """Loads the damage and parts models once and tracks readiness.
+
+    ``load`` is idempotent and thread-safe: callers arriving while the models
+    load wait for that single load instead of starting another one. ``warmup``
+    pushes sample images through the full analysis path so kernel selection
+    and allocator growth happen before the first real request.
+    """
+
+    def __init__(self, paths: Dict[str, Path], tasks: Optional[Dict[str, str]] = None, backend: str = "torch"):
+        self.paths = paths
+        self.tasks = tasks or {}
+        self.backend = backend
+        self.models: Dict[str, Any] = {}
+        self.state = "starting"
+        self.error: Optional[str] = None
+        self.load_ms: Dict[str, float] = {}
+        self.warmup_ms: List[float] = []
+        self.warmup_batch_sizes: List[int] = []
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Any]:
+        with self._lock:
+            if self.models:
+                return self.models
+            self.state = "loading"
+            try:
+                models = {}
+                for name, path in self.paths.items():
+                    print(f"Loading {name} model from {path}")
+                    start = time.perf_counter()
+                    models[name] = load_yolo(path, self.tasks.get(name))
+                    self.load_ms[name] = round((time.perf_counter() - start) * 1000.0, 1)
+            except Exception as exc:
+                self.state = "failed"
+                self.error = str(exc)
+                raise
+            self.models = models
+            self.state = "loaded"
+            return self.models
+
+    def get(self, name: str):
+        return self.load()[name]
+
+    def warmup(self, analyze_fn: Callable[[List[np.ndarray]], Any], images: List[np.ndarray], batch_sizes: List[int]):
+        """Run ``analyze_fn`` once per batch size on the sample images"""
+        self.state = "warming_up"
+        try:
+            for batch_size in batch_sizes:
+                batch = [images[i % len(images)] for i in range(batch_size)] if images else []
+                if not batch:
+                    continue
+                start = time.perf_counter()
+                analyze_fn(batch)
+                self.warmup_ms.append(round((time.perf_counter() - start) * 1000.0, 1))
+                self.warmup_batch_sizes.append(batch_size)
+        except Exception as exc:
+            self.state = "failed"
+            self.error = str(exc)
+            raise
+        self.state = "ready"
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "status": self.state,
+            "error": self.error,
+            "backend": self.backend,
+            "load_ms": self.load_ms,
+            "warmup_ms": self.warmup_ms,
+            "warmup_batch_sizes": self.warmup_batch_sizes,
+            "device": str(next(iter(self.models.values())).device or "cpu") if self.models else None,
+        }
@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+# Power-of-two reductions applied by the JPEG decoder itself (DCT-domain scaling)
+REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+EXIF_ORIENTATION = 0x0112
+
+
+@dataclass
+class LetterboxMeta:
+    """How an original frame was placed inside the square model input"""
+    gain: float
+    pad_x: int
+    pad_y: int
+    orig_h: int
+    orig_w: int
+    size: int
+
+
+def letterbox(image_np: np.ndarray, imgsz: int = 640, color=(114, 114, 114)) -> Tuple[np.ndarray, LetterboxMeta]:
+    """Resize keeping aspect ratio and pad to a square ``imgsz`` frame (same as YOLO)"""
+    h, w = image_np.shape[:2]
+    gain = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * gain)), int(round(h * gain))
+
+    if (new_w, new_h) != (w, h):
+        image_np = cv2.resize(image_np, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    dw, dh = (imgsz - new_w) / 2, (imgsz - new_h) / 2
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    frame = cv2.copyMakeBorder(image_np, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+
+    return frame, LetterboxMeta(gain=gain, pad_x=left, pad_y=top, orig_h=h, orig_w=w, size=imgsz)
+
+
+def preprocess_batch(images: List[np.ndarray], imgsz: int = 640) -> Tuple[torch.Tensor, List[LetterboxMeta]]:
+    """Build one normalized BCHW RGB tensor shared by both models"""
+    frames, metas = [], []
+    for image_np in images:
+        frame, meta = letterbox(image_np, imgsz)
+        frames.append(frame)
+        metas.append(meta)
+
+    batch = np.stack(frames)[..., ::-1]  # BGR -> RGB
+    batch = np.ascontiguousarray(batch.transpose(0, 3, 1, 2))  # BHWC -> BCHW
+    tensor = torch.from_numpy(batch).float().div_(255.0)
+    return tensor, metas
+
+
+def scale_boxes_to_original(boxes: np.ndarray, meta: LetterboxMeta) -> np.ndarray:
+    """Map xyxy boxes from model input coordinates back to original pixels"""
+    boxes = np.array(boxes, dtype=np.float32, copy=True).reshape(-1, 4)
+    boxes[:, [0, 2]] -= meta.pad_x
+    boxes[:, [1, 3]] -= meta.pad_y
+    boxes /= meta.gain
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, meta.orig_w)
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, meta.orig_h)
+    return boxes
+
+
+def letterbox_crop(meta: LetterboxMeta, mask_h: int, mask_w: int) -> Tuple[float, float, float, float]:
+    """Region of a model-space mask (``mask_h`` x ``mask_w``) that holds the original frame"""
+    rx, ry = mask_w / meta.size, mask_h / meta.size
+    return (
+        meta.pad_x * rx,
+        meta.pad_y * ry,
+        (meta.pad_x + meta.orig_w * meta.gain) * rx,
+        (meta.pad_y + meta.orig_h * meta.gain) * ry,
+    )
+
+
+def encoded_image_size(contents: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) of an encoded image as OpenCV will orient it, read from the header only"""
+    try:
+        with Image.open(BytesIO(contents)) as image:
+            width, height = image.size
+            orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+    except Exception:
+        return None
+    # OpenCV applies the EXIF orientation; 5-8 swap width and height
+    return (height, width) if orientation in (5, 6, 7, 8) else (width, height)
+
+
+def decode_reduced(contents: bytes, max_side: int) -> Tuple[Optional[np.ndarray], Optional[Tuple[int, int]]]:
+    """Decode at the largest power-of-two reduction that keeps the longer side >= ``max_side``.
+
+    JPEGs are downscaled while decoding, so the full-resolution frame is never
+    materialized. Returns the image and the original (width, height).
+    """
+    nparr = np.frombuffer(contents, np.uint8)
+    size = encoded_image_size(contents)
+    flag = cv2.IMREAD_COLOR
+    if size is not None and max_side > 0:
+        for factor, reduced_flag in REDUCED_DECODE_FLAGS:
+            if max(size) / factor >= max_side:
+                flag = reduced_flag
+                break
+    image_np = cv2.imdecode(nparr, flag)
+    if image_np is None:
+        return None, None
+    h, w = image_np.shape[:2]
+    if size is None or flag == cv2.IMREAD_COLOR:
+        size = (w, h)
+    elif (w > h) != (size[0] > size[1]):
+        # Header and decoder disagree about the orientation; trust the decoded frame
+        size = (size[1], size[0])
+    return image_np, size
@@ -0,0 +1,237 @@
+"""INT8 post-training quantization of the exported ONNX models, with a report.
+
+Usage (from the backend directory, after ``src/yolo/export_models.py``):
+
+    python quantize_models.py [--calib-images 200] [--eval-images 100] [--report quantization_report.json]
+
+Both FP32 ONNX graphs are statically quantized (QDQ, per-channel INT8
+weights, UINT8 activations) with ONNX Runtime. Calibration images come from
+the local damage dataset written by ``src/yolo/prepare_damage_yolo.py`` and
+go through the same letterbox preprocessing as the server. The detection
+head is left in FP32 by default, which keeps box regression accurate for a
+small share of the speedup.
+
+Held-out dataset images (and ``assets/``) are then analyzed with the FP32
+and INT8 graphs through ``analyze_images``. The report compares model size,
+per-model latency and how well INT8 detections agree with FP32. Serve the
+result with ``INFERENCE_BACKEND=onnx_int8``.
+"""
+import argparse
+import json
+import random
+import re
+import tempfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+# Same inference settings as the server
+load_dotenv()
+
+import analysis
+from autodamageid.matching import box_iou_matrix
+from model_loader import IMAGE_EXTENSIONS, ModelLoader
+from preprocessing import preprocess_batch
+
+# Runs the damage and parts models side by side, as in the server
+model_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="model")
+
+DAMAGE_DATASET = analysis.SRC_PATH / "autodamageid" / "data" / "damage_yolo" / "images" / "train"
+
+
+def list_images(directory: Path):
+    return [p for p in sorted(Path(directory).glob("*")) if p.suffix.lower() in IMAGE_EXTENSIONS]
+
+
+def read_images(paths):
+    images = [cv2.imread(str(p), cv2.IMREAD_COLOR) for p in paths]
+    return [image for image in images if image is not None]
+
+
+class LetterboxCalibrationReader:
+    """Feeds calibration images to ONNX Runtime exactly as the server preprocesses them"""
+
+    def __init__(self, input_name: str, paths, imgsz: int):
+        self.input_name = input_name
+        self.paths = list(paths)
+        self.imgsz = imgsz
+        self._index = 0
+
+    def get_next(self):
+        while self._index < len(self.paths):
+            image = cv2.imread(str(self.paths[self._index]), cv2.IMREAD_COLOR)
+            self._index += 1
+            if image is not None:
+                tensor, _ = preprocess_batch([image], self.imgsz)
+                return {self.input_name: tensor.numpy()}
+        return None
+
+    def rewind(self):
+        self._index = 0
+
+
+def head_nodes(model) -> list:
+    """Nodes of the last module (Detect/Segment head) in an ultralytics ONNX export"""
+    indices = [int(m.group(1)) for node in model.graph.node for m in [re.match(r"/model\.(\d+)/", node.name)] if m]
+    if not indices:
+        return []
+    prefix = f"/model.{max(indices)}/"
+    return [node.name for node in model.graph.node if node.name.startswith(prefix)]
+
+
+def quantize(fp32_path: Path, int8_path: Path, calib_paths, imgsz: int, quantize_head: bool, method: str):
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    fp32_model = onnx.load(str(fp32_path))
+    input_name = fp32_model.graph.input[0].name
+    exclude = [] if quantize_head else head_nodes(fp32_model)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Shape inference and graph cleanup recommended before static quantization
+        prepared = Path(tmp) / "prepared.onnx"
+        try:
+            quant_pre_process(str(fp32_path), str(prepared), skip_symbolic_shape=True)
+        except Exception as exc:
+            print(f"Pre-processing skipped for {fp32_path.name}: {exc}")
+            prepared = fp32_path
+
+        quantize_static(
+            str(prepared),
+            str(int8_path),
+            LetterboxCalibrationReader(input_name, calib_paths, imgsz),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            calibrate_method=CalibrationMethod.Percentile if method == "percentile" else CalibrationMethod.MinMax,
+            nodes_to_exclude=exclude,
+        )
+
+    # ultralytics reads names/stride/task/imgsz from the model metadata
+    int8_model = onnx.load(str(int8_path))
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, str(int8_path))
+    return {"excluded_head_nodes": len(exclude), "calibration_images": len(calib_paths)}
+
+
+def agreement(reference_results, candidate_results, min_iou: float = 0.5):
+    """How well INT8 detections reproduce FP32 detections (FP32 taken as ground truth)"""
+    matched = ref_total = cand_total = 0
+    same_part = parts_equal = risk_equal = 0
+    conf_deltas = []
+    for reference, candidate in zip(reference_results, candidate_results):
+        ref, cand = reference["damages"], candidate["damages"]
+        ref_total += len(ref)
+        cand_total += len(cand)
+        iou = box_iou_matrix(
+            np.array([d["box"] for d in ref], dtype=float).reshape(-1, 4),
+            np.array([d["box"] for d in cand], dtype=float).reshape(-1, 4),
+        )
+        used = set()
+        for i, damage in enumerate(ref):
+            order = np.argsort(-iou[i]) if len(cand) else []
+            for j in order:
+                if iou[i, j] < min_iou:
+                    break
+                if j in used or cand[j]["type"] != damage["type"]:
+                    continue
+                used.add(j)
+                matched += 1
+                same_part += cand[j]["part"] == damage["part"]
+                conf_deltas.append(cand[j]["confidence"] - damage["confidence"])
+                break
+        parts_equal += Counter(p["name"] for p in reference["parts"]) == Counter(p["name"] for p in candidate["parts"])
+        risk_equal += reference["summary"]["risk_level"] == candidate["summary"]["risk_level"]
+
+    images = max(1, len(reference_results))
+    return {
+        "damage_recall": round(matched / max(1, ref_total), 3),
+        "damage_precision": round(matched / max(1, cand_total), 3),
+        "same_part_assignment": round(same_part / max(1, matched), 3),
+        "mean_confidence_delta": round(float(np.mean(conf_deltas)), 2) if conf_deltas else None,
+        "part_set_agreement": round(parts_equal / images, 3),
+        "risk_level_agreement": round(risk_equal / images, 3),
+        "fp32_damages": ref_total,
+        "int8_damages": cand_total,
+    }
+
+
+def run(loader, images):
+    """Analyze images one by one, returning results and per-model latencies"""
+    loader.load()
+    analysis.analyze_images(images[:1], loader, model_executor)  # one-time initialization
+    results, timings = [], {"damage_model": [], "parts_model": [], "total": []}
+    for image in images:
+        result = analysis.analyze_images([image], loader, model_executor)[0]
+        results.append(result)
+        t = result["timings_ms"]
+        timings["damage_model"].append(t["damage_model"])
+        timings["parts_model"].append(t["parts_model"])
+        timings["total"].append(t["preprocess"] + t["inference"] + t["postprocess"])
+    latency = {name: {"p50": round(float(np.percentile(v, 50)), 1), "p95": round(float(np.percentile(v, 95)), 1)}
+               for name, v in timings.items()}
+    return results, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize the exported ONNX models to INT8 and report the trade-off")
+    parser.add_argument("--dataset", default=str(DAMAGE_DATASET), help="calibration/evaluation image directory")
+    parser.add_argument("--calib-images", type=int, default=200)
+    parser.add_argument("--eval-images", type=int, default=100)
+    parser.add_argument("--method", default="minmax", choices=["minmax", "percentile"])
+    parser.add_argument("--quantize-head", action="store_true", help="also quantize the detection head")
+    parser.add_argument("--skip-quantize", action="store_true", help="only re-evaluate existing INT8 models")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report", default=None, help="also write the report to this JSON file")
+    args = parser.parse_args()
+
+    dataset = list_images(args.dataset)
+    if not dataset:
+        raise SystemExit(f"No images in {args.dataset}; run src/yolo/prepare_damage_yolo.py first")
+    random.Random(args.seed).shuffle(dataset)
+    calib_paths = dataset[:args.calib_images]
+    # Evaluation never reuses calibration images
+    eval_paths = dataset[args.calib_images:args.calib_images + args.eval_images] + list_images(analysis.ASSETS_DIR)
+
+    report = {"models": {}, "settings": vars(args)}
+    fp32_paths = analysis.model_paths("onnx")
+    int8_paths = analysis.model_paths("onnx_int8")
+    for name, fp32_path in fp32_paths.items():
+        if not fp32_path.exists():
+            raise SystemExit(f"{fp32_path} not found; run src/yolo/export_models.py first")
+        entry = {"fp32_mb": round(fp32_path.stat().st_size / 1e6, 2)}
+        if not args.skip_quantize:
+            print(f"Quantizing {name} model ({len(calib_paths)} calibration images)")
+            entry.update(quantize(fp32_path, int8_paths[name], calib_paths, analysis.INFERENCE_IMGSZ,
+                                  args.quantize_head, args.method))
+        entry["int8_mb"] = round(int8_paths[name].stat().st_size / 1e6, 2)
+        entry["size_ratio"] = round(entry["int8_mb"] / entry["fp32_mb"], 3)
+        report["models"][name] = entry
+
+    images = read_images(eval_paths)
+    print(f"Evaluating on {len(images)} images")
+    fp32_results, fp32_latency = run(ModelLoader(fp32_paths, analysis.MODEL_TASKS, backend="onnx"), images)
+    int8_results, int8_latency = run(ModelLoader(int8_paths, analysis.MODEL_TASKS, backend="onnx_int8"), images)
+
+    report["latency_ms"] = {"fp32": fp32_latency, "int8": int8_latency}
+    report["speedup_p50"] = {
+        stage: round(fp32_latency[stage]["p50"] / max(int8_latency[stage]["p50"], 1e-6), 2)
+        for stage in fp32_latency
+    }
+    report["agreement"] = agreement(fp32_results, int8_results)
+    report["evaluation_images"] = len(images)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""PDF report rendering.
+
+Kept free of model and database imports so reports can be rendered in a
+separate process pool without blocking the API process.
+"""
+import hashlib
+import json
+from io import BytesIO
+from typing import Any, Dict, Optional
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
+
+# Bump when the layout changes so cached reports are re-rendered
+REPORT_VERSION = 1
+
+# Paragraph styles are built once per process
+styles = getSampleStyleSheet()
+title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=24, spaceAfter=20)
+heading_style = ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=14, spaceAfter=10, spaceBefore=15)
+normal_style = styles['Normal']
+footer_style = ParagraphStyle('Footer', parent=normal_style, fontSize=9, textColor=colors.HexColor('#86868B'))
+
+
+def report_source_hash(analysis: Dict[str, Any]) -> str:
+    """Hash of everything the report depends on; a change invalidates the cached PDF"""
+    image_ref = analysis.get("image_ref") or {}
+    source = {
+        "version": REPORT_VERSION,
+        "created_at": analysis.get("created_at"),
+        "results": analysis.get("results"),
+        "image": image_ref.get("blob_id") or hashlib.sha256(
+            (analysis.get("image_base64") or "").encode("ascii")
+        ).hexdigest()
+    }
+    return hashlib.blake2b(json.dumps(source, sort_keys=True, default=str).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def render_pdf_report(analysis: Dict[str, Any], img_data: Optional[bytes]) -> bytes:
+    """Render the PDF report of an analysis (runs in a worker process)"""
+    analysis_id = str(analysis["_id"])
+    
+    # Create PDF in memory
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1.5*cm, bottomMargin=1.5*cm)
+    
+    elements = []
+    
+    # Title
+    elements.append(Paragraph("Araç Hasar Analiz Raporu", title_style))
+    elements.append(Paragraph(f"Tarih: {analysis['created_at'][:10]}", normal_style))
+    elements.append(Paragraph(f"Rapor ID: {analysis_id[:8]}", normal_style))
+    elements.append(Spacer(1, 20))
+    
+    # Add image
+    if img_data:
+        img_buffer = BytesIO(img_data)
+        img = RLImage(img_buffer, width=14*cm, height=10*cm, kind='proportional')
+        elements.append(img)
+        elements.append(Spacer(1, 20))
+    
+    # Summary
+    results = analysis['results']
+    summary = results['summary']
+    
+    elements.append(Paragraph("Özet", heading_style))
+    summary_data = [
+        ["Toplam Hasar", str(summary['total_damages'])],
+        ["Etkilenen Parça", str(summary['affected_parts'])],
+        ["Ortalama Şiddet", f"{summary['average_severity']}/5"],
+        ["Risk Seviyesi", summary['risk_level']]
+    ]
+    summary_table = Table(summary_data, colWidths=[6*cm, 6*cm])
+    summary_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F5F5F7')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1D1D1F')),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E5E5E7'))
+    ]))
+    elements.append(summary_table)
+    elements.append(Spacer(1, 20))
+    
+    # Damage details
+    if results['damages']:
+        elements.append(Paragraph("Hasar Detayları", heading_style))
+        damage_data = [["Hasar Tipi", "Parça", "Güven", "Şiddet"]]
+        for d in results['damages']:
+            severity_dots = "●" * d['severity'] + "○" * (5 - d['severity'])
+            damage_data.append([
+                d['type_tr'],
+                d['part_tr'] or "Belirsiz",
+                f"%{d['confidence']}",
+                severity_dots
+            ])
+        
+        damage_table = Table(damage_data, colWidths=[4*cm, 4*cm, 2.5*cm, 3.5*cm])
+        damage_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#000000')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E5E5E7')),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#FAFAFA')])
+        ]))
+        elements.append(damage_table)
+    else:
+        elements.append(Paragraph("Hasar tespit edilmedi.", normal_style))
+    
+    elements.append(Spacer(1, 30))
+    elements.append(Paragraph("Bu rapor AutoDamageID yapay zeka sistemi tarafından otomatik olarak oluşturulmuştur.", footer_style))
+    
+    doc.build(elements)
+    return buffer.getvalue()
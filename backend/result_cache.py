@@ -0,0 +1,146 @@
+import asyncio
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+
+def file_fingerprint(paths: Iterable[Path], extra: str = "") -> str:
+    """Identity of a set of model weight files (path and content)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for path in paths:
+        path = Path(path)
+        digest.update(str(path.resolve()).encode("utf-8"))
+        if path.exists():
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+    digest.update(extra.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Content-addressed cache of analysis results.
+
+    Entries are keyed by a hash of the decoded image pixels plus the model
+    fingerprint, so a different ``DAMAGE_MODEL_PATH``/``PARTS_MODEL_PATH`` (or
+    retrained weights) never hits old entries. Lookups go through a bounded
+    in-process LRU first and then the persistent (Motor) collection. The
+    fingerprint hashes the weight files, so from async code it is computed
+    on ``executor`` (see ``load_fingerprint``).
+    """
+
+    def __init__(self, collection=None, max_entries: int = 256, fingerprint_fn=None, executor=None):
+        self.collection = collection
+        self.max_entries = max(0, int(max_entries))
+        self.fingerprint_fn = fingerprint_fn
+        self.executor = executor
+
+        self._fingerprint: Optional[str] = None
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            self._fingerprint = self.fingerprint_fn() if self.fingerprint_fn else ""
+        return self._fingerprint
+
+    async def load_fingerprint(self) -> str:
+        """Compute the fingerprint off the event loop (once)"""
+        if self._fingerprint is None:
+            await asyncio.get_running_loop().run_in_executor(self.executor, lambda: self.fingerprint)
+        return self._fingerprint
+
+    def key_for(self, image_np: np.ndarray) -> str:
+        """Cache key of a decoded image for the current models"""
+        digest = hashlib.blake2b(digest_size=32)
+        digest.update(self.fingerprint.encode("utf-8"))
+        digest.update(str(image_np.shape).encode("utf-8"))
+        digest.update(np.ascontiguousarray(image_np).data)
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up results (LRU tier, then persistent tier)"""
+        with self._lock:
+            results = self._entries.get(key)
+            if results is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return copy.deepcopy(results)
+
+        if self.collection is not None:
+            try:
+                doc = await self.collection.find_one({"_id": key})
+            except Exception as exc:
+                print(f"Result cache lookup failed: {exc}")
+                self.errors += 1
+                doc = None
+            if doc is not None:
+                self.persistent_hits += 1
+                self._remember(key, doc["results"])
+                return copy.deepcopy(doc["results"])
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, results: Dict[str, Any]):
+        """Store results in both tiers"""
+        self._remember(key, copy.deepcopy(results))
+
+        if self.collection is not None:
+            try:
+                await self.collection.replace_one(
+                    {"_id": key},
+                    {
+                        "_id": key,
+                        "model_fingerprint": self.fingerprint,
+                        "results": results,
+                        "created_at": datetime.utcnow().isoformat()
+                    },
+                    upsert=True
+                )
+            except Exception as exc:
+                print(f"Result cache store failed: {exc}")
+                self.errors += 1
+
+    def _remember(self, key: str, results: Dict[str, Any]):
+        if self.max_entries == 0:
+            return
+        with self._lock:
+            self._entries[key] = results
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def purge_stale(self) -> int:
+        """Delete persistent entries produced by other model weights"""
+        if self.collection is None:
+            return 0
+        fingerprint = await self.load_fingerprint()
+        result = await self.collection.delete_many({"model_fingerprint": {"$ne": fingerprint}})
+        return result.deleted_count
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.persistent_hits + self.misses
+        return {
+            "model_fingerprint": self._fingerprint,
+            "memory_entries": len(self._entries),
+            "max_memory_entries": self.max_entries,
+            "persistent": self.collection is not None,
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round((self.memory_hits + self.persistent_hits) / max(1, lookups), 3),
+        }
@@ -0,0 +1,62 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+class PartOverlap(BaseModel):
+    part_index: int
+    part: str
+    part_tr: str
+    fraction: float
+
+
+class DamageResult(BaseModel):
+    id: str
+    type: str
+    type_tr: str
+    confidence: float
+    severity: int
+    box: List[float]
+    part: Optional[str] = None
+    part_tr: Optional[str] = None
+    part_box: Optional[List[float]] = None
+    iou_with_part: float
+    part_overlap: Optional[float] = None
+    part_overlaps: List[PartOverlap] = []
+    damage_to_part_area_ratio: Optional[float] = None
+    match_method: str = "box"
+
+
+class MaskRLE(BaseModel):
+    size: List[int]
+    counts: List[int]
+
+
+class PartResult(BaseModel):
+    name: str
+    name_tr: str
+    box: List[float]
+    mask_rle: Optional[MaskRLE] = None
+    mask_area: Optional[float] = None
+
+
+class AnalysisSummary(BaseModel):
+    total_damages: int
+    affected_parts: int
+    average_severity: float
+    risk_level: str
+
+
+class ImageSize(BaseModel):
+    width: int
+    height: int
+
+
+class AnalysisResult(BaseModel):
+    damages: List[DamageResult]
+    parts: List[PartResult]
+    summary: AnalysisSummary
+    image_size: ImageSize
+    # Resolution the models saw when the upload was decoded reduced (boxes are in image_size pixels)
+    decoded_size: Optional[ImageSize] = None
+    timings_ms: Optional[Dict[str, float]] = None
@@ -0,0 +1,218 @@
+"""Pre-fork multi-worker server: models are loaded once and shared copy-on-write.
+
+Usage (from the backend directory, Linux):
+
+    python serve.py --workers 4 [--port 8001] [--torch-threads 2] [--report-after 30]
+
+The parent process loads both models, runs the warmup batches (so YOLO's
+one-time layer fusion and predictor setup write to the weights before the
+fork), freezes the garbage collector and then forks the workers. Every worker
+serves the same listening socket with its own event loop, executors, MongoDB
+client and torch intra-op thread count (CPU cores / workers by default), and
+reads the weight tensors from pages shared with the parent. A worker that
+exits is forked again from the parent, still without reloading the models.
+
+Only the torch backend is preloaded: ONNX Runtime and OpenVINO sessions own
+thread pools that do not survive a fork, so with those backends each worker
+loads its models after the fork as ``server.py`` does.
+
+``--report-after`` seconds after start (and on SIGUSR1) the parent prints a
+JSON memory report from /proc/<pid>/smaps_rollup: RSS, PSS, shared and
+private memory of the parent and every worker. Private memory is the actual
+per-worker overhead; PSS sums to the real total.
+
+Per-process state: each worker creates its report process pool, job store
+connection and MongoDB connections at startup, after the fork. The
+write-behind queue, renditions in progress, report renders and SSE wake-ups
+stay local to one worker. With several workers, PERSIST_BEFORE_RESPONSE is
+on, so /api/analyze answers only once the analysis and its images are
+stored and any worker can serve the follow-up reads. SSE streams see jobs
+run by other workers through the job store (polled every 0.5 s) rather than
+in-process notifications. Concurrent identical PDF renders are not shared
+across workers, and a blob deleted by one worker while another is still
+storing the same bytes can be lost.
+
+Modules imported at the top stay lightweight: report workers are started
+with spawn and re-run this script before unpickling their work.
+"""
+import argparse
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+def preload_models(server):
+    """Load and warm up the models in the parent without leaving threads behind"""
+    import torch
+    from model_loader import warmup_images
+
+    # Thread pools do not survive fork: warm up single-threaded and with a short-lived executor
+    torch.set_num_threads(1)
+    server.model_loader.load()
+    images = warmup_images(server.ASSETS_DIR, server.MODEL_WARMUP_IMAGES)
+    shared_executor = server.model_executor
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="warmup") as executor:
+        server.model_executor = executor
+        try:
+            server.model_loader.warmup(server.analyze_images, images, server.warmup_batch_sizes(images))
+        finally:
+            server.model_executor = shared_executor
+    print(f"Models ready before fork: {server.model_loader.status()}")
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(server, sock: socket.socket, torch_threads: int, log_level: str):
+    import torch
+    import uvicorn
+
+    for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1, signal.SIGALRM):
+        signal.signal(signum, signal.SIG_DFL)
+    torch.set_num_threads(torch_threads)
+    config = uvicorn.Config(server.app, log_level=log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def memory_usage(pid: int) -> dict:
+    """Memory of one process in MiB (from smaps_rollup)"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+
+    def mb(*names):
+        return round(sum(fields.get(name, 0) for name in names) / 1024.0, 1)
+
+    return {
+        "pid": pid,
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss"),
+        "shared_mb": mb("Shared_Clean", "Shared_Dirty"),
+        "private_mb": mb("Private_Clean", "Private_Dirty"),
+    }
+
+
+def memory_report(parent_pid: int, worker_pids) -> dict:
+    parent = memory_usage(parent_pid)
+    workers = []
+    for pid in sorted(worker_pids):
+        try:
+            workers.append(memory_usage(pid))
+        except OSError:
+            continue  # exited meanwhile
+    return {
+        "parent": parent,
+        "workers": workers,
+        "worker_private_mb_avg": round(sum(w["private_mb"] for w in workers) / max(1, len(workers)), 1),
+        "total_pss_mb": round(parent["pss_mb"] + sum(w["pss_mb"] for w in workers), 1),
+        # What the workers would take if none of their pages were shared
+        "total_rss_mb": round(parent["rss_mb"] + sum(w["rss_mb"] for w in workers), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API from pre-forked workers sharing the model weights")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--torch-threads", type=int, default=0,
+                        help="intra-op threads per worker (0 = CPU cores / workers)")
+    parser.add_argument("--report-after", type=float, default=30.0,
+                        help="seconds until the memory report is printed (0 = only on SIGUSR1)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs fork(); use server.py on this platform")
+
+    workers = max(1, args.workers)
+    torch_threads = args.torch_threads or max(1, (os.cpu_count() or 1) // workers)
+
+    # Other workers cannot see this worker's queued writes and renditions (see above)
+    if workers > 1:
+        os.environ.setdefault("PERSIST_BEFORE_RESPONSE", "1")
+    import server
+
+    if server.inference_pool is not None:
+        print("INFERENCE_WORKERS is set: models live in the inference worker processes of each server worker")
+    elif server.INFERENCE_BACKEND == "torch":
+        preload_models(server)
+    else:
+        print(f"{server.INFERENCE_BACKEND} backend: each worker loads its own models")
+
+    # Objects created so far are never collected; the collector then leaves their pages shared
+    gc.collect()
+    gc.freeze()
+
+    sock = bind_socket(args.host, args.port)
+    parent_pid = os.getpid()
+    children = {}
+    stopping = False
+
+    def fork_worker():
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(server, sock, torch_threads, args.log_level)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = True
+        print(f"Worker {pid} started ({torch_threads} torch threads)")
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def report(signum=None, frame=None):
+        print(json.dumps(memory_report(parent_pid, children), indent=2), flush=True)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, report)
+    signal.signal(signal.SIGALRM, report)
+
+    for _ in range(workers):
+        fork_worker()
+    if args.report_after > 0:
+        signal.setitimer(signal.ITIMER_REAL, args.report_after)
+
+    print(f"Serving on {args.host}:{args.port} with {workers} workers (parent {parent_pid})")
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.pop(pid, None)
+        if not stopping:
+            print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+            time.sleep(1.0)  # avoid a tight fork loop when workers fail at startup
+            fork_worker()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
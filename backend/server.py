@@ -1,18 +1,36 @@
 import os
 import sys
 import uuid
+import json
+import zipfile
 import base64
-import torch
+import binascii
+import asyncio
+import functools
+import time
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 from io import BytesIO
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+if __name__ == "__main__":
+    # "python server.py" runs the main.py entry point in this process. main.py stands in as the
+    # __main__ module while it runs, so processes started with spawn (PDF reports, inference
+    # workers) re-import that small module instead of re-running this file
+    import runpy
+    runpy.run_module("main", run_name="__main__", alter_sys=True)
+    sys.exit()
+
+import torch
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Request, BackgroundTasks
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, JSONResponse, StreamingResponse
 from pydantic import BaseModel
-from pymongo import MongoClient
+from pymongo import ASCENDING, DESCENDING
 from dotenv import load_dotenv
 import numpy as np
 import cv2
@@ -31,7 +49,26 @@ sys.path.insert(0, str(SRC_PATH))
 # Set environment variable to allow unsafe loading for YOLO models
 os.environ['TORCH_FORCE_WEIGHTS_ONLY_LOAD'] = '0'
 
-from ultralytics import YOLO
+from inference_scheduler import InferenceScheduler
+from result_cache import ResultCache, file_fingerprint
+from blob_store import create_blob_store, blob_hash
+from storage import PoolMonitor, WriteBehindQueue, create_client
+from job_queue import JobQueue, TERMINAL_STATES, create_job_store
+from video import DamageTracker, FrameSampler
+from http_caching import cached_bytes_response, not_modified_response
+from upload_limits import BodySizeLimit
+from result_models import AnalysisResult, AnalysisSummary
+from reports import render_pdf_report, report_source_hash
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Callback, Counter, Histogram, Registry
+from model_loader import ModelLoader, warmup_images
+from inference_pool import InferencePool
+from preprocessing import decode_reduced
+import analysis
+from analysis import (
+    ASSETS_DIR, INFERENCE_BACKEND, INFERENCE_CONF, INFERENCE_IMGSZ, MASK_GRID_STRIDE, MASK_MATCH_THRESHOLD,
+    MODEL_TASKS, MODEL_WARMUP_IMAGES, PARTS_TR, TILE_MAX_PER_IMAGE, TILE_NMS_IOU, TILE_OVERLAP, TILE_SIZE,
+    TILED_INFERENCE, model_paths, new_damage_id, summarize_damages,
+)
 
 # Initialize FastAPI
 app = FastAPI(
@@ -40,6 +77,11 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Upload routes refuse oversized bodies before receiving them; limits are set next to each route's
+# settings below. Added before CORS so 413 responses still carry CORS headers.
+upload_body_limits: Dict[str, tuple] = {}
+app.add_middleware(BodySizeLimit, limits=upload_body_limits)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -47,348 +89,1302 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id", "X-Batch-Id"],
 )
 
-# MongoDB connection
+# Metrics (Prometheus text format on /metrics)
+TRACE_IDS = os.environ.get("TRACE_IDS", "1") == "1"
+
+metrics_registry = Registry()
+STAGE_SECONDS = metrics_registry.register(Histogram(
+    "autodamageid_stage_seconds", "Time spent in each analysis pipeline stage", ["stage"]
+))
+REQUEST_SECONDS = metrics_registry.register(Histogram(
+    "autodamageid_http_request_seconds", "HTTP request latency by route", ["method", "route"]
+))
+REQUESTS = metrics_registry.register(Counter(
+    "autodamageid_http_requests_total", "HTTP requests by route and status", ["method", "route", "status"]
+))
+DETECTIONS = metrics_registry.register(Counter(
+    "autodamageid_detections_total", "Damages reported by /api/analyze per class", ["type"]
+))
+ERRORS = metrics_registry.register(Counter(
+    "autodamageid_errors_total", "Failures by stage", ["stage"]
+))
+
+# MongoDB connection (async driver with an explicitly sized connection pool)
 MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017/autodamageid")
-client = MongoClient(MONGO_URL)
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_TIMEOUT_MS = int(os.environ.get("MONGO_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+MONGO_WRITE_CONCERN = os.environ.get("MONGO_WRITE_CONCERN", "1")
+MONGO_JOURNAL = os.environ.get("MONGO_JOURNAL", "0") == "1"
+
+# Analysis inserts are batched off the request path
+MONGO_WRITE_BATCH_SIZE = int(os.environ.get("MONGO_WRITE_BATCH_SIZE", "50"))
+MONGO_WRITE_FLUSH_MS = float(os.environ.get("MONGO_WRITE_FLUSH_MS", "20"))
+# Failed batches stay queued and are retried; requests reading their own writes wait at most this long
+MONGO_WRITE_WAIT_S = float(os.environ.get("MONGO_WRITE_WAIT_S", "10"))
+# Queued inserts and renditions in progress are only visible to this process. With several server
+# processes (serve.py sets this), responses wait until both are stored so any process can serve
+# the follow-up reads of /api/analyses/{id} and its images.
+PERSIST_BEFORE_RESPONSE = os.environ.get("PERSIST_BEFORE_RESPONSE", "0") == "1"
+
+pool_monitor = PoolMonitor()
+client = create_client(
+    MONGO_URL,
+    max_pool_size=MONGO_MAX_POOL_SIZE,
+    min_pool_size=MONGO_MIN_POOL_SIZE,
+    timeout_ms=MONGO_TIMEOUT_MS,
+    socket_timeout_ms=MONGO_SOCKET_TIMEOUT_MS,
+    write_concern=MONGO_WRITE_CONCERN,
+    journal=MONGO_JOURNAL,
+    monitor=pool_monitor,
+)
 db = client.autodamageid
 analyses_collection = db.analyses
 
-# Model paths
-YOLO_DIR = Path(__file__).parent.parent / "src" / "yolo"
-DAMAGE_MODEL_PATH = YOLO_DIR / "weights" / "best.pt"
-PARTS_MODEL_PATH = YOLO_DIR / "runs" / "carparts_seg_v1" / "weights" / "best.pt"
+def observe_db_flush(documents: int, seconds: float, ok: bool):
+    STAGE_SECONDS.observe(seconds, stage="db_write")
+    if not ok:
+        ERRORS.inc(documents, stage="db_write")
+
+analysis_writer = WriteBehindQueue(
+    analyses_collection, MONGO_WRITE_BATCH_SIZE, MONGO_WRITE_FLUSH_MS, on_flush=observe_db_flush
+)
+
+# Uploads are read in chunks up to UPLOAD_MAX_BYTES. Large photos are decoded reduced so the longer
+# side stays >= DECODE_MAX_SIDE: enough for inference (letterboxed to INFERENCE_IMGSZ), the stored
+# JPEG and the PDF report; tiled mode keeps more detail (0 decodes at full resolution)
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Request body allowance beyond the file itself (multipart boundaries, part headers, form fields)
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+upload_body_limits["/api/analyze"] = (UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD, "Dosya boyut sınırını aşıyor")
+upload_body_limits["/api/jobs"] = upload_body_limits["/api/analyze"]
+DECODE_MAX_SIDE = int(os.environ.get("DECODE_MAX_SIDE", "2560" if TILED_INFERENCE else "1600"))
+
+# Inference result cache (in-process LRU + Mongo collection)
+RESULT_CACHE_SIZE = int(os.environ.get("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_PERSIST = os.environ.get("RESULT_CACHE_PERSIST", "1") == "1"
 
-# Load models (lazy loading)
-damage_model = None
-parts_model = None
+# Micro-batching configuration
+INFERENCE_MAX_BATCH_SIZE = int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", "8"))
+INFERENCE_MAX_WAIT_MS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", "10"))
+
+# Out-of-process inference: worker processes receive frames through shared memory (0 = run the
+# models in this process). Each worker runs one batch at a time with its own torch threads.
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "0"))
+INFERENCE_WORKER_THREADS = int(os.environ.get("INFERENCE_WORKER_THREADS", "0"))
+INFERENCE_WORKER_TIMEOUT_S = float(os.environ.get("INFERENCE_WORKER_TIMEOUT_S", "120"))
+
+# Worker pools (keep blocking work off the asyncio event loop)
+INFERENCE_POOL_SIZE = int(os.environ.get("INFERENCE_POOL_SIZE", str(max(1, INFERENCE_WORKERS))))
+CPU_POOL_SIZE = int(os.environ.get("CPU_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+IO_POOL_SIZE = int(os.environ.get("IO_POOL_SIZE", "8"))
+
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_POOL_SIZE, thread_name_prefix="inference")
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_POOL_SIZE, thread_name_prefix="cpu")
+# Local blob store file I/O (MongoDB and GridFS calls are async and need no threads)
+io_executor = ThreadPoolExecutor(max_workers=IO_POOL_SIZE, thread_name_prefix="io")
+
+# Image blob storage ("local" filesystem or "gridfs"); documents only hold references
+BLOB_STORE = os.environ.get("BLOB_STORE", "local")
+BLOB_STORE_PATH = os.environ.get("BLOB_STORE_PATH", str(Path(__file__).parent / "blobs"))
+blob_store = create_blob_store(BLOB_STORE, database=db, root=BLOB_STORE_PATH, executor=io_executor)
+
+# PDF rendering is pure Python (GIL-bound), so it runs in worker processes
+REPORT_POOL_SIZE = int(os.environ.get("REPORT_POOL_SIZE", "2"))
+REPORT_PREGENERATE = os.environ.get("REPORT_PREGENERATE", "1") == "1"
+
+# Stored renditions are derived together from the decoded frame after the response is sent.
+# The display JPEG and thumbnail are always stored; WebP and an annotated overlay are optional.
+RENDITION_WEBP = os.environ.get("RENDITION_WEBP", "0") == "1"
+RENDITION_ANNOTATED = os.environ.get("RENDITION_ANNOTATED", "0") == "1"
+# Longest wait of image/report/delete requests (and of shutdown) for renditions in progress
+RENDITION_WAIT_S = float(os.environ.get("RENDITION_WAIT_S", "10"))
+# name -> (document field, media type, legacy base64 field)
+RENDITIONS = {
+    "image": ("image_ref", "image/jpeg", "image_base64"),
+    "thumbnail": ("thumbnail_ref", "image/jpeg", "thumbnail"),
+    "webp": ("webp_ref", "image/webp", None),
+    "annotated": ("annotated_ref", "image/jpeg", None),
+}
+# Created at startup: its pipes must belong to one process, and serve.py forks after import
+report_executor: Optional[ProcessPoolExecutor] = None
+
+inference_pool = InferencePool(
+    INFERENCE_WORKERS,
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+    torch_threads=INFERENCE_WORKER_THREADS,
+    timeout_s=INFERENCE_WORKER_TIMEOUT_S,
+) if INFERENCE_WORKERS > 0 else None
+
+# Runs the damage and parts models side by side within a batch
+model_executor = ThreadPoolExecutor(max_workers=2 * INFERENCE_POOL_SIZE, thread_name_prefix="model")
+
+async def run_blocking(executor, fn, *args, **kwargs):
+    """Run a blocking call on the given executor without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+# Fire-and-forget tasks (referenced here so they are not garbage collected mid-flight)
+pending_tasks = set()
+
+def spawn(coro):
+    task = asyncio.ensure_future(coro)
+    pending_tasks.add(task)
+    task.add_done_callback(pending_tasks.discard)
+    return task
+
+# Models are loaded once at startup (requests arriving earlier wait for that load)
+model_loader = ModelLoader(model_paths(INFERENCE_BACKEND), MODEL_TASKS, backend=INFERENCE_BACKEND)
 
 def get_damage_model():
-    global damage_model
-    if damage_model is None:
-        print(f"Loading damage model from {DAMAGE_MODEL_PATH}")
-        # Use weights_only=False for YOLO custom models
-        import torch
-        original_load = torch.load
-        def patched_load(*args, **kwargs):
-            kwargs['weights_only'] = False
-            return original_load(*args, **kwargs)
-        torch.load = patched_load
-        damage_model = YOLO(str(DAMAGE_MODEL_PATH))
-        torch.load = original_load
-    return damage_model
+    return model_loader.get("damage")
 
 def get_parts_model():
-    global parts_model
-    if parts_model is None:
-        print(f"Loading parts model from {PARTS_MODEL_PATH}")
-        # Use weights_only=False for YOLO custom models
-        import torch
-        original_load = torch.load
-        def patched_load(*args, **kwargs):
-            kwargs['weights_only'] = False
-            return original_load(*args, **kwargs)
-        torch.load = patched_load
-        parts_model = YOLO(str(PARTS_MODEL_PATH))
-        torch.load = original_load
-    return parts_model
-
-# Damage type translations
-DAMAGE_TR = {
-    "crack": "Çatlak",
-    "dent": "Göçük",
-    "glass_shatter": "Cam Kırığı",
-    "lamp_broken": "Lamba Kırığı",
-    "scratch": "Çizik",
-    "tire_flat": "Patlak Lastik"
-}
+    return model_loader.get("parts")
 
-# Part name translations
-PARTS_TR = {
-    "back_bumper": "Arka Tampon",
-    "back_door": "Arka Kapı",
-    "back_glass": "Arka Cam",
-    "back_left_door": "Arka Sol Kapı",
-    "back_left_light": "Arka Sol Far",
-    "back_light": "Arka Far",
-    "back_right_door": "Arka Sağ Kapı",
-    "back_right_light": "Arka Sağ Far",
-    "front_bumper": "Ön Tampon",
-    "front_door": "Ön Kapı",
-    "front_glass": "Ön Cam",
-    "front_left_door": "Ön Sol Kapı",
-    "front_left_light": "Ön Sol Far",
-    "front_light": "Ön Far",
-    "front_right_door": "Ön Sağ Kapı",
-    "front_right_light": "Ön Sağ Far",
-    "hood": "Kaput",
-    "left_mirror": "Sol Ayna",
-    "object": "Nesne",
-    "right_mirror": "Sağ Ayna",
-    "tailgate": "Bagaj Kapağı",
-    "trunk": "Bagaj",
-    "wheel": "Tekerlek"
-}
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
 
-# Severity mapping based on damage type
-SEVERITY_MAP = {
-    "crack": 3,
-    "dent": 3,
-    "glass_shatter": 5,
-    "lamp_broken": 4,
-    "scratch": 2,
-    "tire_flat": 4
-}
+def analyze_images(images: List[np.ndarray], loader: Optional[ModelLoader] = None) -> List[Dict[str, Any]]:
+    """Run damage detection and parts segmentation on a batch of images"""
+    if not images:
+        return []
+    if inference_pool is not None and loader is None:
+        return analyze_images_in_pool(images)
+    return analysis.analyze_images(images, loader or model_loader, model_executor, observe_stage)
 
-def convert_numpy_types(obj):
-    """Convert numpy types to Python native types for JSON/MongoDB serialization"""
-    if isinstance(obj, np.integer):
-        return int(obj)
-    elif isinstance(obj, np.floating):
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, dict):
-        return {k: convert_numpy_types(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_numpy_types(item) for item in obj]
-    return obj
-
-def convert_to_native_types(obj):
-    """Recursively convert all numpy types to native Python types"""
-    import json
-    
-    def default_converter(o):
-        if isinstance(o, (np.integer, np.int64, np.int32)):
-            return int(o)
-        elif isinstance(o, (np.floating, np.float64, np.float32)):
-            return float(o)
-        elif isinstance(o, np.ndarray):
-            return o.tolist()
-        elif isinstance(o, np.bool_):
-            return bool(o)
-        raise TypeError(f"Object of type {type(o)} is not JSON serializable")
-    
-    # Convert to JSON string and back to ensure all numpy types are converted
-    json_str = json.dumps(obj, default=default_converter)
-    return json.loads(json_str)
-
-def box_iou(box_a, box_b):
-    """Calculate IoU between two boxes [x1, y1, x2, y2]"""
-    x1 = max(float(box_a[0]), float(box_b[0]))
-    y1 = max(float(box_a[1]), float(box_b[1]))
-    x2 = min(float(box_a[2]), float(box_b[2]))
-    y2 = min(float(box_a[3]), float(box_b[3]))
-    
-    inter_w = max(0.0, x2 - x1)
-    inter_h = max(0.0, y2 - y1)
-    inter_area = inter_w * inter_h
-    
-    area_a = max(0.0, (float(box_a[2]) - float(box_a[0])) * (float(box_a[3]) - float(box_a[1])))
-    area_b = max(0.0, (float(box_b[2]) - float(box_b[0])) * (float(box_b[3]) - float(box_b[1])))
-    
-    union = area_a + area_b - inter_area + 1e-6
-    return float(inter_area / union)
+def analyze_images_in_pool(images: List[np.ndarray]) -> List[Dict[str, Any]]:
+    """Thin client of the inference worker processes; stage timings are recorded here"""
+    results = inference_pool.analyze(images)
+    timings = results[0]["timings_ms"]
+    for stage in ("preprocess", "damage_model", "parts_model"):
+        STAGE_SECONDS.observe(timings[stage] / 1000.0, stage=stage)
+    if timings.get("tiles"):
+        STAGE_SECONDS.observe(timings["tile_model"] / 1000.0, stage="tile_model")
+    for result in results:
+        STAGE_SECONDS.observe(result["timings_ms"]["postprocess"] / 1000.0, stage="matching")
+    return results
 
 def analyze_image(image_np: np.ndarray) -> Dict[str, Any]:
     """Run damage detection and parts segmentation on image"""
+    return analyze_images([image_np])[0]
+
+def map_result_to_original(results: Dict[str, Any], decoded_shape, original_size) -> Dict[str, Any]:
+    """Copy of a result computed on a reduced decode with boxes and areas in original pixels"""
+    h, w = decoded_shape[:2]
+    orig_w, orig_h = original_size
+    if (w, h) == (orig_w, orig_h):
+        return results
+    sx, sy = orig_w / w, orig_h / h
     
-    damage_mod = get_damage_model()
-    parts_mod = get_parts_model()
-    
-    h, w = image_np.shape[:2]
-    
-    # Run damage detection
-    damage_results = damage_mod.predict(
-        source=image_np,
-        imgsz=640,
-        conf=0.05,
-        verbose=False
-    )[0]
-    
-    # Run parts segmentation
-    parts_results = parts_mod.predict(
-        source=image_np,
-        imgsz=640,
-        conf=0.05,
-        verbose=False
-    )[0]
-    
-    # Extract damage boxes
-    dmg_boxes = damage_results.boxes.xyxy.cpu().numpy() if damage_results.boxes is not None else np.zeros((0, 4))
-    dmg_cls = damage_results.boxes.cls.cpu().numpy().astype(int) if damage_results.boxes is not None else np.zeros((0,), int)
-    dmg_conf = damage_results.boxes.conf.cpu().numpy() if damage_results.boxes is not None else np.zeros((0,))
-    dmg_names = damage_mod.names
-    
-    # Extract part boxes
-    part_boxes = parts_results.boxes.xyxy.cpu().numpy() if parts_results.boxes is not None else np.zeros((0, 4))
-    part_cls = parts_results.boxes.cls.cpu().numpy().astype(int) if parts_results.boxes is not None else np.zeros((0,), int)
-    part_names = parts_mod.names
-    
-    # Match damages to parts
-    damages = []
-    for i, dmg_box in enumerate(dmg_boxes):
-        best_iou = 0.0
-        best_part = None
-        best_part_box = None
-        
-        for j, part_box in enumerate(part_boxes):
-            iou = box_iou(dmg_box, part_box)
-            if iou > best_iou:
-                best_iou = iou
-                best_part = part_names[int(part_cls[j])]
-                best_part_box = [float(x) for x in part_box.tolist()]
-        
-        damage_type = dmg_names[int(dmg_cls[i])]
-        confidence = float(dmg_conf[i])
-        
-        damage_entry = {
-            "id": str(uuid.uuid4())[:8],
-            "type": damage_type,
-            "type_tr": DAMAGE_TR.get(damage_type, damage_type),
-            "confidence": float(round(confidence * 100, 1)),
-            "severity": int(SEVERITY_MAP.get(damage_type, 3)),
-            "box": [float(x) for x in dmg_box.tolist()],
-            "part": best_part if best_iou > 0.1 else None,
-            "part_tr": PARTS_TR.get(best_part, best_part) if best_iou > 0.1 else None,
-            "part_box": best_part_box if best_iou > 0.1 else None,
-            "iou_with_part": float(round(best_iou, 3))
-        }
-        damages.append(damage_entry)
-    
-    # Extract unique parts detected
-    parts = []
-    for j, part_box in enumerate(part_boxes):
-        part_name = part_names[int(part_cls[j])]
-        parts.append({
-            "name": part_name,
-            "name_tr": PARTS_TR.get(part_name, part_name),
-            "box": [float(x) for x in part_box.tolist()]
-        })
-    
-    # Calculate summary
-    total_damages = len(damages)
-    affected_parts = len(set([d["part"] for d in damages if d["part"]]))
-    avg_severity = float(round(sum([d["severity"] for d in damages]) / max(1, total_damages), 1))
-    
-    risk_level = "Düşük"
-    if avg_severity >= 4 or total_damages >= 4:
-        risk_level = "Yüksek"
-    elif avg_severity >= 2.5 or total_damages >= 2:
-        risk_level = "Orta"
+    def scale_box(box):
+        return [box[0] * sx, box[1] * sy, box[2] * sx, box[3] * sy] if box is not None else None
     
-    result = {
+    damages = [{**d, "box": scale_box(d["box"]), "part_box": scale_box(d["part_box"])} for d in results["damages"]]
+    parts = [
+        {**p, "box": scale_box(p["box"]),
+         "mask_area": round(p["mask_area"] * sx * sy, 1) if p.get("mask_area") is not None else None}
+        for p in results["parts"]
+    ]
+    return {
+        **results,
         "damages": damages,
         "parts": parts,
-        "summary": {
-            "total_damages": int(total_damages),
-            "affected_parts": int(affected_parts),
-            "average_severity": float(avg_severity),
-            "risk_level": risk_level
-        },
-        "image_size": {"width": int(w), "height": int(h)}
+        "image_size": {"width": int(orig_w), "height": int(orig_h)},
+        "decoded_size": {"width": int(w), "height": int(h)}
     }
-    
-    # Convert all numpy types to native Python types
-    return convert_numpy_types(result)
+
+# Result cache keyed by image hash + model weights identity
+def model_fingerprint() -> str:
+    settings = (f"imgsz={INFERENCE_IMGSZ};conf={INFERENCE_CONF};stride={MASK_GRID_STRIDE};"
+                f"match={MASK_MATCH_THRESHOLD};decode={DECODE_MAX_SIDE}")
+    if TILED_INFERENCE:
+        settings += f";tiles={TILE_SIZE},{TILE_OVERLAP},{TILE_MAX_PER_IMAGE},{TILE_NMS_IOU}"
+    paths = list(model_paths(INFERENCE_BACKEND).values())
+    # OpenVINO models are directories; fingerprint the files inside them
+    files = [f for p in paths for f in (sorted(p.rglob("*")) if p.is_dir() else [p]) if not f.is_dir()]
+    return file_fingerprint(files, extra=f"{settings};backend={INFERENCE_BACKEND}")
+
+result_cache = ResultCache(
+    collection=db.inference_cache if RESULT_CACHE_PERSIST else None,
+    max_entries=RESULT_CACHE_SIZE,
+    fingerprint_fn=model_fingerprint,
+    executor=io_executor,
+)
+
+def reuse_cached_result(results: Dict[str, Any]) -> Dict[str, Any]:
+    """Cached results as a new analysis: fresh damage ids and no timings of the original inference"""
+    results.pop("timings_ms", None)
+    for damage in results["damages"]:
+        damage["id"] = new_damage_id()
+    return results
+
+# Inference scheduler (groups concurrent requests into batches)
+inference_scheduler = InferenceScheduler(
+    analyze_images,
+    max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=INFERENCE_MAX_WAIT_MS,
+    executor=inference_executor,
+    concurrency=INFERENCE_POOL_SIZE,
+    on_batch=lambda waits, seconds: [STAGE_SECONDS.observe(w, stage="queue_wait") for w in waits],
+)
+
+# Scrape-time views of existing counters and gauges
+metrics_registry.register(Callback(
+    "autodamageid_cache_lookups_total", "Result cache lookups by outcome",
+    lambda: {"memory_hit": result_cache.memory_hits, "persistent_hit": result_cache.persistent_hits,
+             "miss": result_cache.misses},
+    type="counter", labelname="result"
+))
+metrics_registry.register(Callback(
+    "autodamageid_inference_queue_depth", "Images waiting for an inference batch",
+    lambda: inference_scheduler.stats()["queue_depth"]
+))
+metrics_registry.register(Callback(
+    "autodamageid_inference_batch_errors_total", "Inference batches that raised",
+    lambda: inference_scheduler.stats()["errors"], type="counter"
+))
+metrics_registry.register(Callback(
+    "autodamageid_db_write_queue_depth", "Analyses waiting to be written to MongoDB",
+    lambda: analysis_writer.stats()["pending"]
+))
+metrics_registry.register(Callback(
+    "autodamageid_db_write_retries_total", "Failed analysis batch writes retried",
+    lambda: analysis_writer.stats()["write_retries"], type="counter"
+))
+metrics_registry.register(Callback(
+    "autodamageid_db_write_dropped_total", "Analyses dropped by the write queue at shutdown",
+    lambda: analysis_writer.stats()["documents_failed"], type="counter"
+))
+metrics_registry.register(Callback(
+    "autodamageid_mongo_connections", "MongoDB pool connections by state",
+    lambda: {"open": pool_monitor.open, "checked_out": pool_monitor.checked_out},
+    labelname="state"
+))
+metrics_registry.register(Callback(
+    "autodamageid_models_ready", "1 once models are loaded and warmed up",
+    lambda: int(models_ready())
+))
+if inference_pool is not None:
+    metrics_registry.register(Callback(
+        "autodamageid_inference_worker_restarts_total", "Inference worker processes restarted after a crash, timeout or failed start",
+        lambda: inference_pool.restarts, type="counter"
+    ))
+    metrics_registry.register(Callback(
+        "autodamageid_inference_workers_ready", "Inference worker processes ready to serve",
+        lambda: inference_pool.status()["ready_workers"]
+    ))
+
+def inference_status() -> Dict[str, Any]:
+    return inference_pool.status() if inference_pool is not None else model_loader.status()
+
+def models_ready() -> bool:
+    return inference_pool.ready if inference_pool is not None else model_loader.ready
+
+@app.on_event("startup")
+async def start_inference_scheduler():
+    inference_scheduler.start()
+
+def warmup_batch_sizes(images: List[np.ndarray]) -> List[int]:
+    return analysis.warmup_batch_sizes(images, INFERENCE_MAX_BATCH_SIZE)
+
+async def load_and_warmup_models():
+    # Inference workers load their own models
+    if inference_pool is not None:
+        await run_blocking(model_executor, inference_pool.start)
+        return
+    # Workers forked by serve.py inherit models already loaded and warmed up
+    if model_loader.ready:
+        return
+    try:
+        await run_blocking(model_executor, model_loader.load)
+        images = await run_blocking(cpu_executor, warmup_images, ASSETS_DIR, MODEL_WARMUP_IMAGES)
+        await run_blocking(inference_executor, model_loader.warmup, analyze_images, images, warmup_batch_sizes(images))
+        print(f"Models ready: {model_loader.status()}")
+    except Exception as exc:
+        print(f"Model startup failed: {exc}")
+
+@app.on_event("startup")
+async def start_model_loading():
+    # Runs in the background so /api/health and /api/ready answer while loading
+    spawn(load_and_warmup_models())
+
+@app.on_event("startup")
+async def start_report_executor():
+    global report_executor
+    report_executor = ProcessPoolExecutor(max_workers=REPORT_POOL_SIZE, mp_context=multiprocessing.get_context("spawn"))
+
+@app.on_event("startup")
+async def start_analysis_writer():
+    analysis_writer.start()
+
+async def ensure_indexes():
+    """Indexes backing history pagination, filters and blob reference lookups"""
+    await analyses_collection.create_index([("created_at", DESCENDING), ("_id", DESCENDING)])
+    await analyses_collection.create_index([("results.summary.risk_level", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)])
+    await analyses_collection.create_index([("results.damages.type", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)])
+    await analyses_collection.create_index("image_ref.blob_id")
+    await analyses_collection.create_index("thumbnail_ref.blob_id")
+    await analyses_collection.create_index("webp_ref.blob_id")
+    await analyses_collection.create_index("annotated_ref.blob_id")
+    await analyses_collection.create_index("report_ref.blob_id")
+
+@app.on_event("startup")
+async def create_indexes():
+    try:
+        await ensure_indexes()
+    except Exception as exc:
+        print(f"Index creation skipped: {exc}")
+
+@app.on_event("startup")
+async def purge_stale_cache_entries():
+    try:
+        deleted = await result_cache.purge_stale()
+        if deleted:
+            print(f"Removed {deleted} cached results of previous model weights")
+    except Exception as exc:
+        print(f"Result cache cleanup skipped: {exc}")
+
+@app.on_event("shutdown")
+async def stop_inference_scheduler():
+    # Running jobs are interrupted; their leases expire and they are retried after restart
+    await job_queue.stop()
+    await inference_scheduler.stop()
+    # Let in-flight renditions (and ones whose response never went out) store their references,
+    # then flush queued analysis inserts
+    unstarted = [derive_and_store_renditions(analysis_id) for analysis_id in list(rendition_inputs)]
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(*unstarted, *rendition_tasks.values(), return_exceptions=True), RENDITION_WAIT_S
+        )
+    except asyncio.TimeoutError:
+        print(f"Stopped with renditions of {len(rendition_tasks)} analyses unfinished")
+    await analysis_writer.stop()
+    if inference_pool is not None:
+        await run_blocking(model_executor, inference_pool.stop)
+    for executor in (inference_executor, model_executor, cpu_executor, io_executor, report_executor):
+        executor.shutdown(wait=False)
+    client.close()
 
 # Pydantic models
 class AnalysisResponse(BaseModel):
     id: str
     created_at: str
-    image_base64: str
-    results: Dict[str, Any]
+    image_url: str
+    thumbnail_url: str
+    results: AnalysisResult
 
 class AnalysisListItem(BaseModel):
     id: str
     created_at: str
-    thumbnail: str
-    summary: Dict[str, Any]
+    thumbnail_url: str
+    summary: AnalysisSummary
+    filename: Optional[str]
+
+class AnalysisPage(BaseModel):
+    items: List[AnalysisListItem]
+    next_cursor: Optional[str]
+
+def image_url(analysis_id: str) -> str:
+    return f"/api/analyses/{analysis_id}/image"
+
+def thumbnail_url(analysis_id: str) -> str:
+    return f"/api/analyses/{analysis_id}/thumbnail"
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """Request latency/status metrics and an X-Trace-Id response header"""
+    trace_id = request.headers.get("x-trace-id") or request.headers.get("x-request-id") or uuid.uuid4().hex
+    request.state.trace_id = trace_id
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    except Exception:
+        ERRORS.inc(stage="request")
+        print(f"Unhandled error (trace {trace_id}) on {request.method} {request.url.path}")
+        raise
+    finally:
+        # Route templates keep label cardinality bounded (no analysis ids)
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, route=route_path)
+        REQUESTS.inc(method=request.method, route=route_path, status=status)
+    if TRACE_IDS:
+        response.headers["X-Trace-Id"] = trace_id
+    return response
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
 
 @app.get("/api/health")
 async def health_check():
-    return {"status": "healthy", "service": "AutoDamageID"}
+    return {
+        "status": "healthy",
+        "service": "AutoDamageID",
+        "database": {"pool": pool_monitor.stats(), "writes": analysis_writer.stats()},
+        "jobs": job_queue.stats()
+    }
 
-@app.post("/api/analyze", response_model=AnalysisResponse)
-async def analyze_vehicle(file: UploadFile = File(...)):
-    """Upload and analyze a vehicle image for damage detection"""
+@app.get("/api/ready")
+async def readiness_check():
+    """Readiness probe: 200 once models are loaded and warmed up, 503 before"""
+    return JSONResponse(inference_status(), status_code=200 if models_ready() else 503)
+
+@app.get("/api/inference/stats")
+async def inference_stats():
+    """Queue depth and batch-size statistics of the inference scheduler"""
+    stats = inference_scheduler.stats()
+    if inference_pool is not None:
+        stats["workers"] = inference_pool.status()
+    return stats
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Hit/miss counters of the inference result cache"""
+    return result_cache.stats()
+
+def decode_image(contents: bytes):
+    """Decode uploaded bytes into a BGR image no larger than needed; returns it with the original (width, height)"""
+    with STAGE_SECONDS.time(stage="decode"):
+        return decode_reduced(contents, DECODE_MAX_SIDE)
+
+async def read_upload(upload: UploadFile, limit: int) -> bytearray:
+    """Read a received upload into one preallocated buffer, refusing files over ``limit`` bytes.
     
-    # Validate file type
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="Sadece resim dosyaları kabul edilir")
+    The request body itself is capped by BodySizeLimit before it is received;
+    this applies the per-file limit (e.g. the remaining batch budget).
+    """
+    if upload.size is not None and upload.size > limit:
+        raise HTTPException(status_code=413, detail="Dosya boyut sınırını aşıyor")
+    buffer = bytearray(upload.size or 0)
+    size = 0
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        if size + len(chunk) > limit:
+            raise HTTPException(status_code=413, detail="Dosya boyut sınırını aşıyor")
+        # Overwrites the preallocated bytes in place (appends when the size was unknown)
+        buffer[size:size + len(chunk)] = chunk
+        size += len(chunk)
+    del buffer[size:]
+    return buffer
+
+def encode_jpeg(image_np: np.ndarray) -> bytes:
+    """Encode the stored full-size JPEG"""
+    with STAGE_SECONDS.time(stage="jpeg_encode"):
+        _, buffer = cv2.imencode('.jpg', image_np, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        return buffer.tobytes()
+
+def encode_thumbnail(image_np: np.ndarray) -> bytes:
+    """Downscale and encode the history thumbnail"""
+    with STAGE_SECONDS.time(stage="thumbnail"):
+        thumb_size = 200
+        h, w = image_np.shape[:2]
+        scale = thumb_size / max(h, w)
+        thumb = cv2.resize(image_np, (int(w * scale), int(h * scale)))
+        _, thumb_buffer = cv2.imencode('.jpg', thumb, [cv2.IMWRITE_JPEG_QUALITY, 60])
+        return thumb_buffer.tobytes()
+
+def encode_webp(image_np: np.ndarray) -> bytes:
+    """Encode the optional WebP variant of the display image"""
+    with STAGE_SECONDS.time(stage="webp_encode"):
+        _, buffer = cv2.imencode('.webp', image_np, [cv2.IMWRITE_WEBP_QUALITY, 80])
+        return buffer.tobytes()
+
+SEVERITY_COLORS = {5: (48, 59, 255), 4: (0, 149, 255), 3: (10, 204, 255), 2: (89, 199, 52)}
+
+def draw_damage_boxes(image_np: np.ndarray, results: Dict[str, Any]) -> np.ndarray:
+    """Copy of the frame with damage boxes (results are in original pixels, the frame may be reduced)"""
+    annotated = image_np.copy()
+    h, w = image_np.shape[:2]
+    sx, sy = w / results["image_size"]["width"], h / results["image_size"]["height"]
+    thickness = max(2, round(max(h, w) / 400))
+    for damage in results["damages"]:
+        x1, y1, x2, y2 = damage["box"]
+        p1, p2 = (int(x1 * sx), int(y1 * sy)), (int(x2 * sx), int(y2 * sy))
+        color = SEVERITY_COLORS.get(damage["severity"], (10, 204, 255))
+        cv2.rectangle(annotated, p1, p2, color, thickness)
+        # Hershey fonts are ASCII only, so the label uses the English class name
+        cv2.putText(annotated, f'{damage["type"]} {damage["confidence"]:.0f}%', (p1[0], max(p1[1] - 2 * thickness, 12)),
+                    cv2.FONT_HERSHEY_SIMPLEX, thickness / 4, color, max(1, thickness // 2), cv2.LINE_AA)
+    return annotated
+
+def derive_renditions(image_np: np.ndarray, results: Dict[str, Any]) -> Dict[str, bytes]:
+    """Encode every stored rendition of one decoded frame in a single pass (name -> bytes)"""
+    renditions = {"image": encode_jpeg(image_np), "thumbnail": encode_thumbnail(image_np)}
+    if RENDITION_WEBP:
+        renditions["webp"] = encode_webp(image_np)
+    if RENDITION_ANNOTATED:
+        renditions["annotated"] = encode_jpeg(draw_damage_boxes(image_np, results))
+    return renditions
+
+async def store_renditions(renditions: Dict[str, bytes]) -> Dict[str, Dict[str, Any]]:
+    """Put the renditions into the blob store; returns {document field: reference}"""
+    refs = await asyncio.gather(*(blob_store.put(data, RENDITIONS[name][1]) for name, data in renditions.items()))
+    return {RENDITIONS[name][0]: ref for name, ref in zip(renditions, refs)}
+
+# Analyses whose renditions are still being derived, so image/report reads can wait for them
+rendition_tasks: Dict[str, asyncio.Future] = {}
+# (analysis document, decoded frame) of renditions not started yet; whoever starts them takes the entry
+rendition_inputs: Dict[str, tuple] = {}
+
+# Blobs put by this process whose references are not persisted yet; release_blobs keeps them.
+# Blobs are content-addressed, so a new analysis may put the bytes an older one is deleting.
+held_blobs: Dict[str, int] = {}
+
+def hold_blobs(blob_ids: List[str]):
+    for blob_id in blob_ids:
+        held_blobs[blob_id] = held_blobs.get(blob_id, 0) + 1
+
+def unhold_blobs(blob_ids: List[str]):
+    for blob_id in blob_ids:
+        held_blobs[blob_id] -= 1
+        if not held_blobs[blob_id]:
+            del held_blobs[blob_id]
+
+async def derive_and_store_renditions(analysis_id: str):
+    """Background half of an analysis: renditions, their references, then the PDF report (runs once)"""
+    inputs = rendition_inputs.pop(analysis_id, None)
+    if inputs is None:
+        return
+    analysis_doc, image_np = inputs
+    blob_ids = []
+    try:
+        renditions = await run_blocking(cpu_executor, derive_renditions, image_np, analysis_doc["results"])
+        blob_ids = [blob_hash(data) for data in renditions.values()]
+        hold_blobs(blob_ids)
+        with STAGE_SECONDS.time(stage="blob_write"):
+            refs = await store_renditions(renditions)
+        # Readers of the still-queued document see the references at once
+        analysis_doc.update(refs)
+        if await analysis_writer.wait_written(analysis_id):
+            await analyses_collection.update_one({"_id": analysis_id}, {"$set": refs})
+    except Exception as exc:
+        ERRORS.inc(stage="renditions")
+        print(f"Renditions failed for {analysis_id}: {exc}")
+        return
+    finally:
+        unhold_blobs(blob_ids)
+        done = rendition_tasks.pop(analysis_id, None)
+        if done is not None and not done.done():
+            done.set_result(None)
     
-    # Read image
-    contents = await file.read()
+    if REPORT_PREGENERATE:
+        # Detached: a request deriving the renditions on demand does not wait for the PDF
+        spawn(pregenerate_report(analysis_doc))
+
+def schedule_renditions(analysis_doc: Dict[str, Any], image_np: np.ndarray, background_tasks: Optional[BackgroundTasks] = None):
+    """Derive renditions after the response (``background_tasks``) or right away as a detached task.
     
-    # Convert to numpy array
-    nparr = np.frombuffer(contents, np.uint8)
-    image_np = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    Background tasks only run once the response is sent. If that never
+    happens (client gone, send failed), a detached task starts them after
+    RENDITION_WAIT_S instead.
+    """
+    analysis_id = analysis_doc["_id"]
+    loop = asyncio.get_running_loop()
+    rendition_tasks[analysis_id] = loop.create_future()
+    rendition_inputs[analysis_id] = (analysis_doc, image_np)
+    if background_tasks is not None:
+        background_tasks.add_task(derive_and_store_renditions, analysis_id)
+        loop.call_later(RENDITION_WAIT_S, lambda: spawn(derive_and_store_renditions(analysis_id)))
+    else:
+        spawn(derive_and_store_renditions(analysis_id))
+
+async def wait_for_renditions(analysis_id: str):
+    """Wait up to RENDITION_WAIT_S for renditions in progress; ones not started by then are derived here"""
+    pending = rendition_tasks.get(analysis_id)
+    if pending is None:
+        return
+    try:
+        await asyncio.wait_for(asyncio.shield(pending), RENDITION_WAIT_S)
+    except asyncio.TimeoutError:
+        if analysis_id in rendition_inputs:
+            await derive_and_store_renditions(analysis_id)
+        else:
+            print(f"Renditions of {analysis_id} still running after {RENDITION_WAIT_S:.0f}s")
+
+async def load_blob(analysis: Dict[str, Any], ref_field: str, legacy_field: str) -> Optional[bytes]:
+    """Raw bytes of a stored rendition (blob reference or legacy base64 field)"""
+    ref = analysis.get(ref_field)
+    if ref:
+        return await blob_store.get(ref["blob_id"])
+    if analysis.get(legacy_field):
+        return base64.b64decode(analysis[legacy_field])
+    return None
+
+BLOB_REF_FIELDS = [ref_field for ref_field, _, _ in RENDITIONS.values()] + ["report_ref"]
+
+def blob_pending(blob_id: str) -> bool:
+    """Whether a blob is held by an unfinished write or referenced by a still-queued analysis"""
+    if blob_id in held_blobs:
+        return True
+    return any(
+        (doc.get(field) or {}).get("blob_id") == blob_id
+        for doc in analysis_writer.pending_documents() for field in BLOB_REF_FIELDS
+    )
+
+async def release_blobs(analysis: Dict[str, Any]):
+    """Delete blobs of a removed analysis that no other analysis references"""
+    for field in BLOB_REF_FIELDS:
+        ref = analysis.get(field)
+        if not ref or blob_pending(ref["blob_id"]):
+            continue
+        
+        async def unused(blob_id=ref["blob_id"], field=field):
+            referenced = await analyses_collection.count_documents({f"{field}.blob_id": blob_id}, limit=1)
+            # Held again while the count ran (a new analysis putting the same bytes)
+            return not referenced and not blob_pending(blob_id)
+        
+        await blob_store.delete_unused(ref["blob_id"], unused)
+
+async def find_analysis(analysis_id: str, projection: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
+    """Look up an analysis, including one still waiting in the write queue"""
+    pending = analysis_writer.get_pending(analysis_id)
+    if pending is not None:
+        return pending
+    return await analyses_collection.find_one({"_id": analysis_id}, projection)
+
+async def analyze_contents(
+    contents: bytes,
+    filename: Optional[str],
+    extra_fields: Optional[Dict[str, Any]] = None,
+    progress=None,
+    analysis_id: Optional[str] = None,
+    background_tasks: Optional[BackgroundTasks] = None
+):
+    """Decode, analyze and store one uploaded image; returns the response and the stored document.
+    
+    ``progress(stage, **details)`` (async) is awaited after decode, detect,
+    segment and store. Renditions and the report are produced afterwards
+    (see schedule_renditions).
+    """
+    async def report(stage: str, **details):
+        if progress is not None:
+            await progress(stage, **details)
+    
+    # Convert to numpy array (reduced while decoding when the photo is much larger than needed)
+    image_np, original_size = await run_blocking(cpu_executor, decode_image, contents)
     
     if image_np is None:
         raise HTTPException(status_code=400, detail="Resim okunamadı")
+    await report("decode", width=original_size[0], height=original_size[1],
+                 decoded_width=image_np.shape[1], decoded_height=image_np.shape[0])
     
-    # Analyze
-    results = analyze_image(image_np)
+    # Reuse results of an identical image analyzed with the same models
+    with STAGE_SECONDS.time(stage="cache_lookup"):
+        cache_key = await run_blocking(cpu_executor, result_cache.key_for, image_np)
+        results = await result_cache.get(cache_key)
     
-    # Ensure all numpy types are converted to native Python types
-    results = convert_to_native_types(results)
+    if results is None:
+        # Analyze (batched together with concurrent requests)
+        try:
+            with STAGE_SECONDS.time(stage="inference_total"):
+                results = await inference_scheduler.submit(image_np)
+        except Exception:
+            ERRORS.inc(stage="inference")
+            raise
+        spawn(result_cache.put(cache_key, results))
+        timings = results.get("timings_ms") or {}
+        # Both models run side by side in one batch, so both stages finish here
+        await report("detect", ms=timings.get("damage_model"), damages=len(results["damages"]))
+        await report("segment", ms=timings.get("parts_model"), parts=len(results["parts"]))
+    else:
+        results = reuse_cached_result(results)
+        await report("detect", cached=True, damages=len(results["damages"]))
+        await report("segment", cached=True, parts=len(results["parts"]))
     
-    # Convert image to base64 for storage/display
-    _, buffer = cv2.imencode('.jpg', image_np, [cv2.IMWRITE_JPEG_QUALITY, 85])
-    image_base64 = base64.b64encode(buffer).decode('utf-8')
+    # Cached results stay in decoded pixels; responses and records use original pixels
+    results = map_result_to_original(results, image_np.shape, original_size)
     
-    # Create thumbnail
-    thumb_size = 200
-    h, w = image_np.shape[:2]
-    scale = thumb_size / max(h, w)
-    thumb = cv2.resize(image_np, (int(w * scale), int(h * scale)))
-    _, thumb_buffer = cv2.imencode('.jpg', thumb, [cv2.IMWRITE_JPEG_QUALITY, 60])
-    thumbnail_base64 = base64.b64encode(thumb_buffer).decode('utf-8')
+    for damage in results["damages"]:
+        DETECTIONS.inc(type=damage["type"])
     
-    # Create analysis record
-    analysis_id = str(uuid.uuid4())
+    # Create analysis record (rendition references are added once they are stored)
+    analysis_id = analysis_id or str(uuid.uuid4())
     created_at = datetime.utcnow().isoformat()
     
     analysis_doc = {
         "_id": analysis_id,
         "created_at": created_at,
-        "image_base64": image_base64,
-        "thumbnail": thumbnail_base64,
         "results": results,
-        "filename": file.filename
+        "filename": filename,
+        **(extra_fields or {})
     }
     
-    # Save to MongoDB
-    analyses_collection.insert_one(analysis_doc)
+    # Save to MongoDB (batched write-behind; readable immediately via find_analysis)
+    analysis_writer.enqueue(analysis_doc)
+    if PERSIST_BEFORE_RESPONSE:
+        schedule_renditions(analysis_doc, image_np)
+        await wait_for_renditions(analysis_id)
+        await analysis_writer.wait_written(analysis_id, MONGO_WRITE_WAIT_S)
+    else:
+        schedule_renditions(analysis_doc, image_np, background_tasks)
+    await report("store", analysis_id=analysis_id)
     
-    return AnalysisResponse(
+    response = AnalysisResponse(
         id=analysis_id,
         created_at=created_at,
-        image_base64=image_base64,
+        image_url=image_url(analysis_id),
+        thumbnail_url=thumbnail_url(analysis_id),
         results=results
     )
+    return response, analysis_doc
 
-@app.get("/api/analyses")
-async def get_analyses(limit: int = 20):
-    """Get list of past analyses"""
-    analyses = list(analyses_collection.find().sort("created_at", -1).limit(limit))
-    
-    return [
-        {
-            "id": str(a["_id"]),
-            "created_at": a["created_at"],
-            "thumbnail": a.get("thumbnail", ""),
-            "summary": a["results"]["summary"],
-            "filename": a.get("filename", "Bilinmeyen")
-        }
-        for a in analyses
-    ]
+@app.post("/api/analyze", response_model=AnalysisResponse)
+async def analyze_vehicle(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+    """Upload and analyze a vehicle image for damage detection"""
+    
+    # Validate file type
+    if not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="Sadece resim dosyaları kabul edilir")
+    
+    # Read image
+    contents = await read_upload(file, UPLOAD_MAX_BYTES)
+    
+    # Renditions and the PDF report are produced after the response is sent
+    response, _ = await analyze_contents(contents, file.filename, background_tasks=background_tasks)
+    
+    return response
+
+# Batch uploads (many photos of one vehicle, as files and/or zip archives)
+BATCH_MAX_IMAGES = int(os.environ.get("BATCH_MAX_IMAGES", "100"))
+BATCH_MAX_BYTES = int(os.environ.get("BATCH_MAX_BYTES", str(300 * 1024 * 1024)))
+upload_body_limits["/api/analyze/batch"] = (BATCH_MAX_BYTES + UPLOAD_FORM_OVERHEAD, "Toplu yükleme boyut sınırını aşıyor")
+# Images of one batch decoded/analyzed at the same time (bounds memory; enough to fill inference batches)
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", str(2 * INFERENCE_MAX_BATCH_SIZE)))
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+RISK_ORDER = {"Düşük": 0, "Orta": 1, "Yüksek": 2}
+
+def extract_zip_images(data: bytes, budget: int) -> List[tuple]:
+    """(name, bytes) of the images inside a zip archive, bounded by the remaining byte budget"""
+    images = []
+    try:
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or Path(name).name.startswith(".") or not name.lower().endswith(IMAGE_SUFFIXES):
+                    continue
+                # Check the declared size before inflating anything
+                budget -= info.file_size
+                if budget < 0:
+                    raise HTTPException(status_code=413, detail="Toplu yükleme boyut sınırını aşıyor")
+                images.append((Path(name).name, archive.read(info)))
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Zip arşivi okunamadı")
+    return images
+
+def summarize_vehicle(batch_id: str, vehicle_id: Optional[str], items: List[Dict[str, Any]], failed: int) -> Dict[str, Any]:
+    """Aggregate per-image results of one vehicle"""
+    damage_types: Dict[str, int] = {}
+    affected_parts = set()
+    worst_risk = None
+    for item in items:
+        results = item["results"]
+        for damage in results["damages"]:
+            damage_types[damage["type"]] = damage_types.get(damage["type"], 0) + 1
+            if damage["part"]:
+                affected_parts.add(damage["part"])
+        risk = results["summary"]["risk_level"]
+        if worst_risk is None or RISK_ORDER.get(risk, 0) > RISK_ORDER.get(worst_risk, 0):
+            worst_risk = risk
+    return {
+        "type": "summary",
+        "batch_id": batch_id,
+        "vehicle_id": vehicle_id,
+        "images": len(items) + failed,
+        "analyzed": len(items),
+        "failed": failed,
+        "total_damages": sum(damage_types.values()),
+        "damage_types": damage_types,
+        "affected_parts": [{"name": p, "name_tr": PARTS_TR.get(p, p)} for p in sorted(affected_parts)],
+        "worst_risk_level": worst_risk,
+        "analysis_ids": [item["id"] for item in items]
+    }
+
+@app.post("/api/analyze/batch")
+async def analyze_vehicle_batch(files: List[UploadFile] = File(...), vehicle_id: Optional[str] = Form(None)):
+    """Analyze many images of one vehicle; streams one NDJSON line per image, then a summary line"""
+    uploads = []
+    budget = BATCH_MAX_BYTES
+    for upload in files:
+        data = await read_upload(upload, max(budget, 0))
+        name = upload.filename or "image"
+        content_type = upload.content_type or ""
+        if content_type in ("application/zip", "application/x-zip-compressed") or name.lower().endswith(".zip"):
+            entries = await run_blocking(cpu_executor, extract_zip_images, data, budget)
+            budget -= sum(len(d) for _, d in entries)
+            uploads.extend(entries)
+        elif content_type.startswith("image/"):
+            budget -= len(data)
+            if budget < 0:
+                raise HTTPException(status_code=413, detail="Toplu yükleme boyut sınırını aşıyor")
+            uploads.append((name, data))
+        if len(uploads) > BATCH_MAX_IMAGES:
+            raise HTTPException(status_code=400, detail=f"En fazla {BATCH_MAX_IMAGES} resim yüklenebilir")
+    if not uploads:
+        raise HTTPException(status_code=400, detail="Yüklemede resim bulunamadı")
+    
+    batch_id = str(uuid.uuid4())
+    extra_fields = {"batch_id": batch_id, "vehicle_id": vehicle_id}
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def analyze_one(index: int, name: str, data: bytes):
+        try:
+            async with slots:
+                response, _ = await analyze_contents(data, name, extra_fields)
+        except HTTPException as exc:
+            return index, name, None, exc.detail
+        except Exception as exc:
+            print(f"Batch {batch_id}: {name} failed: {exc}")
+            return index, name, None, "Analiz sırasında bir hata oluştu"
+        return index, name, response, None
+    
+    async def stream():
+        # Many images are in flight at once, so the scheduler groups them into full batches
+        tasks = [asyncio.ensure_future(analyze_one(i, name, data)) for i, (name, data) in enumerate(uploads)]
+        items, failed = [], 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                index, name, response, error = await next_done
+                if response is None:
+                    failed += 1
+                    line = {"type": "error", "index": index, "filename": name, "detail": error}
+                else:
+                    item = jsonable_encoder(response)
+                    items.append(item)
+                    line = {"type": "result", "index": index, "filename": name, "analysis": item}
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+            yield json.dumps(summarize_vehicle(batch_id, vehicle_id, items, failed), ensure_ascii=False) + "\n"
+        finally:
+            # Client went away: stop work that has not finished yet
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers={"X-Batch-Id": batch_id})
+
+# Video walk-around analysis (one deduplicated damage report per video)
+VIDEO_MAX_BYTES = int(os.environ.get("VIDEO_MAX_BYTES", str(500 * 1024 * 1024)))
+upload_body_limits["/api/analyze/video"] = (VIDEO_MAX_BYTES + UPLOAD_FORM_OVERHEAD, "Video boyut sınırını aşıyor")
+VIDEO_SAMPLE_FPS = float(os.environ.get("VIDEO_SAMPLE_FPS", "2"))
+# dHash bits (of 64) a sampled frame must differ from the last analyzed one by
+VIDEO_DUPLICATE_DISTANCE = int(os.environ.get("VIDEO_DUPLICATE_DISTANCE", "5"))
+VIDEO_MAX_SIDE = int(os.environ.get("VIDEO_MAX_SIDE", "1920"))
+# A damage counts once seen in this many analyzed frames, or once with high confidence
+VIDEO_MIN_TRACK_FRAMES = int(os.environ.get("VIDEO_MIN_TRACK_FRAMES", "2"))
+VIDEO_SINGLE_FRAME_CONFIDENCE = float(os.environ.get("VIDEO_SINGLE_FRAME_CONFIDENCE", "50"))
+VIDEO_SUFFIXES = (".mp4", ".mov", ".m4v", ".avi", ".mkv", ".webm")
+
+video_analyses_collection = db.video_analyses
+
+async def save_upload(upload: UploadFile, limit: int) -> str:
+    """Copy an upload to a temporary file chunk by chunk (OpenCV reads videos from a path)"""
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=Path(upload.filename or "").suffix)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise HTTPException(status_code=413, detail="Video boyut sınırını aşıyor")
+                await run_blocking(io_executor, out.write, chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path
+
+async def analyze_video_file(path: str) -> Dict[str, Any]:
+    """Sample, deduplicate and analyze the frames of a video, merging damages seen in several frames.
+    
+    Only two chunks of frames (the one being analyzed and the next one being
+    decoded) plus one JPEG per tracked damage are held at a time, so memory
+    does not grow with video length.
+    """
+    try:
+        sampler = await run_blocking(
+            cpu_executor, FrameSampler, path, VIDEO_SAMPLE_FPS, VIDEO_DUPLICATE_DISTANCE, VIDEO_MAX_SIDE
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Video okunamadı")
+    
+    tracker = DamageTracker(min_frames=VIDEO_MIN_TRACK_FRAMES, single_frame_confidence=VIDEO_SINGLE_FRAME_CONFIDENCE)
+    best_frames: Dict[int, tuple] = {}  # track -> (frame index, JPEG of its best frame)
+    next_read = None  # decode of the next chunk, running while the current one is analyzed
+    try:
+        frames = await run_blocking(cpu_executor, sampler.read, INFERENCE_MAX_BATCH_SIZE)
+        while frames:
+            next_read = cpu_executor.submit(sampler.read, INFERENCE_MAX_BATCH_SIZE)
+            try:
+                with STAGE_SECONDS.time(stage="inference_total"):
+                    results = await asyncio.gather(*(inference_scheduler.submit(frame) for _, _, frame in frames))
+            except BaseException:
+                ERRORS.inc(stage="inference")
+                raise
+            for (frame_index, timestamp, frame), result in zip(frames, results):
+                size = result["image_size"]
+                improved = tracker.update(frame_index, timestamp, result["damages"], size["width"], size["height"])
+                if improved:
+                    jpeg = await run_blocking(cpu_executor, encode_jpeg, frame)
+                    for track_id in improved:
+                        best_frames[track_id] = (frame_index, jpeg)
+                for track_id in tracker.discard_stale():
+                    best_frames.pop(track_id, None)
+            frames = await asyncio.wrap_future(next_read)
+            next_read = None
+    finally:
+        if next_read is not None:
+            # A read that already started cannot be cancelled; release the capture only once it returns
+            next_read.cancel()
+            await asyncio.gather(asyncio.wrap_future(next_read), return_exceptions=True)
+        await run_blocking(cpu_executor, sampler.close)
+    
+    # One stored keyframe per distinct frame holding the best view of some damage
+    keyframes: List[Dict[str, Any]] = []
+    keyframe_positions: Dict[int, int] = {}
+    damages = []
+    for track_id, track in tracker.merged():
+        frame_index, jpeg = best_frames[track_id]
+        if frame_index not in keyframe_positions:
+            with STAGE_SECONDS.time(stage="blob_write"):
+                image_ref = await blob_store.put(jpeg, "image/jpeg")
+            keyframe_positions[frame_index] = len(keyframes)
+            keyframes.append({
+                "frame_index": frame_index,
+                "timestamp_s": round(frame_index / sampler.fps, 2),
+                "image_ref": image_ref
+            })
+        damages.append({
+            **track.best,
+            "keyframe": keyframe_positions[frame_index],
+            "frames_seen": track.frames,
+            "first_seen_s": round(track.first_seen_s, 2),
+            "last_seen_s": round(track.last_seen_s, 2),
+            "mean_confidence": round(track.mean_confidence, 1)
+        })
+        DETECTIONS.inc(type=track.type)
+    
+    return {
+        "video": sampler.stats(),
+        "damages": damages,
+        "keyframes": keyframes,
+        "summary": summarize_damages(damages),
+        "tracks_joined": tracker.joined,
+        "tracks_discarded": tracker.discarded + len(tracker.tracks) - tracker.joined - len(damages)
+    }
+
+def video_response(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    analysis_id = str(analysis["_id"])
+    return {
+        "id": analysis_id,
+        "created_at": analysis["created_at"],
+        "filename": analysis.get("filename"),
+        "video": analysis["video"],
+        "summary": analysis["summary"],
+        "damages": analysis["damages"],
+        "keyframes": [
+            {
+                "frame_index": keyframe["frame_index"],
+                "timestamp_s": keyframe["timestamp_s"],
+                "image_url": f"/api/videos/{analysis_id}/keyframes/{position}"
+            }
+            for position, keyframe in enumerate(analysis["keyframes"])
+        ]
+    }
+
+@app.post("/api/analyze/video")
+async def analyze_vehicle_video(file: UploadFile = File(...)):
+    """Analyze a walk-around video; returns damages deduplicated across frames with their best keyframes"""
+    content_type = file.content_type or ""
+    if not content_type.startswith("video/") and not (file.filename or "").lower().endswith(VIDEO_SUFFIXES):
+        raise HTTPException(status_code=400, detail="Sadece video dosyaları kabul edilir")
+    
+    path = await save_upload(file, VIDEO_MAX_BYTES)
+    try:
+        start = time.perf_counter()
+        report = await analyze_video_file(path)
+        report["elapsed_ms"] = round((time.perf_counter() - start) * 1000.0, 1)
+    finally:
+        await run_blocking(io_executor, os.unlink, path)
+    
+    analysis = {
+        "_id": str(uuid.uuid4()),
+        "created_at": datetime.utcnow().isoformat(),
+        "filename": file.filename,
+        **report
+    }
+    await video_analyses_collection.insert_one(analysis)
+    return video_response(analysis)
+
+@app.get("/api/videos/{video_id}")
+async def get_video_analysis(video_id: str):
+    analysis = await video_analyses_collection.find_one({"_id": video_id})
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analiz bulunamadı")
+    return video_response(analysis)
+
+@app.get("/api/videos/{video_id}/keyframes/{position}")
+async def get_video_keyframe(video_id: str, position: int, request: Request):
+    """Frame showing the best view of one or more damages, as JPEG"""
+    analysis = await video_analyses_collection.find_one({"_id": video_id}, {"created_at": 1, "keyframes": 1})
+    if not analysis or not 0 <= position < len(analysis["keyframes"]):
+        raise HTTPException(status_code=404, detail="Görsel bulunamadı")
+    
+    ref = analysis["keyframes"][position]["image_ref"]
+    data = await blob_store.get(ref["blob_id"])
+    if data is None:
+        raise HTTPException(status_code=404, detail="Görsel bulunamadı")
+    return cached_bytes_response(
+        request,
+        data,
+        etag=ref["blob_id"],
+        last_modified=datetime.fromisoformat(analysis["created_at"]),
+        media_type="image/jpeg"
+    )
+
+# Asynchronous jobs: submit returns immediately, workers analyze from a persistent queue
+JOB_STORE = os.environ.get("JOB_STORE", "mongo")
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", str(Path(__file__).parent / "jobs.sqlite3"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", str(INFERENCE_MAX_BATCH_SIZE)))
+JOB_LEASE_S = float(os.environ.get("JOB_LEASE_S", "300"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_EVENT_KEEPALIVE_S = 15.0
+
+async def process_job(job: Dict[str, Any], progress) -> Dict[str, Any]:
+    """Analyze a queued upload; the analysis id equals the job id, so a retried job never duplicates it"""
+    job_id = job["_id"]
+    existing = await find_analysis(job_id, {"image_base64": 0, "thumbnail": 0})
+    if existing is None:
+        contents = await load_upload(job)
+        await analyze_contents(
+            contents, job.get("filename"), {"job_id": job_id}, progress=progress, analysis_id=job_id
+        )
+    elif not existing.get("image_ref") and job_id not in rendition_tasks:
+        # An earlier attempt stored the analysis but stopped before its renditions
+        contents = await load_upload(job)
+        image_np, _ = await run_blocking(cpu_executor, decode_image, contents)
+        if image_np is None:
+            raise HTTPException(status_code=400, detail="Resim okunamadı")
+        schedule_renditions(existing, image_np)
+    # Renditions may reuse the upload's bytes; let them be stored before the upload is released
+    await wait_for_renditions(job_id)
+    await release_upload(job)
+    return {"analysis_id": job_id, "result_url": f"/api/analyses/{job_id}"}
+
+async def load_upload(job: Dict[str, Any]) -> bytes:
+    contents = await blob_store.get(job["upload_ref"]["blob_id"])
+    if contents is None:
+        raise RuntimeError("Yüklenen dosya bulunamadı")
+    return contents
+
+async def release_upload(job: Dict[str, Any]):
+    """Delete the raw upload once no other unfinished job or analysis rendition uses the same bytes"""
+    blob_id = job["upload_ref"]["blob_id"]
+    # Renditions still storing the same bytes (e.g. after a bounded wait gave up) only show up as held blobs
+    if blob_pending(blob_id):
+        return
+    
+    async def unused():
+        if await job_store.active_with_upload(blob_id, job["_id"]):
+            return False
+        for field in ("image_ref", "thumbnail_ref"):
+            if await analyses_collection.count_documents({f"{field}.blob_id": blob_id}, limit=1):
+                return False
+        return not blob_pending(blob_id)
+    
+    await blob_store.delete_unused(blob_id, unused)
+
+async def release_failed_upload(job: Dict[str, Any]):
+    await wait_for_renditions(job["_id"])
+    await release_upload(job)
+
+# Created at startup, once per server process (a SQLite connection must not cross a fork)
+job_store = None
+job_queue: Optional[JobQueue] = None
+
+@app.on_event("startup")
+async def start_job_queue():
+    global job_store, job_queue
+    job_store = await run_blocking(
+        io_executor, create_job_store, JOB_STORE, database=db, path=JOB_STORE_PATH, executor=io_executor
+    )
+    job_queue = JobQueue(
+        job_store,
+        process_job,
+        workers=JOB_WORKERS,
+        lease_s=JOB_LEASE_S,
+        max_attempts=JOB_MAX_ATTEMPTS,
+        # Failed jobs are not retried, so nothing needs their upload anymore
+        on_failed=release_failed_upload,
+    )
+    try:
+        await job_store.setup()
+    except Exception as exc:
+        print(f"Job store setup skipped: {exc}")
+    # Jobs left queued or running by a previous process are claimed again here
+    job_queue.start()
+
+def job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    job_id = str(job["_id"])
+    return {
+        "id": job_id,
+        "status": job["status"],
+        "stage": job.get("stage"),
+        "filename": job.get("filename"),
+        "created_at": job["created_at"],
+        "updated_at": job.get("updated_at"),
+        "attempts": job.get("attempts", 0),
+        "analysis_id": job.get("analysis_id"),
+        "result_url": job.get("result_url"),
+        "error": job.get("error"),
+        "events": job.get("events", []),
+        "status_url": f"/api/jobs/{job_id}",
+        "events_url": f"/api/jobs/{job_id}/events"
+    }
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...)):
+    """Queue an image for analysis and return a job id immediately"""
+    if not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="Sadece resim dosyaları kabul edilir")
+    
+    contents = await read_upload(file, UPLOAD_MAX_BYTES)
+    upload_ref = await blob_store.put(contents, file.content_type)
+    job = await job_queue.submit({
+        "_id": str(uuid.uuid4()),
+        "filename": file.filename,
+        "upload_ref": upload_ref
+    })
+    return job_status(job)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Poll a job; once done, analysis_id/result_url point to the stored analysis"""
+    job = await job_store.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="İş bulunamadı")
+    return job_status(job)
+
+def sse_message(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events: one `progress` event per stage, then `done` or `failed`"""
+    if not await job_store.get(job_id):
+        raise HTTPException(status_code=404, detail="İş bulunamadı")
+    
+    async def stream():
+        sent = 0
+        last_write = time.monotonic()
+        wake = job_queue.subscribe(job_id)
+        try:
+            while True:
+                # Clear before reading so a notification during the read is not lost
+                wake.clear()
+                job = await job_store.get(job_id)
+                events = job.get("events", [])
+                for event in events[sent:]:
+                    yield sse_message("progress", event)
+                    last_write = time.monotonic()
+                sent = len(events)
+                if job["status"] in TERMINAL_STATES:
+                    yield sse_message(job["status"], job_status(job))
+                    return
+                # Workers in other processes are not notified in-process, so re-read on a timer too
+                try:
+                    await asyncio.wait_for(wake.wait(), job_queue.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                # Comment line keeps proxies from closing an idle stream
+                if time.monotonic() - last_write > JOB_EVENT_KEEPALIVE_S:
+                    yield ": keep-alive\n\n"
+                    last_write = time.monotonic()
+        finally:
+            job_queue.unsubscribe(job_id, wake)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Fields needed for history list items (image fields are never loaded)
+HISTORY_PROJECTION = {
+    "created_at": 1,
+    "results.summary": 1,
+    "filename": 1
+}
+
+def encode_cursor(analysis: Dict[str, Any]) -> str:
+    """Opaque keyset cursor pointing just after the given analysis"""
+    raw = json.dumps([analysis["created_at"], str(analysis["_id"])]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_cursor(token: str):
+    try:
+        created_at, analysis_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return str(created_at), str(analysis_id)
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Geçersiz sayfa imleci")
+
+@app.get("/api/analyses", response_model=AnalysisPage)
+async def get_analyses(
+    limit: int = 20,
+    after: Optional[str] = None,
+    risk_level: Optional[str] = None,
+    damage_type: Optional[str] = None
+):
+    """Get a page of past analyses (newest first); pass next_cursor as `after` for the next page"""
+    limit = max(1, min(limit, 100))
+    
+    query: Dict[str, Any] = {}
+    if risk_level:
+        query["results.summary.risk_level"] = risk_level
+    if damage_type:
+        query["results.damages.type"] = damage_type
+    if after:
+        created_at, analysis_id = decode_cursor(after)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": analysis_id}}
+        ]
+    
+    cursor = analyses_collection.find(query, HISTORY_PROJECTION)
+    cursor = cursor.sort([("created_at", DESCENDING), ("_id", DESCENDING)]).limit(limit + 1)
+    analyses = await cursor.to_list(length=limit + 1)
+    has_more = len(analyses) > limit
+    analyses = analyses[:limit]
+    
+    return {
+        "items": [
+            {
+                "id": str(a["_id"]),
+                "created_at": a["created_at"],
+                "thumbnail_url": thumbnail_url(str(a["_id"])),
+                "summary": a["results"]["summary"],
+                "filename": a.get("filename", "Bilinmeyen")
+            }
+            for a in analyses
+        ],
+        "next_cursor": encode_cursor(analyses[-1]) if has_more else None
+    }
 
 @app.get("/api/analyses/{analysis_id}")
 async def get_analysis(analysis_id: str):
     """Get a specific analysis by ID"""
-    analysis = analyses_collection.find_one({"_id": analysis_id})
+    analysis = await find_analysis(analysis_id, {"image_base64": 0, "thumbnail": 0})
     
     if not analysis:
         raise HTTPException(status_code=404, detail="Analiz bulunamadı")
@@ -396,126 +1392,207 @@ async def get_analysis(analysis_id: str):
     return {
         "id": str(analysis["_id"]),
         "created_at": analysis["created_at"],
-        "image_base64": analysis["image_base64"],
+        "image_url": image_url(analysis_id),
+        "thumbnail_url": thumbnail_url(analysis_id),
         "results": analysis["results"],
         "filename": analysis.get("filename", "Bilinmeyen")
     }
 
+async def serve_rendition(request: Request, analysis_id: str, name: str):
+    """Stream a stored rendition with HTTP caching headers"""
+    ref_field, media_type, legacy_field = RENDITIONS[name]
+    await wait_for_renditions(analysis_id)
+    projection = {"created_at": 1, ref_field: 1}
+    if legacy_field:
+        projection[legacy_field] = 1
+    analysis = await find_analysis(analysis_id, projection)
+    
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analiz bulunamadı")
+    
+    ref = analysis.get(ref_field)
+    last_modified = datetime.fromisoformat(analysis["created_at"])
+    # The reference holds the ETag: revalidations are answered without reading the blob
+    if ref:
+        not_modified = not_modified_response(request, ref["blob_id"], last_modified)
+        if not_modified is not None:
+            return not_modified
+    data = await load_blob(analysis, ref_field, legacy_field)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Görsel bulunamadı")
+    
+    return cached_bytes_response(
+        request,
+        data,
+        etag=ref["blob_id"] if ref else blob_hash(data),
+        last_modified=last_modified,
+        media_type=media_type
+    )
+
+@app.get("/api/analyses/{analysis_id}/image")
+async def get_analysis_image(analysis_id: str, request: Request):
+    """Full-size analyzed image as JPEG"""
+    return await serve_rendition(request, analysis_id, "image")
+
+@app.get("/api/analyses/{analysis_id}/thumbnail")
+async def get_analysis_thumbnail(analysis_id: str, request: Request):
+    """History thumbnail as JPEG"""
+    return await serve_rendition(request, analysis_id, "thumbnail")
+
+@app.get("/api/analyses/{analysis_id}/renditions/{name}")
+async def get_analysis_rendition(analysis_id: str, name: str, request: Request):
+    """Any stored rendition: image, thumbnail, webp or annotated (when enabled)"""
+    if name not in RENDITIONS:
+        raise HTTPException(status_code=404, detail="Görsel bulunamadı")
+    return await serve_rendition(request, analysis_id, name)
+
 @app.delete("/api/analyses/{analysis_id}")
 async def delete_analysis(analysis_id: str):
     """Delete an analysis"""
-    result = analyses_collection.delete_one({"_id": analysis_id})
+    # A just-created analysis may still be in the write queue or storing its renditions
+    await wait_for_renditions(analysis_id)
+    if not await analysis_writer.wait_written(analysis_id, MONGO_WRITE_WAIT_S):
+        # Deleting now would miss the document and it would be written afterwards
+        raise HTTPException(status_code=503, detail="Analiz henüz kaydedilmedi, daha sonra tekrar deneyin")
+    # A report render in progress stores its PDF reference once done (pregenerate_report starts one for every analysis)
+    renders = [render for key, render in report_renders.items() if key.startswith(f"{analysis_id}:")]
+    if renders:
+        await asyncio.wait(renders, timeout=RENDITION_WAIT_S)
+    analysis = await analyses_collection.find_one_and_delete({"_id": analysis_id})
     
-    if result.deleted_count == 0:
+    if not analysis:
         raise HTTPException(status_code=404, detail="Analiz bulunamadı")
     
+    await release_blobs(analysis)
+    
     return {"message": "Analiz silindi"}
 
+# Renders in progress, so concurrent requests for one report share a single render
+report_renders: Dict[str, asyncio.Future] = {}
+
+def report_filename(analysis_id: str) -> str:
+    return f"hasar-raporu-{analysis_id[:8]}.pdf"
+
+async def render_and_store_report(analysis: Dict[str, Any], source_hash: str):
+    """Render the PDF, store it and reference it from the analysis; returns the bytes and the reference"""
+    image_data = await load_blob(analysis, "image_ref", "image_base64")
+    report_input = {key: analysis.get(key) for key in ("_id", "created_at", "results")}
+    with STAGE_SECONDS.time(stage="report_render"):
+        pdf_bytes = await asyncio.get_running_loop().run_in_executor(
+            report_executor, render_pdf_report, report_input, image_data
+        )
+    
+    blob_ids = [blob_hash(pdf_bytes)]
+    hold_blobs(blob_ids)
+    try:
+        ref = await blob_store.put(pdf_bytes, "application/pdf")
+        ref["source_hash"] = source_hash
+        ref["generated_at"] = datetime.utcnow().isoformat()
+        # source_hash lets later reads detect that the analysis changed since
+        await analysis_writer.wait_written(analysis["_id"], MONGO_WRITE_WAIT_S)
+        stored = await analyses_collection.update_one({"_id": analysis["_id"]}, {"$set": {"report_ref": ref}})
+    finally:
+        unhold_blobs(blob_ids)
+    if stored.matched_count == 0:
+        # The analysis was deleted (or is not written yet): nothing references the PDF
+        await release_blobs({"report_ref": ref})
+    return pdf_bytes, ref
+
+async def get_report(analysis: Dict[str, Any]):
+    """Cached PDF of an analysis, rendered on first use or when the analysis changed"""
+    analysis_id = str(analysis["_id"])
+    source_hash = report_source_hash(analysis)
+    
+    ref = analysis.get("report_ref")
+    if ref and ref.get("source_hash") == source_hash:
+        data = await blob_store.get(ref["blob_id"])
+        if data is not None:
+            return data, ref
+    
+    render_key = f"{analysis_id}:{source_hash}"
+    pending = report_renders.get(render_key)
+    if pending is None:
+        pending = asyncio.ensure_future(render_and_store_report(analysis, source_hash))
+        report_renders[render_key] = pending
+        pending.add_done_callback(lambda _: report_renders.pop(render_key, None))
+    return await asyncio.shield(pending)
+
+async def pregenerate_report(analysis: Dict[str, Any]):
+    try:
+        await get_report(analysis)
+    except Exception as exc:
+        ERRORS.inc(stage="report")
+        print(f"Report pre-generation failed for {analysis['_id']}: {exc}")
+
 @app.get("/api/analyses/{analysis_id}/pdf")
-async def download_pdf(analysis_id: str):
-    """Generate and download PDF report"""
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import cm
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.ttfonts import TTFont
-    
-    analysis = analyses_collection.find_one({"_id": analysis_id})
+async def download_pdf(analysis_id: str, request: Request):
+    """Download the PDF report (served from the report cache)"""
+    await wait_for_renditions(analysis_id)
+    analysis = await find_analysis(analysis_id)
     
     if not analysis:
         raise HTTPException(status_code=404, detail="Analiz bulunamadı")
     
-    # Create PDF in memory
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=1.5*cm, bottomMargin=1.5*cm)
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=24, spaceAfter=20)
-    heading_style = ParagraphStyle('Heading', parent=styles['Heading2'], fontSize=14, spaceAfter=10, spaceBefore=15)
-    normal_style = styles['Normal']
-    
-    elements = []
-    
-    # Title
-    elements.append(Paragraph("Araç Hasar Analiz Raporu", title_style))
-    elements.append(Paragraph(f"Tarih: {analysis['created_at'][:10]}", normal_style))
-    elements.append(Paragraph(f"Rapor ID: {analysis_id[:8]}", normal_style))
-    elements.append(Spacer(1, 20))
-    
-    # Add image
-    img_data = base64.b64decode(analysis['image_base64'])
-    img_buffer = BytesIO(img_data)
-    img = RLImage(img_buffer, width=14*cm, height=10*cm, kind='proportional')
-    elements.append(img)
-    elements.append(Spacer(1, 20))
-    
-    # Summary
-    results = analysis['results']
-    summary = results['summary']
-    
-    elements.append(Paragraph("Özet", heading_style))
-    summary_data = [
-        ["Toplam Hasar", str(summary['total_damages'])],
-        ["Etkilenen Parça", str(summary['affected_parts'])],
-        ["Ortalama Şiddet", f"{summary['average_severity']}/5"],
-        ["Risk Seviyesi", summary['risk_level']]
-    ]
-    summary_table = Table(summary_data, colWidths=[6*cm, 6*cm])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#F5F5F7')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1D1D1F')),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E5E5E7'))
-    ]))
-    elements.append(summary_table)
-    elements.append(Spacer(1, 20))
-    
-    # Damage details
-    if results['damages']:
-        elements.append(Paragraph("Hasar Detayları", heading_style))
-        damage_data = [["Hasar Tipi", "Parça", "Güven", "Şiddet"]]
-        for d in results['damages']:
-            severity_dots = "●" * d['severity'] + "○" * (5 - d['severity'])
-            damage_data.append([
-                d['type_tr'],
-                d['part_tr'] or "Belirsiz",
-                f"%{d['confidence']}",
-                severity_dots
-            ])
-        
-        damage_table = Table(damage_data, colWidths=[4*cm, 4*cm, 2.5*cm, 3.5*cm])
-        damage_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#000000')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#E5E5E7')),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#FAFAFA')])
-        ]))
-        elements.append(damage_table)
-    else:
-        elements.append(Paragraph("Hasar tespit edilmedi.", normal_style))
+    headers = {"Content-Disposition": f"attachment; filename={report_filename(analysis_id)}"}
+    ref = analysis.get("report_ref")
+    if ref and ref.get("source_hash") == report_source_hash(analysis):
+        not_modified = not_modified_response(
+            request, ref["blob_id"], datetime.fromisoformat(ref["generated_at"]), max_age=0, extra_headers=headers
+        )
+        if not_modified is not None:
+            return not_modified
     
-    elements.append(Spacer(1, 30))
-    elements.append(Paragraph("Bu rapor AutoDamageID yapay zeka sistemi tarafından otomatik olarak oluşturulmuştur.", 
-                              ParagraphStyle('Footer', parent=normal_style, fontSize=9, textColor=colors.HexColor('#86868B'))))
+    pdf_bytes, ref = await get_report(analysis)
     
-    doc.build(elements)
-    buffer.seek(0)
-    
-    return StreamingResponse(
-        buffer,
+    return cached_bytes_response(
+        request,
+        pdf_bytes,
+        etag=ref["blob_id"],
+        last_modified=datetime.fromisoformat(ref["generated_at"]),
         media_type="application/pdf",
-        headers={"Content-Disposition": f"attachment; filename=hasar-raporu-{analysis_id[:8]}.pdf"}
+        max_age=0,
+        extra_headers=headers
+    )
+
+class ReportBatchRequest(BaseModel):
+    ids: List[str]
+
+REPORT_BATCH_LIMIT = 100
+
+@app.post("/api/reports/batch")
+async def download_reports_batch(request: ReportBatchRequest):
+    """Render many reports in parallel and download them as one ZIP archive"""
+    ids = list(dict.fromkeys(request.ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="Rapor listesi boş")
+    if len(ids) > REPORT_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"En fazla {REPORT_BATCH_LIMIT} rapor istenebilir")
+    
+    for analysis_id in ids:
+        await wait_for_renditions(analysis_id)
+        await analysis_writer.wait_written(analysis_id, MONGO_WRITE_WAIT_S)
+    analyses = await analyses_collection.find({"_id": {"$in": ids}}, {"thumbnail": 0}).to_list(length=len(ids))
+    if not analyses:
+        raise HTTPException(status_code=404, detail="Analiz bulunamadı")
+    
+    reports = await asyncio.gather(*(get_report(a) for a in analyses))
+    
+    def build_zip():
+        buffer = BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+            for analysis, (pdf_bytes, _) in zip(analyses, reports):
+                archive.writestr(report_filename(str(analysis["_id"])), pdf_bytes)
+        return buffer.getvalue()
+    
+    archive = await run_blocking(cpu_executor, build_zip)
+    missing = [i for i in ids if i not in {str(a["_id"]) for a in analyses}]
+    
+    return Response(
+        content=archive,
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": "attachment; filename=hasar-raporlari.zip",
+            "X-Missing-Analyses": ",".join(missing)
+        }
     )
 
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
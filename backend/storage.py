@@ -0,0 +1,282 @@
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks connection pool usage through pymongo's CMAP events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.created = 0
+        self.closed = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+            self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+            self.open = max(0, self.open - 1)
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open_connections": self.open,
+            "checked_out": self.checked_out,
+            "max_checked_out": self.max_checked_out,
+            "connections_created": self.created,
+            "connections_closed": self.closed,
+            "checkout_failures": self.checkout_failures,
+            "pool_clears": self.pool_clears,
+        }
+
+
+def parse_write_concern(value: str):
+    """"1", "0", "majority" -> value accepted by the ``w`` client option"""
+    return int(value) if value.isdigit() else value
+
+
+def create_client(
+    url: str,
+    max_pool_size: int = 50,
+    min_pool_size: int = 0,
+    timeout_ms: int = 5000,
+    socket_timeout_ms: int = 20000,
+    write_concern: str = "1",
+    journal: bool = False,
+    monitor: Optional[PoolMonitor] = None,
+) -> AsyncIOMotorClient:
+    """Async MongoDB client with explicit pool, timeout and write concern settings"""
+    options = dict(
+        maxPoolSize=max_pool_size,
+        minPoolSize=min_pool_size,
+        serverSelectionTimeoutMS=timeout_ms,
+        connectTimeoutMS=timeout_ms,
+        waitQueueTimeoutMS=timeout_ms,
+        socketTimeoutMS=socket_timeout_ms,
+        w=parse_write_concern(write_concern),
+    )
+    if journal:
+        options["journal"] = True
+    if monitor is not None:
+        options["event_listeners"] = [monitor]
+    return AsyncIOMotorClient(url, **options)
+
+
+class WriteBehindQueue:
+    """Batches inserts into one collection off the request path.
+
+    ``enqueue`` returns immediately; a background task flushes pending
+    documents with ``insert_many`` once ``batch_size`` documents are queued or
+    ``flush_ms`` has passed. Documents stay readable through ``get_pending``
+    until they are written, so clients can read their own writes.
+    ``on_flush(documents, seconds, ok)`` is called after every write attempt.
+
+    A batch that fails stays queued and is retried with exponential backoff
+    (at most ``max_backoff_s`` apart) until it is written, so an outage of
+    the database delays documents instead of losing them. Once ``stop`` is
+    called, a failing batch gets ``max_retries`` more attempts and is then
+    dropped.
+    """
+
+    def __init__(
+        self,
+        collection,
+        batch_size: int = 50,
+        flush_ms: float = 20.0,
+        max_retries: int = 3,
+        max_backoff_s: float = 5.0,
+        on_flush: Optional[Callable[[int, float, bool], None]] = None,
+    ):
+        self.collection = collection
+        self.batch_size = max(1, int(batch_size))
+        self.flush_ms = max(0.0, float(flush_ms))
+        self.max_retries = max(0, int(max_retries))
+        self.max_backoff_s = max_backoff_s
+        self.on_flush = on_flush
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._pending: Dict[Any, Dict[str, Any]] = {}
+        self._written: Dict[Any, asyncio.Future] = {}
+
+        self.batches = 0
+        self.documents = 0
+        self.failed = 0
+        self.retries = 0
+
+    def start(self):
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._stopping = asyncio.Event()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Write everything still queued, then stop"""
+        if self._worker is None:
+            return
+        self._stopping.set()
+        await self._queue.join()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    def enqueue(self, doc: Dict[str, Any]):
+        if self._worker is None:
+            raise RuntimeError("Write queue is not running")
+        self._pending[doc["_id"]] = doc
+        self._written[doc["_id"]] = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(doc)
+
+    def get_pending(self, doc_id) -> Optional[Dict[str, Any]]:
+        return self._pending.get(doc_id)
+
+    def pending_documents(self) -> List[Dict[str, Any]]:
+        return list(self._pending.values())
+
+    async def wait_written(self, doc_id, timeout: Optional[float] = None) -> bool:
+        """Wait until a queued document has been flushed.
+
+        False if it was dropped, or is still queued after ``timeout`` seconds.
+        """
+        future = self._written.get(doc_id)
+        if future is None:
+            return True
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return False
+
+    async def _collect_batch(self) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.flush_ms / 1000.0
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> Optional[Exception]:
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+            return None
+        except Exception as exc:
+            # Documents already inserted by an earlier attempt are duplicates
+            details = getattr(exc, "details", None) or {}
+            write_errors = details.get("writeErrors", [])
+            if write_errors and all(e.get("code") == 11000 for e in write_errors):
+                return None
+            return exc
+
+    async def _backoff(self, failures: int):
+        """Sleep before the next attempt; cut short when ``stop`` is called"""
+        delay = min(self.max_backoff_s, 0.05 * (2 ** (failures - 1)))
+        if self._stopping.is_set():
+            await asyncio.sleep(delay)
+            return
+        try:
+            await asyncio.wait_for(self._stopping.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+            failures = final_attempts = 0
+            while True:
+                started = time.perf_counter()
+                error = await self._write(batch)
+                if self.on_flush is not None:
+                    self.on_flush(len(batch), time.perf_counter() - started, error is None)
+                if error is None:
+                    break
+                failures += 1
+                if self._stopping.is_set():
+                    final_attempts += 1
+                    if final_attempts > self.max_retries:
+                        break
+                if failures == 1:
+                    print(f"Writing {len(batch)} documents failed, retrying until written: {error}")
+                self.retries += 1
+                await self._backoff(final_attempts if self._stopping.is_set() else failures)
+
+            self.batches += 1
+            if error is None:
+                self.documents += len(batch)
+            else:
+                self.failed += len(batch)
+                print(f"Dropped {len(batch)} documents at shutdown after {failures} failed writes: {error}")
+
+            for doc in batch:
+                self._pending.pop(doc["_id"], None)
+                future = self._written.pop(doc["_id"], None)
+                if future is not None and not future.done():
+                    future.set_result(error is None)
+                self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "documents_written": self.documents,
+            "documents_failed": self.failed,
+            "write_retries": self.retries,
+            "batch_size": self.batch_size,
+            "flush_ms": self.flush_ms,
+        }
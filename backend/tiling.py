@@ -0,0 +1,117 @@
+from typing import Tuple
+
+import numpy as np
+
+from autodamageid.matching import box_areas, intersection_matrix
+
+
+def _grid_origins(length: int, tile: int, stride: int) -> np.ndarray:
+    """Window start positions along one axis; the last window ends on the image edge"""
+    if length <= tile:
+        return np.array([0])
+    origins = list(range(0, length - tile, stride))
+    origins.append(length - tile)
+    return np.array(origins)
+
+
+def tile_windows(
+    regions: np.ndarray,
+    width: int,
+    height: int,
+    tile: int = 640,
+    overlap: float = 0.2,
+    margin: float = 0.05,
+    max_tiles: int = 12,
+) -> np.ndarray:
+    """Overlapping ``tile`` x ``tile`` windows [K, 4] (int xyxy) covering the given regions.
+
+    Windows sit on one grid per image, so regions that overlap share windows.
+    Regions are padded by ``margin`` of their size. When more than
+    ``max_tiles`` windows would be needed, the ones covering the most region
+    area are kept. Images no larger than one tile get no windows (the full
+    frame is already seen at native resolution).
+    """
+    regions = np.asarray(regions, dtype=np.float32).reshape(-1, 4)
+    if len(regions) == 0 or max_tiles <= 0 or (width <= tile and height <= tile):
+        return np.zeros((0, 4), dtype=int)
+
+    pad = (regions[:, 2:] - regions[:, :2]) * margin
+    padded = np.concatenate([regions[:, :2] - pad, regions[:, 2:] + pad], axis=1)
+    padded = padded.clip(0, [width, height, width, height])
+
+    stride = max(1, int(tile * (1.0 - overlap)))
+    xs = _grid_origins(width, tile, stride)
+    ys = _grid_origins(height, tile, stride)
+    x1, y1 = np.meshgrid(xs, ys)
+    windows = np.stack([x1.ravel(), y1.ravel(), x1.ravel() + tile, y1.ravel() + tile], axis=1)
+    windows = np.minimum(windows, [width, height, width, height])
+
+    covered = intersection_matrix(windows, padded).sum(axis=1)
+    order = np.argsort(-covered, kind="stable")
+    order = order[covered[order] > 0][:max_tiles]
+    return windows[order].astype(int)
+
+
+def interior_boxes(boxes: np.ndarray, window, width: int, height: int, tolerance: float = 2.0) -> np.ndarray:
+    """Mask of tile boxes (tile coordinates) not cut by an inner tile edge.
+
+    A box touching a tile edge that is not also an image edge is probably a
+    truncated piece of a larger damage, which the full-frame pass reports whole.
+    """
+    x1, y1, x2, y2 = window
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    w, h = x2 - x1, y2 - y1
+    cut = np.zeros(len(boxes), dtype=bool)
+    if x1 > 0:
+        cut |= boxes[:, 0] <= tolerance
+    if y1 > 0:
+        cut |= boxes[:, 1] <= tolerance
+    if x2 < width:
+        cut |= boxes[:, 2] >= w - tolerance
+    if y2 < height:
+        cut |= boxes[:, 3] >= h - tolerance
+    return ~cut
+
+
+def merge_detections(
+    boxes: np.ndarray,
+    classes: np.ndarray,
+    scores: np.ndarray,
+    iou_threshold: float = 0.5,
+    containment: float = 0.8,
+) -> np.ndarray:
+    """Class-aware greedy NMS over full-frame and tile detections; returns kept indices.
+
+    Besides the usual IoU test, a box lying mostly (``containment``) inside a
+    higher-scoring box of the same class is dropped as a duplicate.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    if len(boxes) == 0:
+        return np.zeros((0,), dtype=int)
+
+    inter = intersection_matrix(boxes, boxes)
+    areas = box_areas(boxes)
+    iou = inter / (areas[:, None] + areas[None, :] - inter + 1e-6)
+    inside = inter / (areas[:, None] + 1e-6)  # [i, j]: fraction of box i inside box j
+
+    keep = []
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    for i in np.argsort(-np.asarray(scores), kind="stable"):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        same_class = classes == classes[i]
+        suppressed |= same_class & ((iou[i] >= iou_threshold) | (inside[:, i] >= containment))
+    return np.array(keep, dtype=int)
+
+
+def shift_boxes(boxes: np.ndarray, window) -> np.ndarray:
+    """Tile-coordinate boxes to image coordinates"""
+    return np.asarray(boxes, dtype=np.float32).reshape(-1, 4) + np.array(
+        [window[0], window[1], window[0], window[1]], dtype=np.float32
+    )
+
+
+EMPTY_DETECTIONS: Tuple[np.ndarray, np.ndarray, np.ndarray] = (
+    np.zeros((0, 4), dtype=np.float32), np.zeros((0,), dtype=int), np.zeros((0,), dtype=np.float32)
+)
@@ -0,0 +1,46 @@
+from typing import Dict, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+
+class BodySizeLimit:
+    """ASGI middleware capping the request body of upload routes.
+
+    ``limits`` maps a path to (max bytes, error detail). A declared
+    Content-Length over the limit is answered with 413 before any of the body
+    is received. Bodies without one (chunked uploads) are counted while they
+    stream in and cut off with 413 once they pass the limit, so an oversized
+    upload is never spooled in full. The mapping is read per request and may
+    be filled in after the middleware is added.
+    """
+
+    def __init__(self, app, limits: Dict[str, Tuple[int, str]]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        max_bytes, detail = limit
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > max_bytes:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Raised inside the multipart parser; FastAPI passes HTTPException through
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,289 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from autodamageid.matching import box_iou_matrix
+
+
+def dhash(frame: np.ndarray, hash_size: int = 8) -> int:
+    """Difference hash (hash_size² bits) of a BGR frame (robust to small exposure/compression changes)"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class FrameSampler:
+    """Streams frames of a video file at ``sample_fps`` and drops near-duplicates.
+
+    Only sampled frames are decoded (others are grabbed and skipped), and only
+    the hash of the last kept frame is remembered, so memory stays constant
+    regardless of video length. A frame is kept when its dHash differs from
+    the last kept frame by more than ``duplicate_distance`` bits.
+    """
+
+    def __init__(self, path: str, sample_fps: float = 2.0, duplicate_distance: int = 5, max_side: int = 1920):
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise ValueError("Video açılamadı")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self.step = max(1, int(round(self.fps / max(sample_fps, 1e-3))))
+        self.duplicate_distance = duplicate_distance
+        self.max_side = max_side
+
+        self.position = 0
+        self.sampled = 0
+        self.kept = 0
+        self.duplicates = 0
+        self.finished = False
+        self._last_hash: Optional[int] = None
+
+    def _resize(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        scale = self.max_side / max(h, w)
+        if scale >= 1.0:
+            return frame
+        return cv2.resize(frame, (int(round(w * scale)), int(round(h * scale))), interpolation=cv2.INTER_AREA)
+
+    def read(self, max_frames: int) -> List[Tuple[int, float, np.ndarray]]:
+        """Next kept frames as (frame index, timestamp seconds, BGR frame)"""
+        frames = []
+        while len(frames) < max_frames and not self.finished:
+            index = self.position
+            if not self.capture.grab():
+                self.finished = True
+                break
+            self.position += 1
+            if index % self.step:
+                continue
+            ok, frame = self.capture.retrieve()
+            if not ok:
+                continue
+            self.sampled += 1
+
+            frame_hash = dhash(frame)
+            if self._last_hash is not None and hamming(frame_hash, self._last_hash) <= self.duplicate_distance:
+                self.duplicates += 1
+                continue
+            self._last_hash = frame_hash
+            self.kept += 1
+            frames.append((index, index / self.fps, self._resize(frame)))
+        return frames
+
+    def close(self):
+        self.capture.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "fps": round(self.fps, 2),
+            "duration_s": round(self.position / self.fps, 2),
+            "frames_total": self.position,
+            "frames_sampled": self.sampled,
+            "frames_analyzed": self.kept,
+            "frames_skipped_duplicate": self.duplicates,
+            "sample_every": self.step,
+        }
+
+
+@dataclass
+class DamageTrack:
+    """One physical damage followed across consecutive analyzed frames"""
+    type: str
+    part: Optional[str]
+    box: np.ndarray  # last seen, normalized xyxy
+    first_seen: int  # kept-frame counter
+    last_seen: int
+    first_seen_s: float
+    last_seen_s: float
+    best: Dict[str, Any]
+    best_frame: int
+    # Box center relative to the matched part's box, when first and last seen (None without a part)
+    first_part_position: Optional[np.ndarray] = None
+    part_position: Optional[np.ndarray] = None
+    frames: int = 1
+    confidence_sum: float = 0.0
+
+    @property
+    def mean_confidence(self) -> float:
+        return self.confidence_sum / self.frames
+
+
+def part_position(damage: Dict[str, Any]) -> Optional[np.ndarray]:
+    """Center of a damage box in coordinates of its part box (0..1 inside the part)"""
+    part_box = damage.get("part_box")
+    if part_box is None:
+        return None
+    x1, y1, x2, y2 = part_box
+    box = damage["box"]
+    center = np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2], dtype=float)
+    return (center - [x1, y1]) / np.maximum([x2 - x1, y2 - y1], 1e-6)
+
+
+class DamageTracker:
+    """Merges per-frame detections of the same damage into tracks.
+
+    Within a frame, detections are paired with active tracks of the same type
+    (and same part, when both are known) whose last box overlaps by at least
+    ``iou_threshold`` in normalized coordinates, or whose center is within
+    ``center_distance`` of it. Tracks not seen for ``max_gap`` analyzed frames
+    stop matching (the camera has moved on); stale tracks that never qualified
+    as a damage are dropped so flickering false positives do not pile up.
+    A damage that comes back into view after that starts a new track, which
+    ``merged`` joins with the earlier one when it reappears within
+    ``max_join_gap`` analyzed frames at about the same place on the part
+    (``join_distance``, in part box coordinates).
+    """
+
+    def __init__(
+        self,
+        iou_threshold: float = 0.2,
+        center_distance: float = 0.12,
+        max_gap: int = 3,
+        min_frames: int = 2,
+        single_frame_confidence: float = 50.0,
+        max_join_gap: int = 15,
+        join_distance: float = 0.2,
+    ):
+        self.iou_threshold = iou_threshold
+        self.center_distance = center_distance
+        self.max_gap = max_gap
+        self.min_frames = min_frames
+        self.single_frame_confidence = single_frame_confidence
+        self.max_join_gap = max_join_gap
+        self.join_distance = join_distance
+        self.tracks: Dict[int, DamageTrack] = {}
+        self.discarded = 0
+        self.joined = 0
+        self._next_id = 0
+        self._kept = 0
+
+    def _qualifies(self, track: DamageTrack) -> bool:
+        return track.frames >= self.min_frames or track.best["confidence"] >= self.single_frame_confidence
+
+    def update(self, frame_index: int, timestamp: float, damages: List[Dict[str, Any]], width: int, height: int) -> List[int]:
+        """Add one analyzed frame; returns ids of tracks whose best detection is now in this frame"""
+        self._kept += 1
+        scale = np.array([width, height, width, height], dtype=float)
+        boxes = np.array([d["box"] for d in damages], dtype=float).reshape(-1, 4) / scale
+
+        active = [i for i, t in self.tracks.items() if self._kept - t.last_seen <= self.max_gap]
+        track_boxes = np.array([self.tracks[i].box for i in active], dtype=float).reshape(-1, 4)
+        iou = box_iou_matrix(boxes, track_boxes)
+        centers = (boxes[:, None, :2] + boxes[:, None, 2:]) / 2
+        track_centers = (track_boxes[None, :, :2] + track_boxes[None, :, 2:]) / 2
+        distance = np.linalg.norm(centers - track_centers, axis=2)
+
+        compatible = np.array([
+            [
+                self.tracks[t].type == d["type"]
+                and (self.tracks[t].part is None or d["part"] is None or self.tracks[t].part == d["part"])
+                for t in active
+            ]
+            for d in damages
+        ], dtype=bool).reshape(len(damages), len(active))
+        score = np.where(compatible & ((iou >= self.iou_threshold) | (distance <= self.center_distance)), iou - distance, -np.inf)
+
+        improved = []
+        assigned_tracks = set()
+        assigned = np.full(len(damages), -1)
+        # Greedy pairing, best score first
+        for flat in np.argsort(-score, axis=None):
+            i, j = np.unravel_index(flat, score.shape)
+            if not np.isfinite(score[i, j]):
+                break
+            if assigned[i] >= 0 or j in assigned_tracks:
+                continue
+            assigned[i] = active[j]
+            assigned_tracks.add(j)
+
+        for i, damage in enumerate(damages):
+            if assigned[i] < 0:
+                self.tracks[self._next_id] = DamageTrack(
+                    type=damage["type"], part=damage["part"], box=boxes[i], first_seen=self._kept, last_seen=self._kept,
+                    first_seen_s=timestamp, last_seen_s=timestamp, best=damage, best_frame=frame_index,
+                    first_part_position=part_position(damage), part_position=part_position(damage),
+                    confidence_sum=damage["confidence"]
+                )
+                improved.append(self._next_id)
+                self._next_id += 1
+                continue
+            track = self.tracks[assigned[i]]
+            track.box = boxes[i]
+            track.last_seen = self._kept
+            track.last_seen_s = timestamp
+            track.frames += 1
+            track.confidence_sum += damage["confidence"]
+            if track.part is None:
+                track.part = damage["part"]
+            position = part_position(damage)
+            if position is not None:
+                track.part_position = position
+                if track.first_part_position is None:
+                    track.first_part_position = position
+            if damage["confidence"] > track.best["confidence"]:
+                track.best = damage
+                track.best_frame = frame_index
+                improved.append(int(assigned[i]))
+        return improved
+
+    def discard_stale(self) -> List[int]:
+        """Drop tracks that can no longer match and never qualified; returns their ids"""
+        stale = [
+            i for i, t in self.tracks.items()
+            if self._kept - t.last_seen > self.max_gap and not self._qualifies(t)
+        ]
+        for i in stale:
+            del self.tracks[i]
+        self.discarded += len(stale)
+        return stale
+
+    @staticmethod
+    def _join(a: Tuple[int, DamageTrack], b: Tuple[int, DamageTrack]) -> Tuple[int, DamageTrack]:
+        """One track out of two sightings of a damage (``b`` starts after ``a`` ends); keeps the id holding the best detection"""
+        (_, first), (_, second) = a, b
+        best_id, best = b if second.best["confidence"] > first.best["confidence"] else a
+        return best_id, DamageTrack(
+            type=first.type, part=first.part, box=second.box, first_seen=first.first_seen, last_seen=second.last_seen,
+            first_seen_s=first.first_seen_s, last_seen_s=second.last_seen_s, best=best.best, best_frame=best.best_frame,
+            first_part_position=first.first_part_position, part_position=second.part_position,
+            frames=first.frames + second.frames, confidence_sum=first.confidence_sum + second.confidence_sum
+        )
+
+    def _rejoins(self, earlier: DamageTrack, later: DamageTrack) -> bool:
+        """Whether ``later`` is ``earlier`` back in view: same type and part, shortly after, at the same place"""
+        if later.part is None or earlier.type != later.type or earlier.part != later.part:
+            return False
+        gap = later.first_seen - earlier.last_seen
+        if gap <= 0 or gap > self.max_join_gap:
+            return False
+        if earlier.part_position is None or later.first_part_position is None:
+            return False
+        return bool(np.linalg.norm(earlier.part_position - later.first_part_position) <= self.join_distance)
+
+    def merged(self) -> List[Tuple[int, DamageTrack]]:
+        """Tracks that count as real damages (seen in several frames, or confidently in one).
+
+        A track starting shortly after another of the same type ended, at the
+        same place on the same part, is that damage back in view and is
+        joined with it. Tracks seen together, far apart on the part or long
+        after each other stay distinct damages.
+        """
+        groups: List[Tuple[int, DamageTrack]] = []
+        self.joined = 0
+        for item in sorted(self.tracks.items(), key=lambda item: item[1].first_seen):
+            track = item[1]
+            for k, (_, group) in enumerate(groups):
+                if self._rejoins(group, track):
+                    groups[k] = self._join(groups[k], item)
+                    self.joined += 1
+                    break
+            else:
+                groups.append(item)
+        return [(i, t) for i, t in groups if self._qualifies(t)]
@@ -0,0 +1,338 @@
+"""End-to-end latency/throughput benchmark of the analyze pipeline.
+
+Modes:
+    direct  analyze_image() from a thread pool (models only, no HTTP/DB)
+    api     POST /api/analyze through an in-process ASGI client, with MongoDB
+            replaced by an in-memory stand-in and blobs in a temp directory
+
+Images from assets/ are sent round-robin at the given concurrency. The result
+cache and report pre-generation are disabled so every request runs inference.
+The JSON output contains latency percentiles, images/s, peak RSS and per-stage
+timings (decode, per-model inference, matching, JPEG encode, thumbnail, blob
+and DB writes). Pass an earlier output as --compare to print relative changes.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--mode api] [--requests 64] [--concurrency 8]
+                                        [--output bench.json] [--compare baseline.json]
+
+Requires the backend requirements plus httpx (for the ASGI client).
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "backend"
+ASSETS_DIR = ROOT / "assets"
+if str(BACKEND_PATH) not in sys.path:
+    sys.path.insert(0, str(BACKEND_PATH))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+class StageTimer:
+    """Thread-safe collection of per-stage durations (ms)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def add(self, stage: str, ms: float):
+        with self._lock:
+            self.samples[stage].append(ms)
+
+    def wrap(self, stage: str, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.add(stage, (time.perf_counter() - start) * 1000.0)
+        return timed
+
+    def wrap_async(self, stage: str, fn):
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.add(stage, (time.perf_counter() - start) * 1000.0)
+        return timed
+
+    def add_result_timings(self, timings):
+        if not timings:
+            return
+        for stage, key in (("preprocess", "preprocess"), ("damage_model", "damage_model"),
+                           ("parts_model", "parts_model"), ("matching", "postprocess")):
+            if key in timings:
+                self.add(stage, timings[key])
+
+    def summary(self):
+        return {stage: summarize(values) for stage, values in sorted(self.samples.items())}
+
+
+class MemoryCollection:
+    """In-memory stand-in for the Motor collection calls made on the analyze path"""
+
+    def __init__(self, timer: StageTimer = None):
+        self.docs = {}
+        self.timer = timer
+
+    @staticmethod
+    def _matches(doc, query):
+        for key, cond in query.items():
+            value = doc.get(key)
+            if isinstance(cond, dict) and "$ne" in cond:
+                if value == cond["$ne"]:
+                    return False
+            elif isinstance(cond, dict) and "$in" in cond:
+                if value not in cond["$in"]:
+                    return False
+            elif value != cond:
+                return False
+        return True
+
+    async def create_index(self, *args, **kwargs):
+        return None
+
+    async def find_one(self, query, projection=None):
+        return next((dict(d) for d in self.docs.values() if self._matches(d, query)), None)
+
+    async def count_documents(self, query, limit=0):
+        return sum(1 for d in self.docs.values() if self._matches(d, query))
+
+    async def insert_many(self, docs, ordered=True):
+        start = time.perf_counter()
+        for doc in docs:
+            self.docs[doc["_id"]] = dict(doc)
+        if self.timer is not None:
+            self.timer.add("db_write_batch", (time.perf_counter() - start) * 1000.0)
+
+    async def replace_one(self, query, doc, upsert=False):
+        self.docs[doc["_id"]] = dict(doc)
+
+    async def update_one(self, query, update):
+        doc = self.docs.get(query.get("_id"))
+        if doc is not None:
+            doc.update(update.get("$set", {}))
+
+    async def delete_many(self, query):
+        doomed = [key for key, d in self.docs.items() if self._matches(d, query)]
+        for key in doomed:
+            del self.docs[key]
+        return SimpleNamespace(deleted_count=len(doomed))
+
+
+def summarize(values):
+    values = np.asarray(values, dtype=float)
+    if values.size == 0:
+        return None
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 2),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p95": round(float(np.percentile(values, 95)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+        "max": round(float(values.max()), 2),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1 << 20) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def load_assets(limit: int):
+    paths = [p for p in sorted(ASSETS_DIR.glob("*")) if p.suffix.lower() in IMAGE_EXTENSIONS]
+    return paths[:limit] if limit else paths
+
+
+def configure_environment(tmp_dir: str):
+    """Server settings for benchmarking (must be set before importing server)"""
+    os.environ["RESULT_CACHE_SIZE"] = "0"
+    os.environ["RESULT_CACHE_PERSIST"] = "0"
+    os.environ["REPORT_PREGENERATE"] = "0"
+    os.environ["BLOB_STORE"] = "local"
+    os.environ["BLOB_STORE_PATH"] = tmp_dir
+    # Job workers poll their store; keep them off MongoDB
+    os.environ["JOB_STORE"] = "sqlite"
+    os.environ["JOB_STORE_PATH"] = os.path.join(tmp_dir, "jobs.sqlite3")
+
+
+def bench_direct(server, timer: StageTimer, paths, args):
+    import cv2
+
+    images = [cv2.imread(str(p), cv2.IMREAD_COLOR) for p in paths]
+    server.model_loader.load()
+    for image in images[:args.warmup]:
+        server.analyze_image(image)
+
+    def one(i):
+        image = images[i % len(images)]
+        start = time.perf_counter()
+        result = server.analyze_image(image)
+        latency = (time.perf_counter() - start) * 1000.0
+        timer.add_result_timings(result.get("timings_ms"))
+        return latency
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        latencies = list(pool.map(one, range(args.requests)))
+    return latencies, time.perf_counter() - start, 0
+
+
+async def bench_api(server, timer: StageTimer, paths, args):
+    import httpx
+
+    payloads = [(p.name, p.read_bytes()) for p in paths]
+
+    # Replace MongoDB with the in-memory stand-in
+    collection = MemoryCollection(timer)
+    server.analyses_collection = collection
+    server.analysis_writer.collection = collection
+    server.result_cache.collection = None
+
+    # Stage instrumentation (module globals are looked up at call time)
+    server.decode_image = timer.wrap("decode", server.decode_image)
+    server.encode_jpeg = timer.wrap("jpeg_encode", server.encode_jpeg)
+    server.encode_thumbnail = timer.wrap("thumbnail", server.encode_thumbnail)
+    server.store_renditions = timer.wrap_async("blob_write", server.store_renditions)
+
+    await server.app.router.startup()
+    try:
+        if server.inference_pool is not None:
+            # Models load in the inference workers; measure once every worker is up
+            while server.inference_pool.status()["status"] not in ("ready", "failed"):
+                await asyncio.sleep(0.1)
+            status = server.inference_pool.status()
+            if status["status"] == "failed":
+                errors = "; ".join(str(w["error"]) for w in status["workers"])
+                raise SystemExit(f"Inference workers failed to start: {errors}")
+        else:
+            while server.model_loader.state not in ("ready", "failed"):
+                await asyncio.sleep(0.1)
+            if server.model_loader.state == "failed":
+                raise SystemExit(f"Model loading failed: {server.model_loader.error}")
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def post(i):
+                name, data = payloads[i % len(payloads)]
+                start = time.perf_counter()
+                response = await client.post("/api/analyze", files={"file": (name, data, "image/jpeg")})
+                latency = (time.perf_counter() - start) * 1000.0
+                if response.status_code != 200:
+                    return latency, False
+                timer.add_result_timings(response.json()["results"].get("timings_ms"))
+                return latency, True
+
+            for i in range(args.warmup):
+                await post(i)
+            timer.samples.clear()
+
+            queue = asyncio.Queue()
+            for i in range(args.requests):
+                queue.put_nowait(i)
+            outcomes = []
+
+            async def worker():
+                while not queue.empty():
+                    outcomes.append(await post(queue.get_nowait()))
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+    finally:
+        await server.app.router.shutdown()
+
+    errors = sum(1 for _, ok in outcomes if not ok)
+    return [latency for latency, _ in outcomes], elapsed, errors
+
+
+def compare(current, baseline):
+    """Relative change of headline numbers against an earlier run"""
+    def pct(new, old):
+        return round((new - old) / old * 100.0, 1) if old else None
+
+    changes = {key: pct(current["latency_ms"][key], baseline["latency_ms"][key]) for key in ("p50", "p95", "p99")}
+    changes["images_per_second"] = pct(current["images_per_second"], baseline["images_per_second"])
+    changes["peak_rss_mb"] = pct(current["peak_rss_mb"], baseline["peak_rss_mb"])
+    return {"baseline_commit": baseline.get("commit"), "percent_change": changes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=["direct", "api"], default="api")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--images", type=int, default=0, help="number of assets/ images to use (0 = all)")
+    parser.add_argument("--output", default=None, help="write the JSON result to this file")
+    parser.add_argument("--compare", default=None, help="earlier JSON result to compare against")
+    args = parser.parse_args()
+
+    paths = load_assets(args.images)
+    if not paths:
+        raise SystemExit(f"No images in {ASSETS_DIR}")
+
+    with tempfile.TemporaryDirectory(prefix="bench-blobs-") as tmp_dir:
+        configure_environment(tmp_dir)
+        import server
+
+        timer = StageTimer()
+        if args.mode == "direct":
+            latencies, elapsed, errors = bench_direct(server, timer, paths, args)
+        else:
+            latencies, elapsed, errors = asyncio.run(bench_api(server, timer, paths, args))
+
+    result = {
+        "commit": git_commit(),
+        "mode": args.mode,
+        "inference_backend": server.INFERENCE_BACKEND,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "images": len(paths),
+        "errors": errors,
+        "latency_ms": summarize(latencies),
+        "images_per_second": round(len(latencies) / max(elapsed, 1e-9), 2),
+        "peak_rss_mb": peak_rss_mb(),
+        "stages_ms": timer.summary(),
+        "settings": {
+            "max_batch_size": server.INFERENCE_MAX_BATCH_SIZE,
+            "max_wait_ms": server.INFERENCE_MAX_WAIT_MS,
+            "inference_pool_size": server.INFERENCE_POOL_SIZE,
+            "torch_threads": server.torch.get_num_threads(),
+        },
+    }
+    if args.compare:
+        result["comparison"] = compare(result, json.loads(Path(args.compare).read_text()))
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Per-request result serialization cost: legacy path vs typed models.
+
+Legacy path (before typed results):
+    convert_numpy_types -> json.dumps/json.loads round trip -> Dict[str, Any]
+    response validation -> JSON encoding
+Typed path:
+    AnalysisResponse(results: AnalysisResult) validation -> JSON encoding
+
+Usage:
+    python benchmarks/bench_serialization.py [--damages 40] [--parts 20] [--repeat 500]
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+from pydantic import BaseModel
+
+BACKEND_PATH = Path(__file__).resolve().parents[1] / "backend"
+SRC_PATH = Path(__file__).resolve().parents[1] / "src"
+for path in (BACKEND_PATH, SRC_PATH):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from result_models import AnalysisResult
+from autodamageid.masks import rle_encode
+
+
+# --- Legacy helpers (as they were in server.py) ---
+
+def convert_numpy_types(obj):
+    if isinstance(obj, np.integer):
+        return int(obj)
+    elif isinstance(obj, np.floating):
+        return float(obj)
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, dict):
+        return {k: convert_numpy_types(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_numpy_types(item) for item in obj]
+    return obj
+
+
+def convert_to_native_types(obj):
+    def default_converter(o):
+        if isinstance(o, (np.integer, np.int64, np.int32)):
+            return int(o)
+        elif isinstance(o, (np.floating, np.float64, np.float32)):
+            return float(o)
+        elif isinstance(o, np.ndarray):
+            return o.tolist()
+        elif isinstance(o, np.bool_):
+            return bool(o)
+        raise TypeError(f"Object of type {type(o)} is not JSON serializable")
+
+    return json.loads(json.dumps(obj, default=default_converter))
+
+
+class LegacyAnalysisResponse(BaseModel):
+    id: str
+    created_at: str
+    image_url: str
+    thumbnail_url: str
+    results: Dict[str, Any]
+
+
+class TypedAnalysisResponse(BaseModel):
+    id: str
+    created_at: str
+    image_url: str
+    thumbnail_url: str
+    results: AnalysisResult
+
+
+def synthetic_result(num_damages: int, num_parts: int, seed: int = 0) -> Dict[str, Any]:
+    """A result shaped like build_result output (native Python values)"""
+    rng = np.random.default_rng(seed)
+    grid = rng.integers(-1, num_parts, size=(120, 160))
+    parts = [
+        {
+            "name": f"part_{j}",
+            "name_tr": f"Parça {j}",
+            "box": rng.uniform(0, 4000, 4).round(2).tolist(),
+            "mask_rle": rle_encode(grid == j),
+            "mask_area": float(rng.uniform(1e4, 1e6))
+        }
+        for j in range(num_parts)
+    ]
+    damages = []
+    for _ in range(num_damages):
+        overlaps = [
+            {"part_index": int(k), "part": f"part_{k}", "part_tr": f"Parça {k}", "fraction": 0.25}
+            for k in rng.choice(num_parts, size=min(3, num_parts), replace=False)
+        ]
+        damages.append({
+            "id": str(uuid.uuid4())[:8],
+            "type": "scratch",
+            "type_tr": "Çizik",
+            "confidence": 42.5,
+            "severity": 2,
+            "box": rng.uniform(0, 4000, 4).tolist(),
+            "part": "part_0",
+            "part_tr": "Parça 0",
+            "part_box": rng.uniform(0, 4000, 4).tolist(),
+            "iou_with_part": 0.31,
+            "part_overlap": 0.62,
+            "part_overlaps": overlaps,
+            "damage_to_part_area_ratio": 0.12,
+            "match_method": "mask"
+        })
+    return {
+        "damages": damages,
+        "parts": parts,
+        "summary": {"total_damages": num_damages, "affected_parts": 3, "average_severity": 2.0, "risk_level": "Orta"},
+        "image_size": {"width": 4000, "height": 3000},
+        "timings_ms": {"preprocess": 4.1, "damage_model": 80.2, "parts_model": 95.7}
+    }
+
+
+def legacy_path(results):
+    results = convert_numpy_types(results)
+    results = convert_to_native_types(results)
+    response = LegacyAnalysisResponse(id="x", created_at="t", image_url="u", thumbnail_url="u", results=results)
+    return json.dumps(response.model_dump(mode="json"))
+
+
+def typed_path(results):
+    response = TypedAnalysisResponse(id="x", created_at="t", image_url="u", thumbnail_url="u", results=results)
+    return response.model_dump_json()
+
+
+def bench(fn, results, repeat: int) -> float:
+    fn(results)  # warmup
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(results)
+    return (time.perf_counter() - start) * 1000.0 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--damages", type=int, default=40)
+    parser.add_argument("--parts", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    results = synthetic_result(args.damages, args.parts)
+    legacy_ms = bench(legacy_path, results, args.repeat)
+    typed_ms = bench(typed_path, results, args.repeat)
+
+    print(json.dumps({
+        "damages": args.damages,
+        "parts": args.parts,
+        "legacy_ms_per_request": round(legacy_ms, 3),
+        "typed_ms_per_request": round(typed_ms, 3),
+        "speedup": round(legacy_ms / max(typed_ms, 1e-9), 2)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,15 +10,21 @@ const HistoryPage = () => {
   const [analyses, setAnalyses] = useState([]);
   const [loading, setLoading] = useState(true);
   const [deleting, setDeleting] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     fetchAnalyses();
   }, []);
 
-  const fetchAnalyses = async () => {
+  const fetchAnalyses = async (after = null) => {
     try {
-      const response = await axios.get(`${API_URL}/api/analyses`);
-      setAnalyses(response.data);
+      const response = await axios.get(`${API_URL}/api/analyses`, {
+        params: after ? { after } : {}
+      });
+      const { items, next_cursor } = response.data;
+      setAnalyses((prev) => (after ? [...prev, ...items] : items));
+      setNextCursor(next_cursor);
     } catch (err) {
       console.error('Fetch error:', err);
     } finally {
@@ -26,6 +32,12 @@ const HistoryPage = () => {
     }
   };
 
+  const handleLoadMore = async () => {
+    setLoadingMore(true);
+    await fetchAnalyses(nextCursor);
+    setLoadingMore(false);
+  };
+
   const handleDelete = async (id, e) => {
     e.preventDefault();
     e.stopPropagation();
@@ -114,9 +126,10 @@ const HistoryPage = () => {
                 <div className="flex items-stretch">
                   {/* Thumbnail */}
                   <div className="w-40 h-28 bg-gray-100 flex-shrink-0 overflow-hidden">
-                    {analysis.thumbnail ? (
+                    {analysis.thumbnail_url ? (
                       <img
-                        src={`data:image/jpeg;base64,${analysis.thumbnail}`}
+                        src={`${API_URL}${analysis.thumbnail_url}`}
+                        loading="lazy"
                         alt="Thumbnail"
                         className="w-full h-full object-cover group-hover:scale-105 transition-transform"
                       />
@@ -186,6 +199,18 @@ const HistoryPage = () => {
               </Link>
             </motion.div>
           ))}
+
+          {nextCursor && (
+            <button
+              onClick={handleLoadMore}
+              disabled={loadingMore}
+              className="mx-auto mt-2 flex items-center gap-2 px-6 py-3 bg-white text-apple-text rounded-full font-medium shadow-apple hover:shadow-apple-lg transition-shadow"
+              data-testid="load-more-button"
+            >
+              {loadingMore && <Loader2 className="w-4 h-4 animate-spin" />}
+              Daha Fazla Yükle
+            </button>
+          )}
         </div>
       )}
 
@@ -247,7 +247,7 @@ const ResultPage = () => {
             <div className="relative aspect-video bg-gray-100">
               <img
                 ref={imageRef}
-                src={`data:image/jpeg;base64,${analysis.image_base64}`}
+                src={`${API_URL}${analysis.image_url}`}
                 alt="Analiz edilen araç"
                 className="w-full h-full object-contain"
                 onLoad={() => setImageLoaded(true)}
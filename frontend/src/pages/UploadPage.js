@@ -1,17 +1,31 @@
 import React, { useState, useRef, useCallback } from 'react';
-import { useNavigate } from 'react-router-dom';
+import { useNavigate, Link } from 'react-router-dom';
 import { motion, AnimatePresence } from 'framer-motion';
-import { Upload, Image, Loader2, CheckCircle, AlertCircle } from 'lucide-react';
+import { Upload, Image, Images, Loader2, CheckCircle, AlertCircle, XCircle } from 'lucide-react';
 import axios from 'axios';
 
 const API_URL = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
 
+const isZip = (f) => f.name.toLowerCase().endsWith('.zip') || f.type === 'application/zip' || f.type === 'application/x-zip-compressed';
+
+const getRiskColor = (level) => {
+  switch (level) {
+    case 'Yüksek': return 'text-apple-error bg-red-50';
+    case 'Orta': return 'text-apple-warning bg-orange-50';
+    default: return 'text-apple-success bg-green-50';
+  }
+};
+
 const UploadPage = () => {
   const [isDragging, setIsDragging] = useState(false);
   const [file, setFile] = useState(null);
   const [preview, setPreview] = useState(null);
   const [uploading, setUploading] = useState(false);
   const [error, setError] = useState(null);
+  // Batch mode: several photos of one vehicle (or a zip archive)
+  const [batchFiles, setBatchFiles] = useState([]);
+  const [batchItems, setBatchItems] = useState([]);
+  const [batchSummary, setBatchSummary] = useState(null);
   const fileInputRef = useRef(null);
   const navigate = useNavigate();
 
@@ -28,19 +42,27 @@ const UploadPage = () => {
   const handleDrop = useCallback((e) => {
     e.preventDefault();
     setIsDragging(false);
-    const droppedFile = e.dataTransfer.files[0];
-    if (droppedFile && droppedFile.type.startsWith('image/')) {
-      processFile(droppedFile);
-    } else {
-      setError('Lütfen geçerli bir resim dosyası seçin');
-    }
+    selectFiles(Array.from(e.dataTransfer.files));
   }, []);
 
   const handleFileSelect = (e) => {
-    const selectedFile = e.target.files[0];
-    if (selectedFile) {
-      processFile(selectedFile);
+    selectFiles(Array.from(e.target.files));
+  };
+
+  const selectFiles = (selected) => {
+    const accepted = selected.filter((f) => f.type.startsWith('image/') || isZip(f));
+    if (accepted.length === 0) {
+      setError('Lütfen geçerli bir resim dosyası seçin');
+      return;
     }
+    if (accepted.length === 1 && !isZip(accepted[0])) {
+      processFile(accepted[0]);
+      return;
+    }
+    setError(null);
+    setBatchFiles(accepted);
+    setBatchItems([]);
+    setBatchSummary(null);
   };
 
   const processFile = (file) => {
@@ -77,10 +99,60 @@ const UploadPage = () => {
     }
   };
 
+  const handleBatchUpload = async () => {
+    setUploading(true);
+    setError(null);
+    setBatchItems([]);
+    setBatchSummary(null);
+
+    const formData = new FormData();
+    batchFiles.forEach((f) => formData.append('files', f));
+
+    try {
+      // NDJSON stream: one line per finished image, then the vehicle summary
+      const response = await fetch(`${API_URL}/api/analyze/batch`, { method: 'POST', body: formData });
+      if (!response.ok) {
+        const body = await response.json().catch(() => ({}));
+        throw new Error(body.detail || 'Analiz sırasında bir hata oluştu');
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      const handleLine = (line) => {
+        if (!line.trim()) return;
+        const message = JSON.parse(line);
+        if (message.type === 'summary') {
+          setBatchSummary(message);
+        } else {
+          setBatchItems((items) => [...items, message]);
+        }
+      };
+
+      for (;;) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.forEach(handleLine);
+      }
+      handleLine(buffer);
+    } catch (err) {
+      console.error('Batch upload error:', err);
+      setError(err.message || 'Analiz sırasında bir hata oluştu');
+    } finally {
+      setUploading(false);
+    }
+  };
+
   const resetUpload = () => {
     setFile(null);
     setPreview(null);
     setError(null);
+    setBatchFiles([]);
+    setBatchItems([]);
+    setBatchSummary(null);
   };
 
   return (
@@ -102,7 +174,121 @@ const UploadPage = () => {
 
         {/* Upload Area */}
         <AnimatePresence mode="wait">
-          {!preview ? (
+          {batchFiles.length > 0 ? (
+            <motion.div
+              key="batch"
+              initial={{ opacity: 0, scale: 0.95 }}
+              animate={{ opacity: 1, scale: 1 }}
+              exit={{ opacity: 0, scale: 0.95 }}
+              className="bg-white rounded-3xl shadow-apple-lg overflow-hidden"
+            >
+              <div className="p-6">
+                <div className="flex items-center gap-3 mb-4">
+                  <div className="w-10 h-10 bg-gray-100 rounded-lg flex items-center justify-center">
+                    <Images className="w-5 h-5 text-apple-secondary" />
+                  </div>
+                  <div>
+                    <p className="font-medium text-apple-text">
+                      {batchFiles.length} dosya seçildi
+                    </p>
+                    <p className="text-sm text-apple-secondary">
+                      {(batchFiles.reduce((total, f) => total + f.size, 0) / 1024 / 1024).toFixed(2)} MB
+                      {batchItems.length > 0 && ` • ${batchItems.length} resim işlendi`}
+                    </p>
+                  </div>
+                </div>
+
+                {/* Per-image results as they stream in */}
+                {batchItems.length > 0 && (
+                  <ul className="mb-4 max-h-64 overflow-y-auto divide-y divide-apple-border" data-testid="batch-results">
+                    {batchItems.map((item) => (
+                      <li key={item.index} className="py-2 flex items-center justify-between gap-3">
+                        <div className="flex items-center gap-2 min-w-0">
+                          {item.type === 'result' ? (
+                            <CheckCircle className="w-4 h-4 text-apple-success flex-shrink-0" />
+                          ) : (
+                            <XCircle className="w-4 h-4 text-apple-error flex-shrink-0" />
+                          )}
+                          <span className="text-sm text-apple-text truncate">{item.filename}</span>
+                        </div>
+                        {item.type === 'result' ? (
+                          <Link
+                            to={`/result/${item.analysis.id}`}
+                            className={`px-2.5 py-1 rounded-full text-xs font-medium ${getRiskColor(item.analysis.results.summary.risk_level)}`}
+                          >
+                            {item.analysis.results.summary.total_damages} hasar • {item.analysis.results.summary.risk_level}
+                          </Link>
+                        ) : (
+                          <span className="text-xs text-apple-error">{item.detail}</span>
+                        )}
+                      </li>
+                    ))}
+                  </ul>
+                )}
+
+                {/* Vehicle summary */}
+                {batchSummary && (
+                  <div className="mb-4 p-4 bg-gray-50 rounded-xl" data-testid="batch-summary">
+                    <div className="flex items-center justify-between mb-2">
+                      <p className="font-medium text-apple-text">Araç Özeti</p>
+                      {batchSummary.worst_risk_level && (
+                        <span className={`px-2.5 py-1 rounded-full text-xs font-medium ${getRiskColor(batchSummary.worst_risk_level)}`}>
+                          {batchSummary.worst_risk_level} Risk
+                        </span>
+                      )}
+                    </div>
+                    <p className="text-sm text-apple-secondary">
+                      {batchSummary.analyzed} resim • {batchSummary.total_damages} hasar
+                      {batchSummary.failed > 0 && ` • ${batchSummary.failed} başarısız`}
+                    </p>
+                    {batchSummary.affected_parts.length > 0 && (
+                      <p className="text-sm text-apple-secondary mt-1">
+                        Etkilenen parçalar: {batchSummary.affected_parts.map((p) => p.name_tr).join(', ')}
+                      </p>
+                    )}
+                  </div>
+                )}
+
+                {/* Error Message */}
+                {error && (
+                  <div className="mb-4 p-4 bg-red-50 rounded-xl flex items-center gap-3 text-apple-error">
+                    <AlertCircle className="w-5 h-5 flex-shrink-0" />
+                    <p className="text-sm">{error}</p>
+                  </div>
+                )}
+
+                <div className="flex gap-3">
+                  <button
+                    onClick={resetUpload}
+                    disabled={uploading}
+                    className="flex-1 px-6 py-3 border border-apple-border rounded-full font-medium text-apple-text hover:bg-gray-50 transition-colors disabled:opacity-50"
+                  >
+                    {batchSummary ? 'Yeni Yükleme' : 'İptal'}
+                  </button>
+                  {!batchSummary && (
+                    <button
+                      onClick={handleBatchUpload}
+                      disabled={uploading}
+                      className="flex-1 px-6 py-3 bg-black text-white rounded-full font-medium hover:bg-gray-800 transition-colors disabled:opacity-50 flex items-center justify-center gap-2"
+                      data-testid="batch-analyze-button"
+                    >
+                      {uploading ? (
+                        <>
+                          <Loader2 className="w-5 h-5 animate-spin" />
+                          Analiz Ediliyor
+                        </>
+                      ) : (
+                        <>
+                          <CheckCircle className="w-5 h-5" />
+                          Toplu Analizi Başlat
+                        </>
+                      )}
+                    </button>
+                  )}
+                </div>
+              </div>
+            </motion.div>
+          ) : !preview ? (
             <motion.div
               key="upload"
               initial={{ opacity: 0, scale: 0.95 }}
@@ -127,7 +313,7 @@ const UploadPage = () => {
                 </div>
                 
                 <h3 className="text-xl font-semibold text-apple-text mb-2">
-                  Araç fotoğrafını sürükleyin
+                  Araç fotoğraflarını sürükleyin
                 </h3>
                 <p className="text-apple-secondary mb-6">
                   veya
@@ -143,14 +329,15 @@ const UploadPage = () => {
                 <input
                   ref={fileInputRef}
                   type="file"
-                  accept="image/*"
+                  accept="image/*,.zip"
+                  multiple
                   onChange={handleFileSelect}
                   className="hidden"
                   data-testid="file-input"
                 />
                 
                 <p className="text-sm text-apple-secondary mt-6">
-                  PNG, JPG, JPEG • Max 10MB
+                  PNG, JPG, JPEG • Max 10MB • Birden fazla fotoğraf veya ZIP
                 </p>
               </div>
             </motion.div>
@@ -0,0 +1,105 @@
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+
+def masks_to_grid(masks, crop: Tuple[float, float, float, float], stride: int = 4) -> np.ndarray:
+    """
+    masks: [M, H, W] (0-1 veya bool) -> [M, gh, gw] bool
+
+    crop (x1, y1, x2, y2) bölgesini alıp her ``stride`` pikselden birini örnekler
+    (en yakın komşu). Letterbox dolgusunu atıp maskeyi küçük bir ızgaraya indirir.
+    """
+    masks = np.asarray(masks)
+    if masks.ndim == 2:
+        masks = masks[None]
+    h, w = masks.shape[1:]
+
+    x1 = int(np.clip(round(crop[0]), 0, w))
+    y1 = int(np.clip(round(crop[1]), 0, h))
+    x2 = int(np.clip(round(crop[2]), x1 + 1, w))
+    y2 = int(np.clip(round(crop[3]), y1 + 1, h))
+
+    stride = max(1, int(stride))
+    grid = masks[:, y1:y2:stride, x1:x2:stride]
+    return grid > 0.5 if grid.dtype != bool else grid
+
+
+def exclusive_label_map(masks: np.ndarray, scores) -> np.ndarray:
+    """
+    masks: [M, gh, gw] bool, scores: [M] -> [gh, gw] int (boş pikseller -1)
+
+    Üst üste binen maskelerde her piksel en yüksek skorlu parçaya verilir, böylece
+    bir hasar bölgesi iki panele birden sayılmaz.
+    """
+    masks = np.asarray(masks, dtype=bool)
+    if len(masks) == 0:
+        return np.full(masks.shape[1:], -1, dtype=np.int32)
+
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+    weighted = masks * (scores[:, None, None] + 1e-6)
+    labels = weighted.argmax(axis=0).astype(np.int32)
+    labels[~masks.any(axis=0)] = -1
+    return labels
+
+
+def box_coverage(label_map: np.ndarray, boxes, num_parts: int) -> np.ndarray:
+    """
+    label_map: [gh, gw] int, boxes: [N, 4] ızgara koordinatlarında xyxy
+    -> [N, M] her kutunun parça maskelerine düşen alan oranı
+
+    Her parça için integral görüntü (summed-area table) kurulur; böylece tüm
+    hasar/parça çiftleri tek geçişte, kutu boyutundan bağımsız hesaplanır.
+    """
+    boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+    n = len(boxes)
+    if n == 0 or num_parts == 0:
+        return np.zeros((n, num_parts))
+
+    gh, gw = label_map.shape
+    one_hot = label_map[None, :, :] == np.arange(num_parts)[:, None, None]
+    integral = np.zeros((num_parts, gh + 1, gw + 1), dtype=np.int64)
+    integral[:, 1:, 1:] = one_hot.cumsum(axis=1).cumsum(axis=2)
+
+    x1 = np.clip(np.floor(boxes[:, 0]), 0, gw).astype(int)
+    y1 = np.clip(np.floor(boxes[:, 1]), 0, gh).astype(int)
+    x2 = np.clip(np.ceil(boxes[:, 2]), 0, gw).astype(int)
+    y2 = np.clip(np.ceil(boxes[:, 3]), 0, gh).astype(int)
+
+    sums = (integral[:, y2, x2] - integral[:, y1, x2]
+            - integral[:, y2, x1] + integral[:, y1, x1]).T
+    cells = np.maximum((x2 - x1) * (y2 - y1), 1)
+    return sums / cells[:, None]
+
+
+def label_areas(label_map: np.ndarray, num_parts: int) -> np.ndarray:
+    """
+    label_map: [gh, gw] int -> [M] her parçaya ait ızgara hücresi sayısı
+    """
+    valid = label_map[label_map >= 0]
+    return np.bincount(valid, minlength=num_parts)[:num_parts]
+
+
+def rle_encode(mask: np.ndarray) -> Dict[str, Any]:
+    """
+    2B bool maskeyi run-length olarak kodlar (satır öncelikli, ilk sayı 0'ların).
+    """
+    mask = np.asarray(mask, dtype=bool)
+    flat = mask.reshape(-1)
+    change = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    bounds = np.concatenate(([0], change, [flat.size]))
+    counts = np.diff(bounds).tolist()
+    if flat.size and flat[0]:
+        counts = [0] + counts
+    return {"size": [int(mask.shape[0]), int(mask.shape[1])], "counts": [int(c) for c in counts]}
+
+
+def rle_decode(rle: Dict[str, Any]) -> np.ndarray:
+    """
+    rle_encode çıktısını tekrar 2B bool maskeye çevirir.
+    """
+    h, w = rle["size"]
+    counts: List[int] = rle["counts"]
+    values = np.arange(len(counts)) % 2 == 1
+    flat = np.repeat(values, counts)
+    return flat.reshape(h, w)
@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+def _as_boxes(boxes) -> np.ndarray:
+    return np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+
+def box_areas(boxes) -> np.ndarray:
+    """
+    boxes: [N, 4] xyxy -> alanlar [N]
+    """
+    boxes = _as_boxes(boxes)
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0.0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0.0, None)
+
+
+def intersection_matrix(boxes_a, boxes_b) -> np.ndarray:
+    """
+    boxes_a: [N, 4], boxes_b: [M, 4] -> kesişim alanları [N, M]
+    """
+    a = _as_boxes(boxes_a)[:, None, :]
+    b = _as_boxes(boxes_b)[None, :, :]
+
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0.0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0.0, None)
+    return inter_w * inter_h
+
+
+def box_iou_matrix(boxes_a, boxes_b) -> np.ndarray:
+    """
+    boxes_a: [N, 4], boxes_b: [M, 4] -> IoU matrisi [N, M]
+    """
+    inter = intersection_matrix(boxes_a, boxes_b)
+    union = box_areas(boxes_a)[:, None] + box_areas(boxes_b)[None, :] - inter + 1e-6
+    return inter / union
+
+
+@dataclass
+class PartMatches:
+    """
+    Her hasar kutusu için en iyi parça eşleşmesi (tüm diziler [N]).
+
+    part_index: eşleşen parçanın indeksi, eşik altındaysa -1
+    iou: en iyi IoU (eşikten bağımsız)
+    intersection: hasar ile en iyi parçanın kesişim alanı
+    damage_area / part_area: kutu alanları
+    area_ratio: hasar alanı / parça alanı (eşleşme yoksa NaN)
+    iou_matrix: tüm hasar/parça çiftlerinin IoU değerleri [N, M]
+    """
+    part_index: np.ndarray
+    iou: np.ndarray
+    intersection: np.ndarray
+    damage_area: np.ndarray
+    part_area: np.ndarray
+    area_ratio: np.ndarray
+    iou_matrix: np.ndarray
+
+    @property
+    def matched(self) -> np.ndarray:
+        return self.part_index >= 0
+
+
+def match_damages_to_parts(damage_boxes, part_boxes, iou_threshold: float = 0.1) -> PartMatches:
+    """
+    Her hasar kutusunu IoU'su en yüksek parça kutusuyla tek geçişte eşleştirir.
+    """
+    damage_boxes = _as_boxes(damage_boxes)
+    part_boxes = _as_boxes(part_boxes)
+    n, m = len(damage_boxes), len(part_boxes)
+
+    inter = intersection_matrix(damage_boxes, part_boxes)
+    damage_area = box_areas(damage_boxes)
+    part_areas = box_areas(part_boxes)
+    iou = inter / (damage_area[:, None] + part_areas[None, :] - inter + 1e-6)
+
+    if m == 0:
+        best = np.zeros(n, dtype=int)
+        best_iou = np.zeros(n)
+        best_inter = np.zeros(n)
+        best_part_area = np.zeros(n)
+    else:
+        best = iou.argmax(axis=1)
+        rows = np.arange(n)
+        best_iou = iou[rows, best]
+        best_inter = inter[rows, best]
+        best_part_area = part_areas[best]
+
+    matched = best_iou > iou_threshold
+    part_index = np.where(matched, best, -1)
+    area_ratio = np.where(matched, damage_area / (best_part_area + 1e-6), np.nan)
+
+    return PartMatches(
+        part_index=part_index,
+        iou=best_iou,
+        intersection=np.where(matched, best_inter, 0.0),
+        damage_area=damage_area,
+        part_area=np.where(matched, best_part_area, 0.0),
+        area_ratio=area_ratio,
+        iou_matrix=iou,
+    )
@@ -1,27 +1,15 @@
+import sys
 from ultralytics import YOLO
 from pathlib import Path
 import cv2
 import numpy as np
 
+# src klasörünü Python path'e ekle (ortak eşleştirme modülü için)
+SRC_PATH = Path(__file__).resolve().parents[1]
+if str(SRC_PATH) not in sys.path:
+    sys.path.append(str(SRC_PATH))
 
-def box_iou(box_a, box_b):
-    """
-    box: [x1, y1, x2, y2]
-    """
-    x1 = max(box_a[0], box_b[0])
-    y1 = max(box_a[1], box_b[1])
-    x2 = min(box_a[2], box_b[2])
-    y2 = min(box_a[3], box_b[3])
-
-    inter_w = max(0.0, x2 - x1)
-    inter_h = max(0.0, y2 - y1)
-    inter_area = inter_w * inter_h
-
-    area_a = max(0.0, (box_a[2] - box_a[0]) * (box_a[3] - box_a[1]))
-    area_b = max(0.0, (box_b[2] - box_b[0]) * (box_b[3] - box_b[1]))
-
-    union = area_a + area_b - inter_area + 1e-6
-    return inter_area / union, inter_area, area_a, area_b
+from autodamageid.matching import match_damages_to_parts
 
 
 def main():
@@ -73,31 +61,18 @@ def main():
     dmg_conf  = damage_res.boxes.conf.cpu().numpy() if damage_res.boxes is not None else np.zeros((0,))
     dmg_names = damage_model.names
 
-    merged_results = []
-
-    # Her hasar kutusu için en iyi eşleşen parçayı bul
-    for i, dmg_box in enumerate(dmg_boxes):
-        best_iou = 0.0
-        best_idx = -1
-        best_inter = 0.0
-        best_part_area = 0.0
-
-        for j, part_box in enumerate(part_boxes):
-            iou, inter_area, area_dmg, area_part = box_iou(dmg_box, part_box)
-            if iou > best_iou:
-                best_iou = iou
-                best_idx = j
-                best_inter = inter_area
-                best_part_area = area_part
+    # Her hasar kutusu için en iyi eşleşen parçayı tek geçişte bul (IoU matrisi)
+    matches = match_damages_to_parts(dmg_boxes, part_boxes, iou_threshold=0.1)  # eşik
 
+    merged_results = []
+    for i in range(len(dmg_boxes)):
         dmg_label = dmg_names[int(dmg_cls[i])]
         conf = float(dmg_conf[i])
 
-        if best_idx >= 0 and best_iou > 0.1:  # eşik
+        best_idx = int(matches.part_index[i])
+        if best_idx >= 0:
             part_label = part_names[int(part_cls[best_idx])]
-            damage_area = (dmg_box[2] - dmg_box[0]) * (dmg_box[3] - dmg_box[1])
-            part_area = best_part_area
-            area_ratio = float(damage_area / (part_area + 1e-6))
+            area_ratio = float(matches.area_ratio[i])
         else:
             part_label = None
             area_ratio = None
@@ -106,7 +81,7 @@ def main():
             "damage_type": dmg_label,
             "confidence": round(conf, 3),
             "part": part_label,
-            "iou_with_part": round(float(best_iou), 3),
+            "iou_with_part": round(float(matches.iou[i]), 3),
             "damage_to_part_area_ratio": None if area_ratio is None else round(area_ratio, 3),
         })
 
@@ -0,0 +1,48 @@
+import argparse
+import sys
+from pathlib import Path
+
+# Model yolları ve yükleme sunucudan gelir (backend/analysis.py, backend/model_loader.py)
+BACKEND_PATH = Path(__file__).resolve().parents[2] / "backend"
+if str(BACKEND_PATH) not in sys.path:
+    sys.path.insert(0, str(BACKEND_PATH))
+
+import analysis
+from model_loader import load_yolo
+
+
+def main():
+    # Sunucunun kullandığı iki model (aynı yollar, aynı görevler)
+    models = analysis.model_paths("torch")
+
+    parser = argparse.ArgumentParser(description="Hasar ve parça modellerini ONNX / OpenVINO formatına aktarır")
+    parser.add_argument("--formats", nargs="+", default=["onnx"], choices=["onnx", "openvino"])
+    parser.add_argument("--models", nargs="+", default=list(models), choices=list(models))
+    parser.add_argument("--imgsz", type=int, default=analysis.INFERENCE_IMGSZ)
+    parser.add_argument("--opset", type=int, default=None, help="ONNX opset (varsayılan: ultralytics seçer)")
+    args = parser.parse_args()
+
+    for name in args.models:
+        weights_path = models[name]
+        print(f"📦 {name} modeli:", weights_path)
+        model = load_yolo(weights_path, analysis.MODEL_TASKS[name])
+
+        for fmt in args.formats:
+            # dynamic=True: sunucu micro-batch'leri değişken batch boyutuyla çalıştırır
+            exported = model.export(
+                format=fmt,
+                imgsz=args.imgsz,
+                dynamic=True,
+                simplify=(fmt == "onnx"),
+                opset=args.opset,
+                half=False,
+                device="cpu",
+            )
+            print(f"✅ {fmt} çıktısı:", exported)
+
+    print("Sunucuda kullanmak için: INFERENCE_BACKEND=onnx (veya openvino)")
+    print("Doğrulama: python backend/check_backend_parity.py --backend onnx")
+
+
+if __name__ == "__main__":
+    main()